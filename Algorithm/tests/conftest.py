@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Il pacchetto valutazione vive in Algorithm/, accanto a questa cartella
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from valutazione.dati import aggiungi_svalutazione  # noqa: E402
+
+
+@pytest.fixture
+def inserzioni():
+    """
+    Dataset sintetico: svalutazione lineare in età e chilometri, con rumore
+    """
+    rng = np.random.default_rng(0)
+    n = 300
+    anni = rng.integers(2012, 2024, n)
+    chilometri = rng.integers(0, 200_000, n).astype(float)
+    svalutazione = 5 + (2024 - anni) * 3 + chilometri / 10_000 + rng.normal(0, 2, n)
+    df = pd.DataFrame({
+        'Anno': anni,
+        'Chilometri': chilometri,
+        'Prezzo di Listino': 40_000.0,
+        'Prezzo': 40_000.0 * (1 - svalutazione / 100),
+        'Condizioni': rng.choice(['Ottime', 'Buone', 'Discrete'], n),
+    })
+    return aggiungi_svalutazione(df)
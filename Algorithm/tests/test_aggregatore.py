@@ -0,0 +1,77 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from valutazione.artefatto import da_risultato
+from valutazione.modello import predict, train
+
+# L'aggregatore vive nell'API, in restApi/ accanto ad Algorithm/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'restApi'))
+import main  # noqa: E402
+
+
+@pytest.fixture
+def chiamate(monkeypatch):
+    # Dimensioni dei lotti passati al modello
+    dimensioni = []
+
+    def conta(modello, anni, chilometri, **opzioni):
+        dimensioni.append(len(anni))
+        return predict(modello, anni, chilometri, **opzioni)
+
+    monkeypatch.setattr(main, 'predici_svalutazioni', conta)
+    return dimensioni
+
+
+def _artefatto(df, regressore, tmp_path):
+    candidato = {'feature': 'numeriche', 'regressore': regressore}
+    return da_risultato(train(df, regressore=regressore), candidato, 'test', str(tmp_path / f'{regressore}.json'), df)
+
+
+async def _prevedi_insieme(aggregatore, richieste):
+    return await asyncio.gather(*(aggregatore.prevedi(m, a, k) for m, a, k in richieste))
+
+
+def test_richieste_concorrenti_in_un_solo_lotto_per_modello(inserzioni, tmp_path, chiamate):
+    lineare = _artefatto(inserzioni, 'lineare', tmp_path)
+    ridge = _artefatto(inserzioni, 'ridge', tmp_path)
+    rng = np.random.default_rng(0)
+    richieste = [(lineare if i % 4 else ridge, int(rng.integers(2012, 2024)), float(rng.integers(0, 200_000)))
+                 for i in range(40)]
+
+    risultati = asyncio.run(_prevedi_insieme(main.AggregatorePrevisioni(attesa_ms=50, dimensione_massima=100),
+                                             richieste))
+
+    # Un lotto per modello, e ogni richiesta riceve la propria previsione
+    assert sorted(chiamate) == [10, 30]
+    for (modello, anno, km), svalutazione in zip(richieste, risultati):
+        assert svalutazione == pytest.approx(predict(modello, [anno], [km])[0], rel=1e-12)
+
+
+def test_lotto_pieno_parte_senza_attendere(inserzioni, tmp_path, chiamate):
+    lineare = _artefatto(inserzioni, 'lineare', tmp_path)
+    richieste = [(lineare, 2020, 1000.0 * i) for i in range(20)]
+    # Con un'attesa di un minuto il test finisce solo se i lotti pieni partono subito
+    aggregatore = main.AggregatorePrevisioni(attesa_ms=60_000, dimensione_massima=10)
+    asyncio.run(asyncio.wait_for(_prevedi_insieme(aggregatore, richieste), timeout=10))
+    assert chiamate == [10, 10]
+
+
+def test_errore_del_modello_arriva_a_tutte_le_richieste(inserzioni, tmp_path, monkeypatch):
+    lineare = _artefatto(inserzioni, 'lineare', tmp_path)
+
+    def guasto(*args, **kwargs):
+        raise ValueError('modello non disponibile')
+
+    monkeypatch.setattr(main, 'predici_svalutazioni', guasto)
+
+    async def prevedi():
+        aggregatore = main.AggregatorePrevisioni(attesa_ms=10, dimensione_massima=100)
+        return await asyncio.gather(*(aggregatore.prevedi(lineare, 2020, 1000.0 * i) for i in range(5)),
+                                    return_exceptions=True)
+
+    errori = asyncio.run(prevedi())
+    assert all(isinstance(e, ValueError) for e in errori)
@@ -0,0 +1,17 @@
+from valutazione.artefatto import carica, da_risultato, salva
+from valutazione.modello import train
+
+
+def test_versione_cambia_con_il_modello_e_sopravvive_al_salvataggio(inserzioni, tmp_path):
+    versioni = set()
+    for regressore in ('lineare', 'ridge', 'gradient_boosting'):
+        candidato = {'feature': 'numeriche', 'regressore': regressore}
+        percorso = str(tmp_path / f'{regressore}.json')
+        artefatto = da_risultato(train(inserzioni, regressore=regressore), candidato, 'stesso-dataset',
+                                 percorso, inserzioni)
+        versione = artefatto.versione
+        salva(artefatto, percorso)
+        assert carica(percorso).versione == versione
+        versioni.add(versione)
+    # Stesso dataset e stesso numero di aggiornamenti, ma modelli diversi
+    assert len(versioni) == 3
@@ -0,0 +1,49 @@
+import numpy as np
+
+from valutazione.artefatto import da_risultato
+from valutazione.cache import CachePrevisioni
+from valutazione.incrementale import assorbi
+from valutazione.modello import prevedi_svalutazione, train
+
+
+def _artefatto(inserzioni, tmp_path):
+    candidato = {'feature': 'numeriche', 'regressore': 'lineare'}
+    return da_risultato(train(inserzioni), candidato, 'test', str(tmp_path / 'modello.json'), inserzioni)
+
+
+def test_evizione_lru_e_arrotondamento_km(inserzioni, tmp_path):
+    artefatto = _artefatto(inserzioni, tmp_path)
+    cache = CachePrevisioni(dimensione=2, passo_km=1000)
+
+    cache.prevedi_svalutazione(artefatto, 2020, 50_000)
+    cache.prevedi_svalutazione(artefatto, 2021, 30_000)
+    # Stesso bucket di 50_000 km: hit, e la voce 2020 diventa la più recente
+    assert cache.prevedi_svalutazione(artefatto, 2020, 50_400) == prevedi_svalutazione(artefatto, 2020, 50_000)
+    cache.prevedi_svalutazione(artefatto, 2022, 10_000)  # esce la meno recente, 2021
+
+    statistiche = cache.statistiche()
+    assert (statistiche['hit'], statistiche['miss'], statistiche['evizioni'], statistiche['voci']) == (1, 3, 1, 2)
+    cache.prevedi_svalutazione(artefatto, 2020, 50_000)
+    cache.prevedi_svalutazione(artefatto, 2021, 30_000)
+    assert (cache.hit, cache.miss) == (2, 4)
+
+
+def test_nuova_versione_del_modello_invalida_le_voci(inserzioni, tmp_path):
+    artefatto = _artefatto(inserzioni, tmp_path)
+    cache = CachePrevisioni()
+    prima = cache.prevedi_svalutazione(artefatto, 2020, 50_000)
+
+    rng = np.random.default_rng(1)
+    X = np.column_stack([rng.integers(2015, 2024, 50), rng.integers(0, 100_000, 50)])
+    nuovo = assorbi(artefatto, X, np.full(50, 60.0))
+    assert nuovo.versione != artefatto.versione
+
+    dopo = cache.prevedi_svalutazione(nuovo, 2020, 50_000)
+    assert cache.miss == 2
+    assert dopo == prevedi_svalutazione(nuovo, 2020, 50_000) != prima
+    # Il vecchio modello continua a trovare le sue voci finché non escono per LRU
+    assert cache.prevedi_svalutazione(artefatto, 2020, 50_000) == prima
+
+    cache.svuota()
+    cache.prevedi_svalutazione(nuovo, 2020, 50_000)
+    assert cache.statistiche()['invalidazioni'] == 1 and cache.miss == 3
@@ -0,0 +1,31 @@
+import threading
+
+from valutazione import comparabili
+
+
+def test_un_solo_processo_costruisce_l_indice(inserzioni, tmp_path, monkeypatch):
+    csv = tmp_path / 'inserzioni.csv'
+    inserzioni.drop(columns='Svalutazione_Percentuale').to_csv(csv, index=False)
+    percorso = str(tmp_path / 'modello.json.comparabili')
+
+    costruzioni = []
+    costruisci = comparabili.costruisci
+    monkeypatch.setattr(comparabili, 'costruisci', lambda *a, **k: costruzioni.append(1) or costruisci(*a, **k))
+
+    # Worker che partono insieme sullo stesso dataset: uno costruisce, gli altri mappano i suoi file
+    indici = [None] * 8
+    barriera = threading.Barrier(len(indici))
+
+    def worker(i):
+        barriera.wait()
+        indici[i] = comparabili.carica_o_costruisci(str(csv), percorso, 'impronta')
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(indici))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(costruzioni) == 1
+    vicini = [indice.cerca(2020, 50_000, 40_000, 'Buone', k=3) for indice in indici]
+    assert all(v == vicini[0] for v in vicini)
@@ -0,0 +1,19 @@
+from valutazione.artefatto import ArtefattoModello, ArtefattoPipeline, da_risultato
+from valutazione.condivisione import ModelloCondiviso, pubblica
+from valutazione.modello import train
+
+
+def _artefatto(df, regressore, percorso):
+    candidato = {'feature': 'numeriche', 'regressore': regressore}
+    return da_risultato(train(df, regressore=regressore), candidato, 'stesso-dataset', percorso, df)
+
+
+def test_nuovo_modello_sullo_stesso_dataset_arriva_ai_worker(inserzioni, tmp_path):
+    cartella = str(tmp_path / 'condivisa')
+    pubblica(_artefatto(inserzioni, 'lineare', str(tmp_path / 'a.json')), cartella)
+    worker = ModelloCondiviso(cartella)
+    assert isinstance(worker.modello, ArtefattoModello)
+
+    pubblica(_artefatto(inserzioni, 'gradient_boosting', str(tmp_path / 'b.json')), cartella)
+    assert worker.aggiorna()
+    assert isinstance(worker.modello, ArtefattoPipeline)
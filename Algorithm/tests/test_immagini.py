@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from valutazione.immagini import MAX_RISOLUZIONE, ServizioGrafici, normalizza_parametri
+from valutazione.proiezione import MAX_ANNI_PREVISIONE
+
+
+def test_parametri_limitati_al_loro_intervallo():
+    curva = normalizza_parametri('curva', {'anni_previsione': '1000', 'chilometri': '-5'})
+    assert curva['anni_previsione'] == MAX_ANNI_PREVISIONE
+    assert curva['chilometri'] == 0.0
+    assert normalizza_parametri('superficie_3d', {'risoluzione': 10**6})['risoluzione'] == MAX_RISOLUZIONE
+    with pytest.raises(ValueError):
+        normalizza_parametri('curva', {'km_annui': 'nan'})
+
+
+class PoolFinto:
+    """
+    Restituisce Future già completati: il primo con il pool rotto, poi con il risultato
+    """
+
+    def __init__(self, risultati):
+        self.risultati = list(risultati)
+
+    def submit(self, funzione, *argomenti):
+        futuro = Future()
+        risultato = self.risultati.pop(0)
+        if isinstance(risultato, BaseException):
+            futuro.set_exception(risultato)
+        else:
+            futuro.set_result(risultato)
+        return futuro
+
+    def shutdown(self, **opzioni):
+        pass
+
+
+class ModelloFinto:
+    versione = 'test'
+
+
+def test_pool_rotto_con_future_gia_completato_non_blocca(tmp_path):
+    servizio = ServizioGrafici(str(tmp_path))
+    pool = PoolFinto([BrokenProcessPool('morto'), 'immagine.png'])
+    # Anche il pool "nuovo" del secondo tentativo è lo stesso finto
+    servizio._esecutore = lambda: pool
+    futuro = servizio.richiedi(ModelloFinto(), 'importanza')
+    assert futuro.result(timeout=5) == 'immagine.png'
+    assert servizio.statistiche()['in_corso'] == 0
+
+
+def test_oltre_max_file_si_eliminano_le_immagini_meno_recenti(tmp_path):
+    servizio = ServizioGrafici(str(tmp_path), max_file=2)
+    for i, nome in enumerate(('a.png', 'b.svg', 'c.png')):
+        percorso = tmp_path / nome
+        percorso.write_bytes(b'x')
+        os.utime(percorso, ns=(i * 10**9, i * 10**9))
+    servizio._elimina_vecchi()
+    assert sorted(os.listdir(tmp_path)) == ['b.svg', 'c.png']
+    assert servizio.statistiche()['eliminati'] == 1
@@ -0,0 +1,34 @@
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from valutazione.artefatto import da_risultato
+from valutazione.incrementale import assorbi
+from valutazione.modello import COLONNA_TARGET, COLONNE_FEATURE, crea_pipeline, train
+
+
+def test_assorbire_un_blocco_equivale_a_riaddestrare(inserzioni, tmp_path):
+    candidato = {'feature': 'numeriche', 'regressore': 'lineare'}
+    artefatto = da_risultato(train(inserzioni), candidato, 'test', str(tmp_path / 'modello.json'), inserzioni)
+
+    # Nuove inserzioni con una svalutazione diversa, più una riga senza chilometri che va scartata
+    rng = np.random.default_rng(1)
+    anni = rng.integers(2015, 2024, 50).astype(float)
+    chilometri = rng.integers(0, 100_000, 50).astype(float)
+    chilometri[7] = np.nan
+    svalutazioni = 10 + (2024 - anni) * 5 + chilometri / 5_000
+    X = np.column_stack([anni, chilometri])
+    nuovo = assorbi(artefatto, X, svalutazioni)
+
+    # Riferimento: la stessa pipeline addestrata sulle righe di training più quelle nuove valide
+    X_train, _, y_train, _ = train_test_split(inserzioni[COLONNE_FEATURE].to_numpy(dtype=float),
+                                              inserzioni[COLONNA_TARGET].to_numpy(dtype=float),
+                                              test_size=0.2, random_state=42)
+    valide = ~np.isnan(chilometri)
+    pipeline = crea_pipeline().fit(np.vstack([X_train, X[valide]]),
+                                   np.concatenate([y_train, svalutazioni[valide]]))
+
+    assert nuovo.sufficienti.n - artefatto.sufficienti.n == valide.sum()
+    assert np.allclose(nuovo.media, pipeline['scaler'].mean_, rtol=1e-9)
+    assert np.allclose(nuovo.scala, pipeline['scaler'].scale_, rtol=1e-9)
+    assert np.allclose(nuovo.coefficienti, pipeline['regressor'].coef_, rtol=1e-9)
+    assert np.isclose(nuovo.intercetta, pipeline['regressor'].intercept_, rtol=1e-9)
@@ -0,0 +1,56 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from valutazione.colonnare import carica_dataframe
+from valutazione.dati import statistiche
+from valutazione.ingestione import leggi_a_blocchi, statistiche_streaming
+from valutazione.modello import train
+
+CSV_ANNO_MANCANTE = Path(__file__).parent / 'dati' / 'inserzioni_anno_mancante.csv'
+
+
+def test_statistiche_streaming_con_anno_mancante():
+    statistiche = statistiche_streaming(CSV_ANNO_MANCANTE, dimensione_blocco=3)
+    # La riga senza anno viene esclusa dalle statistiche numeriche
+    assert statistiche['descrittive'].loc['count', 'Anno'] == 7
+    assert 2018 in statistiche['per_anno'].index
+
+
+def test_statistiche_streaming_coincidono_con_pandas():
+    df = pd.concat(leggi_a_blocchi(CSV_ANNO_MANCANTE), ignore_index=True)
+    # Gli accumulatori lavorano in float64: il riferimento pure, altrimenti pandas calcola std in float32
+    attese = statistiche(df.astype({c: float for c in df.select_dtypes('number')}))
+    # Blocchi da 3 righe: la riga senza anno cade a metà del primo blocco e gli accumulatori vanno uniti
+    ottenute = statistiche_streaming(CSV_ANNO_MANCANTE, dimensione_blocco=3)
+
+    # Ogni colonna usa tutti i suoi valori presenti: i Chilometri della riga senza anno contano
+    assert ottenute['descrittive'].loc['count', 'Chilometri'] == 8
+    pd.testing.assert_frame_equal(ottenute['descrittive'], attese['descrittive'][ottenute['descrittive'].columns],
+                                  rtol=1e-9)
+    pd.testing.assert_frame_equal(ottenute['correlazioni'], attese['correlazioni'], rtol=1e-9)
+    for chiave in ('per_anno', 'per_condizioni'):
+        pd.testing.assert_series_equal(ottenute[chiave], attese[chiave], rtol=1e-9,
+                                       check_index_type=False, check_categorical=False)
+
+
+def test_colonnare_e_addestramento_con_anno_mancante(tmp_path):
+    csv = tmp_path / CSV_ANNO_MANCANTE.name
+    shutil.copy(CSV_ANNO_MANCANTE, csv)
+    df = carica_dataframe(str(csv))
+    assert len(df) == 8
+    assert np.isnan(df['Anno']).sum() == 1
+
+    risultato = train(df, test_size=0.25)
+    assert np.isfinite(risultato.rmse)
+
+
+def test_colonnare_conserva_i_centesimi_dei_prezzi(tmp_path):
+    csv = tmp_path / 'inserzioni.csv'
+    csv.write_text('Anno,Chilometri,Prezzo di Listino,Prezzo,Condizioni\n'
+                   '2021,30000,52999.99,45158.93,Buone\n')
+    df = carica_dataframe(str(csv))
+    assert float(df['Prezzo di Listino'].iloc[0]) == 52999.99
+    assert float(df['Prezzo'].iloc[0]) == 45158.93
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from valutazione.artefatto import da_risultato
+from valutazione.dati import aggiungi_svalutazione
+from valutazione.modello import predict, train
+
+
+def _inserzioni_per_marca(n=400):
+    # Stessa età e chilometraggio, ma le Skoda si svalutano molto più delle Volkswagen
+    rng = np.random.default_rng(0)
+    marche = np.where(np.arange(n) % 2 == 0, 'Volkswagen', 'Skoda')
+    anni = rng.integers(2015, 2024, n)
+    chilometri = rng.integers(0, 150_000, n)
+    svalutazione = 5 + (2024 - anni) * 3 + chilometri / 10_000 + np.where(marche == 'Skoda', 15, 0)
+    df = pd.DataFrame({
+        'Anno': anni,
+        'Chilometri': chilometri,
+        'Prezzo di Listino': 30_000.0,
+        'Prezzo': 30_000.0 * (1 - svalutazione / 100),
+        'Condizioni': 'Buone',
+        'Marca': marche,
+    })
+    return aggiungi_svalutazione(df)
+
+
+def test_marche_diverse_danno_valutazioni_diverse(tmp_path):
+    df = _inserzioni_per_marca()
+    candidato = {'feature': 'categoriche', 'regressore': 'ridge'}
+    artefatto = da_risultato(train(df, **candidato), candidato, 'test', str(tmp_path / 'modello.json'), df)
+
+    svalutazioni = predict(artefatto, [2020, 2020], [50_000, 50_000],
+                           categoriche={'Marca': ['Volkswagen', 'Skoda']})
+    assert svalutazioni[1] - svalutazioni[0] > 10
+
+    # Senza marca si usa il valore più frequente del dataset, non una delle due a caso
+    senza_marca = predict(artefatto, [2020], [50_000])
+    con_moda = predict(artefatto, [2020], [50_000], categoriche={'Marca': [artefatto.valori_predefiniti['Marca']]})
+    assert np.allclose(senza_marca, con_moda)
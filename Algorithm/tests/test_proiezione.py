@@ -0,0 +1,47 @@
+import numpy as np
+
+from valutazione.proiezione import proietta
+
+
+def _proiezione_a_ciclo(svalutazione_attuale, km_base, prezzo_listino, anni_previsione, km_annui, anno_attuale):
+    # Il ciclo anno per anno dell'originale prevedi_svalutazione_nel_tempo di car_value.py
+    valore_attuale = prezzo_listino * (1 - svalutazione_attuale / 100)
+    anni = [anno_attuale]
+    chilometri = [km_base]
+    svalutazioni = [svalutazione_attuale]
+    valori = [valore_attuale]
+    perdite_euro = []
+    perdite_percentuali = []
+    valore_precedente = valore_attuale
+    tasso_base = 0.09
+    for i in range(1, anni_previsione + 1):
+        tasso_base *= 0.85
+        tasso_annuo = tasso_base + (km_annui / 20000) * 0.20
+        valore_nuovo = valore_precedente * (1 - tasso_annuo)
+        perdita_euro = valore_precedente - valore_nuovo
+        anni.append(anno_attuale + i)
+        chilometri.append(km_base + km_annui * i)
+        svalutazioni.append(((prezzo_listino - valore_nuovo) / prezzo_listino) * 100)
+        valori.append(valore_nuovo)
+        perdite_euro.append(perdita_euro)
+        perdite_percentuali.append((perdita_euro / valore_precedente) * 100)
+        valore_precedente = valore_nuovo
+    return {'anni': anni, 'chilometri': chilometri, 'svalutazioni': svalutazioni, 'valori': valori,
+            'perdite_euro': perdite_euro, 'perdite_percentuali': perdite_percentuali}
+
+
+def test_proiezione_vettoriale_coincide_con_il_ciclo_originale():
+    rng = np.random.default_rng(0)
+    n, anni_previsione = 200, 20
+    svalutazioni = rng.uniform(0, 80, n)
+    km_base = rng.integers(0, 250_000, n).astype(float)
+    listini = rng.uniform(15_000, 90_000, n)
+    km_annui = rng.uniform(0, 40_000, n)
+
+    proiezione = proietta(svalutazioni, km_base, listini, km_annui, anni_previsione, anno_attuale=2025)
+    for i in range(n):
+        attesa = _proiezione_a_ciclo(svalutazioni[i], km_base[i], listini[i], anni_previsione, km_annui[i], 2025)
+        ottenuta = proiezione.veicolo(i)
+        assert ottenuta['anni'] == attesa['anni']
+        for chiave in ('chilometri', 'svalutazioni', 'valori', 'perdite_euro', 'perdite_percentuali'):
+            np.testing.assert_allclose(ottenuta[chiave], attesa[chiave], rtol=1e-12, atol=1e-9)
@@ -0,0 +1,10 @@
+import numpy as np
+
+from valutazione.simulazione import simula
+
+
+def test_percentili_ordinati_anche_con_svalutazione_oltre_il_100():
+    # Il secondo veicolo parte da un valore negativo (svalutazione del 120%)
+    bande = simula([30, 120], 40_000, 15_000, 5, percorsi=2_000, percentili=(10, 50, 90))
+    assert np.all(np.diff(bande.valori, axis=1) >= 0)
+    assert np.all(np.diff(bande.svalutazioni, axis=1) <= 0)
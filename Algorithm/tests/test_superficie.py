@@ -0,0 +1,40 @@
+import numpy as np
+
+from valutazione.modello import train
+from valutazione.superficie import costruisci
+
+
+class _Quadratico:
+    # f(anno, km) = a (anno - 2000)^2 + b km^2: f_xx = 2a, f_yy = 2b
+    a, b = 0.01, 1e-9
+
+    def predict(self, X):
+        return self.a * (X[:, 0] - 2000) ** 2 + self.b * X[:, 1] ** 2
+
+
+def _punti_casuali(superficie, n=20_000):
+    rng = np.random.default_rng(0)
+    return rng.uniform(*superficie.anni[:2], n), rng.uniform(*superficie.chilometri[:2], n)
+
+
+def test_modello_lineare_interpolato_esattamente(inserzioni):
+    pipeline = train(inserzioni).pipeline
+    superficie = costruisci(pipeline)
+    anni, chilometri = _punti_casuali(superficie)
+    esatti = pipeline.predict(np.column_stack([anni, chilometri]))
+    assert np.max(np.abs(superficie.interpola(anni, chilometri) - esatti)) < 1e-9
+    assert superficie.errore_massimo < 1e-9
+
+
+def test_errore_entro_il_limite_bilineare():
+    modello = _Quadratico()
+    superficie = costruisci(modello)
+    hx = (superficie.anni[1] - superficie.anni[0]) / (superficie.anni[2] - 1)
+    hy = (superficie.chilometri[1] - superficie.chilometri[0]) / (superficie.chilometri[2] - 1)
+    limite = hx ** 2 / 8 * 2 * modello.a + hy ** 2 / 8 * 2 * modello.b
+
+    anni, chilometri = _punti_casuali(superficie)
+    errori = np.abs(superficie.interpola(anni, chilometri) - modello.predict(np.column_stack([anni, chilometri])))
+    assert errori.max() <= limite * (1 + 1e-9)
+    # Sui punti medi delle celle l'errore raggiunge il limite
+    assert np.isclose(superficie.errore_massimo, limite)
@@ -0,0 +1,54 @@
+"""
+Libreria di valutazione della svalutazione delle auto usate.
+
+L'import del pacchetto non ha effetti collaterali: i sottomoduli (e con loro
+pandas, scikit-learn, matplotlib, seaborn e ipywidgets) vengono caricati solo
+al primo accesso, cosi' l'API e i job batch pagano solo cio' che usano.
+"""
+import importlib
+
+# Nome pubblico -> sottomodulo che lo definisce
+_ESPORTAZIONI = {
+    'load_dataset': 'dati',
+    'aggiungi_svalutazione': 'dati',
+    'statistiche': 'dati',
+    'statistiche_streaming': 'ingestione',
+    'train': 'modello',
+    'predict': 'modello',
+    'prevedi_svalutazione': 'modello',
+    'prevedi_svalutazione_nel_tempo': 'modello',
+    'prevedi_flotta': 'modello',
+    'prevedi_bande': 'modello',
+    'proietta': 'proiezione',
+    'Proiezione': 'proiezione',
+    'analizza_curve': 'proiezione',
+    'simula': 'simulazione',
+    'ArtefattoModello': 'artefatto',
+    'ArtefattoPipeline': 'artefatto',
+    'carica_o_addestra': 'artefatto',
+    'seleziona_e_salva': 'selezione',
+    'CachePrevisioni': 'cache',
+    'valuta_flusso': 'flusso',
+    'assorbi': 'incrementale',
+    'RegistroModelli': 'registro',
+    'IndiceComparabili': 'comparabili',
+}
+
+_SOTTOMODULI = ('metriche', 'dati', 'ingestione', 'colonnare', 'modello', 'proiezione', 'simulazione', 'flusso', 'comparabili', 'superficie', 'artefatto', 'condivisione', 'selezione', 'immagini', 'incrementale', 'cache', 'registro', 'grafici', 'interfaccia')
+
+__all__ = list(_ESPORTAZIONI) + list(_SOTTOMODULI)
+
+
+def __getattr__(nome):
+    if nome in _SOTTOMODULI:
+        return importlib.import_module(f'.{nome}', __name__)
+    modulo = _ESPORTAZIONI.get(nome)
+    if modulo is None:
+        raise AttributeError(f"il modulo {__name__!r} non ha l'attributo {nome!r}")
+    valore = getattr(importlib.import_module(f'.{modulo}', __name__), nome)
+    globals()[nome] = valore
+    return valore
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,402 @@
+"""
+Artefatto persistente del modello di svalutazione.
+
+Il file JSON contiene le statistiche dello StandardScaler, i coefficienti della
+LinearRegression e l'impronta (SHA-256) del dataset di addestramento. Al
+riavvio l'artefatto viene riusato se l'impronta coincide e il modello viene
+riaddestrato solo quando i dati cambiano. Se presenti, vengono salvate anche
+le statistiche sufficienti per gli aggiornamenti incrementali e la superficie
+di interpolazione usata per servire le previsioni. Per fare previsioni da un
+artefatto caricato basta numpy: scikit-learn serve solo per riaddestrare.
+
+Se la selezione del modello (selezione.py) sceglie una pipeline che non e' una
+regressione lineare sulle sole variabili numeriche, la pipeline viene salvata
+con pickle accanto al JSON (ArtefattoPipeline) e caricata solo se serve davvero:
+le previsioni dentro la griglia arrivano dalla superficie di interpolazione.
+
+La versione di un artefatto (usata da cache, grafici e pubblicazione condivisa)
+combina impronta del dataset, aggiornamenti incrementali, candidato scelto e
+una firma dei parametri del modello o dei byte della pipeline.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .metriche import cronometro
+from .modello import COLONNE_FEATURE
+from .momenti import Comomenti
+from .superficie import SuperficieSvalutazione, costruisci as costruisci_superficie
+
+FORMATO = 1
+DIMENSIONE_BLOCCO = 1 << 20
+SUFFISSO_PIPELINE = '.pipeline.pkl'
+CANDIDATO_PREDEFINITO = {'feature': 'numeriche', 'regressore': 'lineare'}
+REGRESSORI_LINEARI = ('lineare', 'ridge', 'lasso')
+
+
+@dataclass
+class ArtefattoModello:
+    media: np.ndarray
+    scala: np.ndarray
+    coefficienti: np.ndarray
+    intercetta: float
+    impronta: str
+    feature: list = field(default_factory=lambda: list(COLONNE_FEATURE))
+    metriche: dict = field(default_factory=dict)
+    sorgente: dict = field(default_factory=dict)
+    sufficienti: Comomenti = None
+    aggiornamenti: int = 0
+    superficie: SuperficieSvalutazione = None
+    candidato: dict = field(default_factory=lambda: dict(CANDIDATO_PREDEFINITO))
+    _firma: str = field(default=None, repr=False, compare=False)
+
+    # Scaler + regressione lineare: la previsione esatta è un prodotto scalare
+    lineare = True
+
+    @property
+    def versione(self):
+        # Cambia quando cambiano dataset, aggiornamenti, candidato o parametri del modello
+        if self._firma is None:
+            parametri = np.concatenate([self.media, self.scala, self.coefficienti, [self.intercetta]])
+            self._firma = _firma(np.ascontiguousarray(parametri, dtype=float).tobytes())
+        return _versione(self.impronta, self.aggiornamenti, self.candidato, self._firma)
+
+    def predict(self, X):
+        """
+        Stesso risultato di Pipeline(StandardScaler, LinearRegression).predict
+        """
+        with cronometro('scaler'):
+            Z = (np.asarray(X, dtype=float) - self.media) / self.scala
+        with cronometro('regressore'):
+            return Z @ self.coefficienti + self.intercetta
+
+    def to_dict(self):
+        dati = {
+            'formato': FORMATO,
+            'tipo': 'lineare',
+            'candidato': self.candidato,
+            'feature': list(self.feature),
+            'scaler': {'media': self.media.tolist(), 'scala': self.scala.tolist()},
+            'regressore': {'coefficienti': self.coefficienti.tolist(), 'intercetta': self.intercetta},
+            'impronta': self.impronta,
+            'metriche': self.metriche,
+            'sorgente': self.sorgente,
+            'aggiornamenti': self.aggiornamenti,
+        }
+        if self.sufficienti is not None:
+            dati['statistiche_sufficienti'] = self.sufficienti.to_dict()
+        if self.superficie is not None:
+            dati['superficie'] = self.superficie.to_dict()
+        return dati
+
+    @classmethod
+    def from_dict(cls, dati, cartella='.'):
+        if dati.get('formato') != FORMATO:
+            raise ValueError(f"Formato artefatto non supportato: {dati.get('formato')!r}")
+        if dati.get('tipo', 'lineare') == 'pipeline':
+            return ArtefattoPipeline.from_dict(dati, cartella)
+        return cls(
+            media=np.asarray(dati['scaler']['media'], dtype=float),
+            scala=np.asarray(dati['scaler']['scala'], dtype=float),
+            coefficienti=np.asarray(dati['regressore']['coefficienti'], dtype=float),
+            intercetta=float(dati['regressore']['intercetta']),
+            impronta=dati['impronta'],
+            feature=list(dati['feature']),
+            metriche=dati.get('metriche', {}),
+            sorgente=dati.get('sorgente', {}),
+            sufficienti=Comomenti.from_dict(dati['statistiche_sufficienti']) if 'statistiche_sufficienti' in dati else None,
+            aggiornamenti=int(dati.get('aggiornamenti', 0)),
+            superficie=SuperficieSvalutazione.from_dict(dati['superficie']) if 'superficie' in dati else None,
+            candidato=dati.get('candidato', dict(CANDIDATO_PREDEFINITO)),
+        )
+
+
+@dataclass
+class ArtefattoPipeline:
+    """
+    Pipeline scikit-learn generica (regressori non lineari o feature categoriche).
+    Riceve come ArtefattoModello le colonne (Anno, Chilometri) e, se ci sono,
+    le feature categoriche del veicolo; quelle mancanti prendono i
+    valori_predefiniti (es. la Condizioni più frequente nel dataset).
+    """
+    file_pipeline: str
+    impronta: str
+    candidato: dict
+    feature: list
+    valori_predefiniti: dict = field(default_factory=dict)
+    metriche: dict = field(default_factory=dict)
+    sorgente: dict = field(default_factory=dict)
+    superficie: SuperficieSvalutazione = None
+    aggiornamenti: int = 0
+    firma: str = None  # SHA-256 (abbreviato) dei byte della pipeline in pickle
+    sufficienti = None
+    lineare = False
+    _pipeline: object = field(default=None, repr=False)
+
+    @property
+    def versione(self):
+        if self.firma is None:
+            if self._pipeline is not None:
+                dati = pickle.dumps(self._pipeline, protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                # Artefatto salvato prima che la firma venisse registrata nel JSON
+                with open(self.file_pipeline, 'rb') as f:
+                    dati = f.read()
+            self.firma = _firma(dati)
+        return _versione(self.impronta, self.aggiornamenti, self.candidato, self.firma)
+
+    @property
+    def pipeline(self):
+        # Caricata (con scikit-learn) solo al primo uso
+        if self._pipeline is None:
+            with cronometro('caricamento_modello'):
+                with open(self.file_pipeline, 'rb') as f:
+                    self._pipeline = pickle.load(f)
+        return self._pipeline
+
+    def predict(self, X):
+        """
+        X è un array (Anno, Chilometri) oppure un DataFrame che può contenere
+        anche le colonne categoriche: colonne e valori mancanti prendono i
+        valori_predefiniti
+        """
+        with cronometro('costruzione_feature'):
+            if self.candidato['feature'] == 'numeriche':
+                ingresso = np.asarray(X[COLONNE_FEATURE] if hasattr(X, 'columns') else X, dtype=float)
+            else:
+                import pandas as pd
+                if not hasattr(X, 'columns'):
+                    X = pd.DataFrame(np.asarray(X, dtype=float), columns=COLONNE_FEATURE)
+                ingresso = X.reindex(columns=self.feature)
+                for colonna, valore in self.valori_predefiniti.items():
+                    if valore is not None:
+                        serie = ingresso[colonna].astype(object)
+                        ingresso[colonna] = serie.where(serie.notna(), valore)
+        with cronometro('modello'):
+            return self.pipeline.predict(ingresso)
+
+    def to_dict(self):
+        dati = {
+            'formato': FORMATO,
+            'tipo': 'pipeline',
+            'candidato': self.candidato,
+            'feature': list(self.feature),
+            'file_pipeline': os.path.basename(self.file_pipeline),
+            'valori_predefiniti': self.valori_predefiniti,
+            'impronta': self.impronta,
+            'metriche': self.metriche,
+            'sorgente': self.sorgente,
+            'aggiornamenti': self.aggiornamenti,
+            'firma': self.firma,
+        }
+        if self.superficie is not None:
+            dati['superficie'] = self.superficie.to_dict()
+        return dati
+
+    @classmethod
+    def from_dict(cls, dati, cartella='.'):
+        return cls(
+            file_pipeline=os.path.join(cartella, dati['file_pipeline']),
+            impronta=dati['impronta'],
+            candidato=dati['candidato'],
+            feature=list(dati['feature']),
+            valori_predefiniti=dati.get('valori_predefiniti', {}),
+            metriche=dati.get('metriche', {}),
+            sorgente=dati.get('sorgente', {}),
+            superficie=SuperficieSvalutazione.from_dict(dati['superficie']) if 'superficie' in dati else None,
+            aggiornamenti=int(dati.get('aggiornamenti', 0)),
+            firma=dati.get('firma'),
+        )
+
+
+def _firma(dati):
+    return hashlib.sha256(dati).hexdigest()[:16]
+
+
+def _versione(impronta, aggiornamenti, candidato, firma):
+    return f"{impronta}:{aggiornamenti}:{candidato['feature']}-{candidato['regressore']}:{firma}"
+
+
+def da_pipeline(pipeline, impronta, metriche=None, sorgente=None, sufficienti=None, candidato=None):
+    """
+    Estrae scaler e regressore da una pipeline scikit-learn addestrata
+    """
+    scaler = pipeline['scaler']
+    regressore = pipeline['regressor']
+    return ArtefattoModello(
+        media=np.asarray(scaler.mean_, dtype=float),
+        scala=np.asarray(scaler.scale_, dtype=float),
+        coefficienti=np.asarray(regressore.coef_, dtype=float),
+        intercetta=float(regressore.intercept_),
+        impronta=impronta,
+        metriche=dict(metriche or {}),
+        sorgente=dict(sorgente or {}),
+        sufficienti=sufficienti,
+        candidato=dict(candidato or CANDIDATO_PREDEFINITO),
+    )
+
+
+def da_risultato(risultato, candidato, impronta, percorso_artefatto, df, metriche=None, sorgente=None):
+    """
+    Artefatto di servizio per una pipeline addestrata: JSON puro per le
+    regressioni lineari sulle variabili numeriche, pipeline in pickle altrimenti
+    """
+    from .modello import FEATURE_SET
+
+    metriche = {'r2': risultato.r2, 'rmse': risultato.rmse, **(metriche or {})}
+    if candidato['feature'] == 'numeriche' and candidato['regressore'] in REGRESSORI_LINEARI:
+        return da_pipeline(risultato.pipeline, impronta, metriche, sorgente, risultato.sufficienti, candidato)
+
+    feature = FEATURE_SET[candidato['feature']]
+    # Le colonne hash assenti dal dataset restano vuote (None)
+    valori_predefiniti = {c: str(df[c].mode().iloc[0]) if c in df else None
+                          for c in feature if c not in COLONNE_FEATURE}
+    artefatto = ArtefattoPipeline(
+        file_pipeline=percorso_artefatto + SUFFISSO_PIPELINE,
+        impronta=impronta,
+        candidato=dict(candidato),
+        feature=list(feature),
+        valori_predefiniti=valori_predefiniti,
+        metriche=metriche,
+        sorgente=dict(sorgente or {}),
+    )
+    artefatto._pipeline = risultato.pipeline
+    return artefatto
+
+
+def impronta_dataset(percorso):
+    """
+    SHA-256 del file del dataset, letto a blocchi
+    """
+    h = hashlib.sha256()
+    with open(percorso, 'rb') as f:
+        for blocco in iter(lambda: f.read(DIMENSIONE_BLOCCO), b''):
+            h.update(blocco)
+    return h.hexdigest()
+
+
+def info_sorgente(percorso):
+    st = os.stat(percorso)
+    return {'dimensione': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def salva(artefatto, percorso):
+    """
+    Scrive l'artefatto in modo atomico (file temporaneo + rename)
+    """
+    if isinstance(artefatto, ArtefattoPipeline):
+        dati = pickle.dumps(artefatto.pipeline, protocol=pickle.HIGHEST_PROTOCOL)
+        # La firma dei byte scritti entra nella versione: cambia con il modello, non solo con il dataset
+        artefatto.firma = _firma(dati)
+        artefatto.file_pipeline = percorso + SUFFISSO_PIPELINE
+        with _scrittura_atomica(artefatto.file_pipeline, 'wb') as f:
+            f.write(dati)
+    with _scrittura_atomica(percorso, 'w', encoding='utf-8') as f:
+        json.dump(artefatto.to_dict(), f, indent=2)
+
+
+@contextmanager
+def _scrittura_atomica(percorso, modo, **opzioni):
+    # File temporaneo distinto per processo e thread: scritture concorrenti non si pestano i piedi
+    temporaneo = f'{percorso}.tmp-{os.getpid()}-{threading.get_ident()}'
+    try:
+        with open(temporaneo, modo, **opzioni) as f:
+            yield f
+        os.replace(temporaneo, percorso)
+    finally:
+        if os.path.exists(temporaneo):
+            os.remove(temporaneo)
+
+
+def carica(percorso):
+    with open(percorso, encoding='utf-8') as f:
+        return ArtefattoModello.from_dict(json.load(f), os.path.dirname(percorso) or '.')
+
+
+def candidato_salvato(percorso_artefatto):
+    """
+    Feature e regressore scelti per l'artefatto su disco (anche se non più valido)
+    """
+    try:
+        with open(percorso_artefatto, encoding='utf-8') as f:
+            return json.load(f).get('candidato', dict(CANDIDATO_PREDEFINITO))
+    except (OSError, json.JSONDecodeError):
+        return dict(CANDIDATO_PREDEFINITO)
+
+
+def _artefatto_valido(percorso_artefatto, percorso_dataset):
+    """
+    L'artefatto su disco se corrisponde al dataset, altrimenti None.
+    Se dimensione e mtime del CSV non sono cambiati si evita di ricalcolare l'hash.
+    """
+    if not os.path.exists(percorso_artefatto):
+        return None, None
+    try:
+        artefatto = carica(percorso_artefatto)
+    except (ValueError, KeyError, json.JSONDecodeError):
+        return None, None
+    info = info_sorgente(percorso_dataset)
+    if artefatto.sorgente == info:
+        return artefatto, artefatto.impronta
+    impronta = impronta_dataset(percorso_dataset)
+    if artefatto.impronta == impronta:
+        return artefatto, impronta
+    return None, impronta
+
+
+def _con_superficie(artefatto, griglia):
+    # Gli artefatti salvati senza superficie (o con un'altra griglia) la ricostruiscono al caricamento
+    griglia = griglia or {}
+    superficie = artefatto.superficie
+    if superficie is None or any(tuple(v) != getattr(superficie, k) for k, v in griglia.items()):
+        artefatto.superficie = costruisci_superficie(artefatto, **griglia)
+    return artefatto
+
+
+def carica_o_addestra(percorso_dataset, percorso_artefatto, griglia=None):
+    """
+    Riusa l'artefatto se l'impronta del dataset coincide, altrimenti riaddestra
+    e salva. Senza dataset viene servito l'artefatto esistente. griglia
+    (anni=(min, max, nodi), chilometri=(min, max, nodi)) imposta la risoluzione
+    della superficie di interpolazione.
+    """
+    if not os.path.exists(percorso_dataset):
+        if os.path.exists(percorso_artefatto):
+            with cronometro('caricamento_modello'):
+                return _con_superficie(carica(percorso_artefatto), griglia)
+        raise FileNotFoundError(f'Né il dataset {percorso_dataset} né l\'artefatto {percorso_artefatto} esistono')
+
+    with cronometro('caricamento_modello'):
+        artefatto, impronta = _artefatto_valido(percorso_artefatto, percorso_dataset)
+        if artefatto is not None:
+            return _con_superficie(artefatto, griglia)
+
+    from .colonnare import COLONNE_MODELLO
+    from .dati import colonne_presenti, load_dataset
+    from .ingestione import DTYPE_INSERZIONI
+    from .modello import FEATURE_SET, train
+
+    if impronta is None:
+        impronta = impronta_dataset(percorso_dataset)
+    # Si riaddestra la stessa combinazione scelta dall'ultima selezione del modello
+    candidato = candidato_salvato(percorso_artefatto)
+    colonne = COLONNE_MODELLO + [c for c in FEATURE_SET[candidato['feature']] if c not in COLONNE_MODELLO]
+    colonnare = all(c in DTYPE_INSERZIONI for c in colonne)
+    with cronometro('caricamento_dataset'):
+        if not colonnare:
+            # Le colonne ad alta cardinalità non sono nella copia colonnare: si legge il CSV
+            colonne = colonne_presenti(percorso_dataset, colonne)
+        df = load_dataset(percorso_dataset, colonne=colonne, colonnare=colonnare)
+    with cronometro('addestramento_modello'):
+        risultato = train(df, **candidato)
+    artefatto = da_risultato(risultato, candidato, impronta, percorso_artefatto, df,
+                             sorgente=info_sorgente(percorso_dataset))
+    _con_superficie(artefatto, griglia)
+    salva(artefatto, percorso_artefatto)
+    return artefatto
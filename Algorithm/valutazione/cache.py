@@ -0,0 +1,123 @@
+"""
+Cache LRU delle previsioni.
+
+Il traffico reale e' molto ripetitivo (stesso anno, chilometraggi tondi dagli
+slider del frontend), quindi prevedi_svalutazione e la proiezione nel tempo
+vengono memoizzate in una cache di dimensione limitata. I chilometri possono
+essere arrotondati a un passo (km bucketing) per aumentare gli hit. Ogni voce
+e' legata alla versione dell'artefatto che l'ha prodotta: quando il modello
+cambia le voci vecchie non vengono piu' restituite ed escono per LRU, e la
+stessa cache puo' servire piu' modelli (ad esempio quelli del registro).
+"""
+import threading
+from collections import OrderedDict
+
+from . import modello as _modello
+
+
+class CachePrevisioni:
+    def __init__(self, dimensione=4096, passo_km=0):
+        if dimensione < 1:
+            raise ValueError('La dimensione della cache deve essere almeno 1')
+        self.dimensione = dimensione
+        self.passo_km = passo_km
+        self._voci = OrderedDict()
+        self._lock = threading.Lock()
+        self.hit = 0
+        self.miss = 0
+        self.evizioni = 0
+        self.invalidazioni = 0
+
+    def arrotonda_km(self, chilometri):
+        if not self.passo_km:
+            return chilometri
+        return round(chilometri / self.passo_km) * self.passo_km
+
+    def svuota(self):
+        with self._lock:
+            self._voci.clear()
+            self.invalidazioni += 1
+
+    @staticmethod
+    def _versione(modello):
+        # La versione identifica l'artefatto; per le pipeline sklearn si usa l'identità
+        return getattr(modello, 'versione', None) or id(modello)
+
+    def _cerca(self, chiave):
+        with self._lock:
+            if chiave in self._voci:
+                self._voci.move_to_end(chiave)
+                self.hit += 1
+                return True, self._voci[chiave]
+            self.miss += 1
+            return False, None
+
+    def _memorizza(self, chiave, valore):
+        with self._lock:
+            self._voci[chiave] = valore
+            self._voci.move_to_end(chiave)
+            while len(self._voci) > self.dimensione:
+                self._voci.popitem(last=False)
+                self.evizioni += 1
+
+    def _ottieni(self, modello, chiave, calcola):
+        chiave = (self._versione(modello),) + chiave
+        trovato, valore = self._cerca(chiave)
+        if not trovato:
+            valore = calcola()
+            self._memorizza(chiave, valore)
+        return valore
+
+    @staticmethod
+    def _categoriche(modello, categoriche):
+        # Solo i valori che il modello usa davvero, così non frammentano la chiave
+        if not categoriche:
+            return {}
+        usate = _modello.feature_categoriche(modello)
+        return {c: v for c, v in sorted(categoriche.items()) if v is not None and c in usate}
+
+    def prevedi_svalutazione(self, modello, anno, chilometri, categoriche=None):
+        chilometri = self.arrotonda_km(chilometri)
+        categoriche = self._categoriche(modello, categoriche)
+        return self._ottieni(
+            modello, ('svalutazione', anno, chilometri) + tuple(categoriche.items()),
+            lambda: _modello.prevedi_svalutazione(modello, anno, chilometri, categoriche),
+        )
+
+    async def prevedi_svalutazione_async(self, modello, anno, chilometri, prevedi, categoriche=None):
+        """
+        Come prevedi_svalutazione, ma in caso di miss attende la coroutine
+        prevedi(modello, anno, chilometri, categoriche) (ad esempio l'aggregatore dell'API)
+        """
+        chilometri = self.arrotonda_km(chilometri)
+        categoriche = self._categoriche(modello, categoriche)
+        chiave = (self._versione(modello), 'svalutazione', anno, chilometri) + tuple(categoriche.items())
+        trovato, valore = self._cerca(chiave)
+        if not trovato:
+            valore = await prevedi(modello, anno, chilometri, categoriche)
+            self._memorizza(chiave, valore)
+        return valore
+
+    def prevedi_svalutazione_nel_tempo(self, modello, anno_base, km_base, prezzo_listino, anni_previsione, km_annui):
+        km_base = self.arrotonda_km(km_base)
+        risultati = self._ottieni(
+            modello, ('tempo', anno_base, km_base, prezzo_listino, anni_previsione, km_annui),
+            lambda: _modello.prevedi_svalutazione_nel_tempo(
+                modello, anno_base, km_base, prezzo_listino, anni_previsione, km_annui),
+        )
+        # Copia delle liste: il chiamante può modificarle senza sporcare la cache
+        return {k: list(v) for k, v in risultati.items()}
+
+    def statistiche(self):
+        with self._lock:
+            richieste = self.hit + self.miss
+            return {
+                'dimensione': self.dimensione,
+                'voci': len(self._voci),
+                'passo_km': self.passo_km,
+                'hit': self.hit,
+                'miss': self.miss,
+                'evizioni': self.evizioni,
+                'invalidazioni': self.invalidazioni,
+                'hit_ratio': self.hit / richieste if richieste else 0.0,
+            }
@@ -0,0 +1,231 @@
+"""
+Formato colonnare su disco del dataset, caricabile con memory-map.
+
+Il CSV viene convertito una sola volta in una cartella accanto al file
+(<dataset>.csv.colonne/) con un file .npy per colonna, dtype compatti e
+Condizioni salvata come codici interi con l'elenco delle categorie nel
+manifest. Il caricamento apre solo le colonne richieste con np.load(mmap_mode='r'):
+niente parsing di testo e pagine lette dal disco solo quando servono.
+La conversione viene rifatta solo quando cambia il CSV di origine.
+
+Ogni conversione scrive una sottocartella di versione e poi riscrive in modo
+atomico il puntatore corrente.json: API, processi dei grafici e worker
+possono convertire e leggere in parallelo senza mai vedere una cartella a
+metà. Le ultime VERSIONI_CONSERVATE restano su disco per chi le sta leggendo.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from .artefatto import impronta_dataset, info_sorgente
+
+FORMATO = 2
+SUFFISSO_CARTELLA = '.colonne'
+DTYPE_CODICI = np.int16
+COLONNE_MODELLO = ['Anno', 'Chilometri', 'Prezzo di Listino', 'Prezzo']
+FILE_CORRENTE = 'corrente.json'
+FILE_MANIFEST = 'manifest.json'
+VERSIONI_CONSERVATE = 3
+TENTATIVI_LETTURA = 5
+
+
+def cartella_predefinita(percorso_csv):
+    return percorso_csv + SUFFISSO_CARTELLA
+
+
+def _nome_file(colonna):
+    return re.sub(r'[^a-z0-9]+', '-', colonna.lower()).strip('-') + '.npy'
+
+
+def _scrivi_json_atomico(percorso, dati):
+    temporaneo = f'{percorso}.tmp-{os.getpid()}-{threading.get_ident()}'
+    with open(temporaneo, 'w', encoding='utf-8') as f:
+        json.dump(dati, f, indent=2)
+    os.replace(temporaneo, percorso)
+
+
+def _versione_corrente(cartella):
+    """
+    Sottocartella della versione indicata dal puntatore, None se non c'è
+    """
+    try:
+        with open(os.path.join(cartella, FILE_CORRENTE), encoding='utf-8') as f:
+            return os.path.join(cartella, json.load(f)['cartella'])
+    except (OSError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def _leggi_manifest(versione):
+    try:
+        with open(os.path.join(versione, FILE_MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return manifest if manifest.get('formato') == FORMATO else None
+
+
+def _manifest_corrente(cartella):
+    versione = _versione_corrente(cartella)
+    manifest = None if versione is None else _leggi_manifest(versione)
+    return versione, manifest
+
+
+def aggiornato(percorso_csv, cartella=None):
+    """
+    True se la versione corrente della cartella colonnare corrisponde al CSV attuale
+    """
+    cartella = cartella or cartella_predefinita(percorso_csv)
+    versione, manifest = _manifest_corrente(cartella)
+    if manifest is None:
+        return False
+    if manifest['sorgente'] == info_sorgente(percorso_csv):
+        return True
+    if manifest['impronta'] != impronta_dataset(percorso_csv):
+        return False
+    # Stesso contenuto con mtime diverso: si aggiorna solo il manifest
+    manifest['sorgente'] = info_sorgente(percorso_csv)
+    _scrivi_json_atomico(os.path.join(versione, FILE_MANIFEST), manifest)
+    return True
+
+
+def converti(percorso_csv, cartella=None, dimensione_blocco=None):
+    """
+    Converte il CSV nel formato colonnare leggendolo a blocchi (memoria limitata)
+    """
+    from .ingestione import DIMENSIONE_BLOCCO, DTYPE_INSERZIONI, leggi_a_blocchi
+
+    cartella = cartella or cartella_predefinita(percorso_csv)
+    os.makedirs(cartella, exist_ok=True)
+    # Nome unico per processo e thread: conversioni concorrenti scrivono in versioni distinte
+    nome = f'v{time.time_ns()}-{os.getpid()}-{threading.get_ident()}'
+    temporanea = os.path.join(cartella, f'{nome}.tmp')
+    os.makedirs(temporanea)
+
+    sorgente = info_sorgente(percorso_csv)
+    impronta = impronta_dataset(percorso_csv)
+
+    import pandas as pd
+    intestazione = pd.read_csv(percorso_csv, nrows=0).columns
+    colonne = [c for c in DTYPE_INSERZIONI if c in intestazione]
+
+    # I dati grezzi di ogni colonna vengono accodati blocco per blocco; l'header .npy si scrive alla fine
+    grezzi = {c: open(os.path.join(temporanea, _nome_file(c) + '.raw'), 'wb') for c in colonne}
+    dtype = {}
+    indice_categorie = {}
+    righe = 0
+    try:
+        for blocco in leggi_a_blocchi(percorso_csv, dimensione_blocco or DIMENSIONE_BLOCCO, colonne):
+            for c in colonne:
+                serie = blocco[c]
+                if c == 'Condizioni':
+                    nuove = [indice_categorie.setdefault(cat, len(indice_categorie)) for cat in serie.cat.categories]
+                    if len(indice_categorie) > np.iinfo(DTYPE_CODICI).max:
+                        raise ValueError('Troppe categorie distinte in Condizioni')
+                    mappa = np.append(np.asarray(nuove, dtype=DTYPE_CODICI), DTYPE_CODICI(-1))
+                    valori = mappa[serie.cat.codes.to_numpy()]  # il codice -1 (mancante) resta -1
+                else:
+                    valori = serie.to_numpy()
+                dtype[c] = valori.dtype
+                grezzi[c].write(np.ascontiguousarray(valori).tobytes())
+            righe += len(blocco)
+    finally:
+        for f in grezzi.values():
+            f.close()
+    categorie = list(indice_categorie)
+
+    for c in colonne:
+        tipo = np.dtype(dtype.get(c, DTYPE_CODICI if c == 'Condizioni' else DTYPE_INSERZIONI[c]))
+        grezzo = os.path.join(temporanea, _nome_file(c) + '.raw')
+        with open(os.path.join(temporanea, _nome_file(c)), 'wb') as f:
+            np.lib.format.write_array_header_1_0(f, {
+                'descr': np.lib.format.dtype_to_descr(tipo), 'fortran_order': False, 'shape': (righe,),
+            })
+            with open(grezzo, 'rb') as g:
+                shutil.copyfileobj(g, f)
+        os.remove(grezzo)
+
+    manifest = {
+        'formato': FORMATO,
+        'righe': righe,
+        'colonne': {c: _nome_file(c) for c in colonne},
+        'categorie': {'Condizioni': categorie} if 'Condizioni' in colonne else {},
+        'impronta': impronta,
+        'sorgente': sorgente,
+    }
+    with open(os.path.join(temporanea, FILE_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    # La versione completa diventa visibile solo con la riscrittura atomica del puntatore
+    os.replace(temporanea, os.path.join(cartella, nome))
+    _scrivi_json_atomico(os.path.join(cartella, FILE_CORRENTE), {'cartella': nome})
+    _elimina_vecchie(cartella, nome)
+    return cartella
+
+
+def _elimina_vecchie(cartella, corrente):
+    # I lettori che hanno già mappato i vecchi file continuano a leggerli finché non li chiudono
+    # I nomi iniziano con il timestamp: l'ordine alfabetico è quello di creazione
+    versioni = sorted((v for v in os.scandir(cartella)
+                       if v.is_dir() and not v.name.endswith('.tmp') and v.name != corrente),
+                      key=lambda v: v.name, reverse=True)
+    for vecchia in versioni[VERSIONI_CONSERVATE - 1:]:
+        shutil.rmtree(vecchia.path, ignore_errors=True)
+    # File del vecchio formato senza versioni, direttamente nella cartella
+    for voce in os.scandir(cartella):
+        if voce.is_file() and (voce.name.endswith('.npy') or voce.name == FILE_MANIFEST):
+            try:
+                os.remove(voce.path)
+            except FileNotFoundError:
+                pass
+
+
+def carica_colonne(percorso_csv, colonne=None, cartella=None):
+    """
+    Colonne richieste come array numpy memory-mapped in sola lettura, riconvertendo
+    il CSV se è cambiato. Condizioni è restituita come codici; le categorie sono
+    nel dizionario sotto la chiave 'categorie'.
+    """
+    cartella = cartella or cartella_predefinita(percorso_csv)
+    richieste = None if colonne is None else list(colonne)
+    for tentativo in range(TENTATIVI_LETTURA):
+        if not aggiornato(percorso_csv, cartella):
+            converti(percorso_csv, cartella)
+        versione, manifest = _manifest_corrente(cartella)
+        if manifest is None:
+            continue
+        colonne = list(manifest['colonne']) if richieste is None else richieste
+        mancanti = [c for c in colonne if c not in manifest['colonne']]
+        if mancanti:
+            raise KeyError(f'Colonne non presenti nel dataset: {mancanti}')
+        try:
+            risultato = {c: np.load(os.path.join(versione, manifest['colonne'][c]), mmap_mode='r')
+                         for c in colonne}
+        except FileNotFoundError:
+            # Versione rimossa da conversioni più recenti mentre la si apriva: si rilegge il puntatore
+            continue
+        risultato['categorie'] = manifest['categorie']
+        return risultato
+    raise OSError(f'Versione colonnare non leggibile in {cartella}')
+
+
+def carica_dataframe(percorso_csv, colonne=None, cartella=None):
+    """
+    DataFrame con le sole colonne richieste (e la svalutazione, se ci sono i prezzi)
+    """
+    import pandas as pd
+
+    from .dati import aggiungi_svalutazione
+
+    dati = carica_colonne(percorso_csv, colonne, cartella)
+    categorie = dati.pop('categorie')
+    if 'Condizioni' in dati:
+        dati['Condizioni'] = pd.Categorical.from_codes(np.asarray(dati['Condizioni']), categorie['Condizioni'])
+    df = pd.DataFrame(dati, copy=False)
+    if 'Prezzo di Listino' in df and 'Prezzo' in df:
+        aggiungi_svalutazione(df)
+    return df
@@ -0,0 +1,252 @@
+"""
+Indice delle inserzioni comparabili (k vicini più prossimi).
+
+Anno, Chilometri e Prezzo di Listino vengono standardizzati (media 0,
+deviazione 1) e Condizioni entra come one-hot moltiplicato per
+PESO_CONDIZIONI: la distanza euclidea in questo spazio misura quanto due auto
+si somigliano. Le inserzioni senza valori numerici finiti restano fuori.
+I punti standardizzati e le colonne delle inserzioni vengono salvati accanto
+all'artefatto del modello come file .npy (con un manifest JSON) e riaperti con
+np.load(mmap_mode='r'): niente unpickling e pagine lette dal disco solo quando
+servono. Il KD-tree (scipy.spatial.cKDTree) si ricostruisce al caricamento
+sopra i punti mappati; l'indice viene ricalcolato solo quando cambia
+l'impronta del dataset, da un solo processo alla volta sotto un lock su file:
+gli altri worker aspettano e poi mappano i file appena salvati. Una ricerca costa O(log n) invece di una scansione
+del DataFrame.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+
+from .metriche import cronometro
+
+FORMATO = 3
+SUFFISSO_INDICE = '.comparabili'
+FILE_MANIFEST = 'manifest.json'
+FILE_LOCK = 'costruzione.lock'
+COLONNE_NUMERICHE = ['Anno', 'Chilometri', 'Prezzo di Listino']
+COLONNE_INSERZIONE = COLONNE_NUMERICHE + ['Prezzo', 'Condizioni', 'Svalutazione_Percentuale']
+PESO_CONDIZIONI = 1.0
+K_PREDEFINITO = 5
+
+
+@dataclass
+class IndiceComparabili:
+    impronta: str
+    media: np.ndarray     # (3,) delle colonne numeriche
+    scala: np.ndarray     # (3,)
+    categorie: list       # valori di Condizioni, nell'ordine delle colonne one-hot
+    peso_condizioni: float
+    albero: object        # scipy.spatial.cKDTree sui punti standardizzati
+    inserzioni: dict      # colonna -> array, nello stesso ordine dei punti
+
+    def __len__(self):
+        return self.albero.n
+
+    def punti(self, anni, chilometri, listini=None, condizioni=None):
+        """
+        Coordinate standardizzate; senza listino si usa quello medio, con
+        Condizioni assente o sconosciuta la parte one-hot resta a zero
+        """
+        anni = np.atleast_1d(np.asarray(anni, dtype=float))
+        n = anni.shape[0]
+        numeriche = np.empty((n, len(COLONNE_NUMERICHE)))
+        numeriche[:, 0] = anni
+        numeriche[:, 1] = np.broadcast_to(np.asarray(chilometri, dtype=float), (n,))
+        listini = np.broadcast_to(np.asarray(np.nan if listini is None else listini, dtype=float), (n,))
+        numeriche[:, 2] = np.where(np.isnan(listini), self.media[2], listini)
+        numeriche = (numeriche - self.media) / self.scala
+
+        one_hot = np.zeros((n, len(self.categorie)))
+        if condizioni is not None:
+            posizioni = {c: i for i, c in enumerate(self.categorie)}
+            condizioni = [condizioni] * n if isinstance(condizioni, str) else condizioni
+            for riga, valore in enumerate(condizioni):
+                if valore in posizioni:
+                    one_hot[riga, posizioni[valore]] = self.peso_condizioni
+        return np.hstack([numeriche, one_hot])
+
+    def cerca(self, anno, chilometri, listino=None, condizioni=None, k=K_PREDEFINITO):
+        """
+        Le k inserzioni più simili, dalla più vicina
+        """
+        with cronometro('comparabili'):
+            k = min(k, len(self))
+            distanze, indici = self.albero.query(self.punti(anno, chilometri, listino, condizioni)[0], k=k)
+            distanze = np.atleast_1d(distanze)
+            indici = np.atleast_1d(indici)
+            risultati = []
+            for distanza, indice in zip(distanze.tolist(), indici.tolist()):
+                inserzione = {c: _python(v[indice]) for c, v in self.inserzioni.items()}
+                inserzione['distanza'] = distanza
+                risultati.append(inserzione)
+            return risultati
+
+
+def _python(valore):
+    return valore.item() if isinstance(valore, np.generic) else valore
+
+
+def costruisci(df, impronta, peso_condizioni=PESO_CONDIZIONI):
+    from scipy.spatial import cKDTree
+
+    with cronometro('costruzione_comparabili'):
+        numeriche = df[COLONNE_NUMERICHE].to_numpy(dtype=float)
+        finite = np.isfinite(numeriche).all(axis=1)
+        if not finite.all():
+            # cKDTree non accetta NaN/inf e falserebbero media e scala
+            df = df[finite]
+            numeriche = numeriche[finite]
+        media = numeriche.mean(axis=0)
+        scala = numeriche.std(axis=0)
+        scala[scala == 0] = 1.0
+
+        if 'Condizioni' in df:
+            condizioni = df['Condizioni'].astype('category')
+            categorie = [str(c) for c in condizioni.cat.categories]
+        else:
+            condizioni = None
+            categorie = []
+        indice = IndiceComparabili(impronta, media, scala, categorie, peso_condizioni, None, {})
+        valori_condizioni = None if condizioni is None else condizioni.astype(str).tolist()
+        punti = indice.punti(numeriche[:, 0], numeriche[:, 1], numeriche[:, 2], valori_condizioni)
+        indice.albero = cKDTree(punti)
+        # Stringhe a lunghezza fissa invece di oggetti: si salvano in .npy e si mappano in memoria
+        indice.inserzioni = {c: (df[c].astype(str).to_numpy(dtype=str) if c == 'Condizioni' else df[c].to_numpy())
+                             for c in COLONNE_INSERZIONE if c in df}
+        return indice
+
+
+def percorso_predefinito(percorso_artefatto):
+    return percorso_artefatto + SUFFISSO_INDICE
+
+
+def _leggi_manifest(percorso):
+    with open(os.path.join(percorso, FILE_MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('formato') != FORMATO:
+        raise ValueError(f"Formato indice non supportato: {manifest.get('formato')!r}")
+    return manifest
+
+
+def salva(indice, percorso):
+    """
+    Cartella con un .npy per i punti e per ogni colonna delle inserzioni; il
+    manifest, scritto per ultimo in modo atomico, indica i file della versione
+    corrente. I file delle versioni precedenti vengono rimossi: chi li ha già
+    mappati continua a leggerli. Con più processi va chiamata sotto _lock,
+    come fa carica_o_costruisci, altrimenti due salvataggi concorrenti possono
+    cancellarsi i file a vicenda.
+    """
+    os.makedirs(percorso, exist_ok=True)
+    versione = f'{time.time_ns()}-{os.getpid()}-{threading.get_ident()}'
+    file_punti = f'punti-{versione}.npy'
+    np.save(os.path.join(percorso, file_punti), indice.albero.data)
+    colonne = {}
+    for numero, (colonna, valori) in enumerate(indice.inserzioni.items()):
+        colonne[colonna] = f'colonna{numero}-{versione}.npy'
+        np.save(os.path.join(percorso, colonne[colonna]), np.asarray(valori))
+    manifest = {
+        'formato': FORMATO,
+        'impronta': indice.impronta,
+        'media': indice.media.tolist(),
+        'scala': indice.scala.tolist(),
+        'categorie': indice.categorie,
+        'peso_condizioni': indice.peso_condizioni,
+        'punti': file_punti,
+        'colonne': colonne,
+    }
+    temporaneo = os.path.join(percorso, f'{FILE_MANIFEST}.tmp-{versione}')
+    with open(temporaneo, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temporaneo, os.path.join(percorso, FILE_MANIFEST))
+
+    correnti = {file_punti, *colonne.values()}
+    for voce in os.scandir(percorso):
+        if voce.name.endswith('.npy') and voce.name not in correnti:
+            try:
+                os.remove(voce.path)
+            except FileNotFoundError:
+                pass
+
+
+def carica(percorso, manifest=None):
+    from scipy.spatial import cKDTree
+
+    manifest = manifest or _leggi_manifest(percorso)
+    punti = np.load(os.path.join(percorso, manifest['punti']), mmap_mode='r')
+    inserzioni = {c: np.load(os.path.join(percorso, nome), mmap_mode='r')
+                  for c, nome in manifest['colonne'].items()}
+    return IndiceComparabili(
+        impronta=manifest['impronta'],
+        media=np.asarray(manifest['media']),
+        scala=np.asarray(manifest['scala']),
+        categorie=manifest['categorie'],
+        peso_condizioni=manifest['peso_condizioni'],
+        # Il KD-tree indicizza direttamente i punti mappati, senza copiarli
+        albero=cKDTree(punti, copy_data=False),
+        inserzioni=inserzioni,
+    )
+
+
+@contextmanager
+def _lock(percorso):
+    # Lock su file, condiviso da tutti i processi che usano la cartella dell'indice
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(os.path.join(percorso, FILE_LOCK), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _carica_se_aggiornato(percorso_indice, impronta):
+    if not os.path.isfile(os.path.join(percorso_indice, FILE_MANIFEST)):
+        return None
+    with cronometro('caricamento_comparabili'):
+        try:
+            manifest = _leggi_manifest(percorso_indice)
+            # L'albero si ricostruisce solo se l'indice è dello stesso dataset
+            return carica(percorso_indice, manifest) if manifest.get('impronta') == impronta else None
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def carica_o_costruisci(percorso_dataset, percorso_indice, impronta):
+    """
+    Riusa l'indice salvato se è stato costruito sullo stesso dataset,
+    altrimenti lo ricostruisce e lo salva. Un solo processo alla volta
+    costruisce: gli altri aspettano il lock e trovano l'indice già salvato.
+    """
+    indice = _carica_se_aggiornato(percorso_indice, impronta)
+    if indice is not None:
+        return indice
+
+    os.makedirs(percorso_indice, exist_ok=True)
+    with _lock(percorso_indice):
+        # Un altro processo può averlo salvato mentre si aspettava il lock
+        indice = _carica_se_aggiornato(percorso_indice, impronta)
+        if indice is not None:
+            return indice
+
+        from .dati import load_dataset
+
+        df = load_dataset(percorso_dataset, colonnare=True)
+        indice = costruisci(df, impronta)
+        salva(indice, percorso_indice)
+    # Indice del vecchio formato (pickle unico), non più letto
+    try:
+        os.remove(percorso_indice + '.pkl')
+    except FileNotFoundError:
+        pass
+    return indice
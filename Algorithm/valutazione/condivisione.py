@@ -0,0 +1,185 @@
+"""
+Artefatto pubblicato per più processi worker, in sola lettura e memory-mapped.
+
+Il processo principale addestra (o riusa) il modello una sola volta e lo
+pubblica in una cartella condivisa: una sottocartella per versione con il JSON
+dell'artefatto e la superficie di interpolazione in un file .npy, più un
+puntatore corrente.json riscritto in modo atomico. Le sottocartelle prendono
+il nome dall'hash del loro contenuto: un artefatto diverso non può mai
+riusare per errore la cartella di un altro. I worker aprono la
+superficie con np.load(mmap_mode='r'): le pagine stanno nella page cache del
+sistema operativo e sono condivise, quindi la memoria residente non cresce con
+il numero di worker.
+
+Hot-swap: chi pubblica una nuova versione (ad esempio /ingest, tramite
+pubblica_aggiornamento) riscrive solo il puntatore; ogni worker controlla il
+puntatore e carica la nuova versione sostituendo il riferimento al modello.
+Le richieste in corso continuano con il modello che avevano già in mano, e i file delle versioni precedenti restano
+leggibili: le ultime VERSIONI_CONSERVATE non vengono cancellate e su POSIX
+una mappatura resta valida anche dopo la rimozione del file.
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from .artefatto import carica, salva
+from .superficie import SuperficieSvalutazione
+
+FILE_CORRENTE = 'corrente.json'
+FILE_ARTEFATTO = 'artefatto.json'
+FILE_SUPERFICIE = 'superficie.npy'
+FILE_GRIGLIA = 'superficie.json'
+FILE_LOCK = 'pubblicazione.lock'
+VERSIONI_CONSERVATE = 3
+
+
+def _impronta_cartella(cartella):
+    # SHA-256 di nomi e contenuti dei file, in ordine di nome
+    impronta = hashlib.sha256()
+    for nome in sorted(os.listdir(cartella)):
+        impronta.update(nome.encode())
+        with open(os.path.join(cartella, nome), 'rb') as f:
+            for blocco in iter(lambda: f.read(1 << 20), b''):
+                impronta.update(blocco)
+    return impronta.hexdigest()
+
+
+def _scrivi_atomico(percorso, dati):
+    temporaneo = f'{percorso}.tmp-{os.getpid()}-{threading.get_ident()}'
+    with open(temporaneo, 'w', encoding='utf-8') as f:
+        json.dump(dati, f, indent=2)
+    os.replace(temporaneo, percorso)
+
+
+def pubblica(artefatto, cartella):
+    """
+    Scrive l'artefatto in una sottocartella che prende il nome dall'hash del
+    contenuto (riusata solo se identica) e la rende corrente
+    """
+    os.makedirs(cartella, exist_ok=True)
+    temporanea = os.path.join(cartella, f'.tmp-{os.getpid()}-{threading.get_ident()}')
+    shutil.rmtree(temporanea, ignore_errors=True)
+    os.makedirs(temporanea)
+    try:
+        # La superficie va nel .npy; il JSON contiene solo scaler, coefficienti e metadati
+        salva(dataclasses.replace(artefatto, superficie=None), os.path.join(temporanea, FILE_ARTEFATTO))
+        superficie = artefatto.superficie
+        if superficie is not None:
+            np.save(os.path.join(temporanea, FILE_SUPERFICIE), np.ascontiguousarray(superficie.valori, dtype=float))
+            _scrivi_atomico(os.path.join(temporanea, FILE_GRIGLIA), {
+                'anni': list(superficie.anni),
+                'chilometri': list(superficie.chilometri),
+                'errore_massimo': superficie.errore_massimo,
+            })
+        nome = _impronta_cartella(temporanea)[:32]
+        destinazione = os.path.join(cartella, nome)
+        if not os.path.isdir(destinazione):
+            try:
+                os.replace(temporanea, destinazione)
+            except OSError:
+                # Stesso contenuto pubblicato nel frattempo da un altro processo
+                pass
+    finally:
+        shutil.rmtree(temporanea, ignore_errors=True)
+
+    _scrivi_atomico(os.path.join(cartella, FILE_CORRENTE), {'versione': artefatto.versione, 'cartella': nome})
+    _elimina_vecchie(cartella, nome)
+    return destinazione
+
+
+def _elimina_vecchie(cartella, corrente):
+    versioni = [v for v in os.scandir(cartella) if v.is_dir() and not v.name.startswith('.tmp-') and v.name != corrente]
+    versioni.sort(key=lambda v: v.stat().st_mtime, reverse=True)
+    for vecchia in versioni[VERSIONI_CONSERVATE - 1:]:
+        shutil.rmtree(vecchia.path, ignore_errors=True)
+
+
+def carica_pubblicato(cartella):
+    """
+    Artefatto corrente con la superficie memory-mapped in sola lettura
+    """
+    with open(os.path.join(cartella, FILE_CORRENTE), encoding='utf-8') as f:
+        versione = os.path.join(cartella, json.load(f)['cartella'])
+    artefatto = carica(os.path.join(versione, FILE_ARTEFATTO))
+    griglia = os.path.join(versione, FILE_GRIGLIA)
+    if os.path.exists(griglia):
+        with open(griglia, encoding='utf-8') as f:
+            meta = json.load(f)
+        artefatto.superficie = SuperficieSvalutazione(
+            anni=tuple(meta['anni']),
+            chilometri=tuple(meta['chilometri']),
+            valori=np.load(os.path.join(versione, FILE_SUPERFICIE), mmap_mode='r'),
+            errore_massimo=float(meta['errore_massimo']),
+        )
+    return artefatto
+
+
+class ModelloCondiviso:
+    """
+    Modello corrente di un worker; aggiorna() lo sostituisce se il puntatore è cambiato
+    """
+
+    def __init__(self, cartella):
+        self.cartella = cartella
+        self.modello = None
+        self.ricariche = 0
+        self._firma = None
+        self.aggiorna()
+
+    def _firma_puntatore(self):
+        stat = os.stat(os.path.join(self.cartella, FILE_CORRENTE))
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def aggiorna(self):
+        firma = self._firma_puntatore()
+        if firma == self._firma:
+            return False
+        self.modello = carica_pubblicato(self.cartella)
+        self._firma = firma
+        self.ricariche += 1
+        return True
+
+    @contextmanager
+    def _lock(self):
+        # Lock su file, condiviso da tutti i processi che pubblicano nella cartella
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with open(os.path.join(self.cartella, FILE_LOCK), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def pubblica_aggiornamento(self, trasforma):
+        """
+        Applica trasforma all'ultima versione pubblicata (anche da un altro
+        worker) e pubblica il risultato; il lock su file evita che due
+        aggiornamenti concorrenti partano dalla stessa versione e uno vada perso
+        """
+        with self._lock():
+            self.aggiorna()
+            nuovo = trasforma(self.modello)
+            self.pubblica(nuovo)
+            return nuovo
+
+    def pubblica(self, artefatto):
+        pubblica(artefatto, self.cartella)
+        self.modello = artefatto
+        self._firma = self._firma_puntatore()
+
+    def statistiche(self):
+        return {
+            'cartella': self.cartella,
+            'versione': self.modello.versione,
+            'ricariche': self.ricariche,
+        }
@@ -0,0 +1,57 @@
+"""
+Caricamento, preprocessing e analisi esplorativa del dataset delle inserzioni.
+"""
+import pandas as pd
+
+COLONNE_CORRELAZIONE = ['Anno', 'Chilometri', 'Prezzo di Listino', 'Prezzo', 'Svalutazione_Percentuale']
+
+
+def load_dataset(percorso, colonne=None, colonnare=False):
+    """
+    Legge il CSV delle inserzioni e aggiunge la colonna Svalutazione_Percentuale.
+    Con colonnare=True legge dalla copia colonnare memory-mapped (creata o
+    rigenerata se il CSV è cambiato) e carica solo le colonne richieste.
+    """
+    if colonnare:
+        from .colonnare import carica_dataframe
+        try:
+            return carica_dataframe(percorso, colonne)
+        except PermissionError:
+            # Cartella del dataset non scrivibile: si ripiega sul CSV
+            pass
+    df = pd.read_csv(percorso, usecols=colonne)
+    if 'Prezzo di Listino' in df and 'Prezzo' in df:
+        aggiungi_svalutazione(df)
+    return df
+
+
+def colonne_presenti(percorso, colonne):
+    """
+    Le colonne richieste che compaiono nell'intestazione del CSV
+    """
+    intestazione = set(pd.read_csv(percorso, nrows=0).columns)
+    return [c for c in colonne if c in intestazione]
+
+
+def aggiungi_svalutazione(df):
+    """
+    Calcola la svalutazione in percentuale rispetto al prezzo di listino
+    """
+    # Calcolata in float64 anche quando i prezzi sono letti con dtype compatti
+    listino = df['Prezzo di Listino'].to_numpy(dtype=float)
+    prezzo = df['Prezzo'].to_numpy(dtype=float)
+    df['Svalutazione_Percentuale'] = ((listino - prezzo) / listino) * 100
+    return df
+
+
+def statistiche(df):
+    """
+    Statistiche descrittive, svalutazione media per anno e per condizioni
+    e matrice di correlazione
+    """
+    return {
+        'descrittive': df.describe(),
+        'per_anno': df.groupby('Anno')['Svalutazione_Percentuale'].mean(),
+        'per_condizioni': df.groupby('Condizioni')['Svalutazione_Percentuale'].mean(),
+        'correlazioni': df[COLONNE_CORRELAZIONE].corr(),
+    }
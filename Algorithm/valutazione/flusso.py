@@ -0,0 +1,331 @@
+"""
+Valutazione in streaming di flotte intere (NDJSON o Arrow IPC).
+
+L'ingresso viene letto a blocchi di dimensione_blocco veicoli: per ogni blocco
+si calcolano svalutazione attuale, valore stimato e valori proiettati con
+prevedi_flotta e il risultato viene codificato subito nello stesso formato
+dell'ingresso. In memoria c'è al più un blocco (più le code limitate tra
+lettura, calcolo e scrittura), qualunque sia la dimensione del file.
+
+Campi di ogni veicolo: Anno, Chilometri, facoltativi Prezzo di Listino (senza
+listino i valori in euro sono nulli), Km annui, Condizioni, Regione,
+Marca/Modello/Allestimento (per i modelli per segmento e come feature per i
+modelli che le usano) e id, restituito tale e quale. In NDJSON le righe
+non valide o di segmenti senza modello producono un record
+{"riga": n, "errore": ...} senza interrompere il flusso; in Arrow la riga
+resta al suo posto con valori nulli e il messaggio nella colonna errore.
+"""
+import io
+import json
+import math
+import queue
+from dataclasses import dataclass
+
+import numpy as np
+
+from .metriche import cronometro
+from .modello import predict
+from .proiezione import proietta
+
+DIMENSIONE_BLOCCO = 10_000
+KM_ANNUI_PREDEFINITI = 15_000
+TIPI_ARROW = ('application/vnd.apache.arrow.stream', 'application/x-arrow')
+TIPO_NDJSON = 'application/x-ndjson'
+CAMPI_SEGMENTO = ('Marca', 'Modello', 'Allestimento')
+# Feature categoriche passate al modello: usate solo se il suo feature set le prevede
+CAMPI_CATEGORICI = ('Condizioni', 'Regione') + CAMPI_SEGMENTO
+# Attesa massima sulle code prima di ricontrollare se lo streaming è stato annullato
+ATTESA_CODA = 0.5
+
+
+@dataclass
+class Blocco:
+    anni: np.ndarray
+    chilometri: np.ndarray
+    listini: np.ndarray    # NaN se manca il prezzo di listino
+    km_annui: np.ndarray   # NaN se mancano i km annui
+    id: list = None
+    segmenti: list = None  # (marca, modello, allestimento) per veicolo, None se assenti
+    categoriche: dict = None  # colonna -> valori per veicolo (None se mancanti), solo colonne presenti
+    errori: list = None    # righe scartate in lettura: {'riga': n, 'errore': messaggio}
+    righe: list = None     # numero di riga nella sorgente per veicolo
+    scartate: dict = None  # indice nel blocco -> errore, veicoli letti ma non valutabili
+
+    def __len__(self):
+        return self.anni.shape[0]
+
+
+class CodaByte(io.RawIOBase):
+    """
+    File in sola lettura alimentato a pezzi da un altro thread (ad esempio il
+    corpo di una richiesta HTTP); un pezzo vuoto segna la fine. Se l'evento
+    annullato viene impostato la lettura si interrompe con ConnectionAbortedError
+    invece di restare in attesa di pezzi che non arriveranno più.
+    """
+
+    def __init__(self, dimensione_coda=8, annullato=None):
+        self._coda = queue.Queue(dimensione_coda)
+        self._corrente = memoryview(b'')
+        self._finito = False
+        self._annullato = annullato
+
+    def readable(self):
+        return True
+
+    def metti(self, pezzo, timeout=None):
+        self._coda.put(bytes(pezzo), timeout=timeout)
+
+    def readinto(self, destinazione):
+        while not self._corrente and not self._finito:
+            try:
+                pezzo = self._coda.get(timeout=ATTESA_CODA)
+            except queue.Empty:
+                if self._annullato is not None and self._annullato.is_set():
+                    raise ConnectionAbortedError('Flusso in ingresso interrotto')
+                continue
+            self._finito = not pezzo
+            self._corrente = memoryview(pezzo)
+        n = min(len(destinazione), len(self._corrente))
+        destinazione[:n] = self._corrente[:n]
+        self._corrente = self._corrente[n:]
+        return n
+
+
+def _numero(valore):
+    return math.nan if valore is None else float(valore)
+
+
+def _finito(valore, campo):
+    valore = float(valore)
+    if not math.isfinite(valore):
+        raise ValueError(f'{campo} non valido: {valore}')
+    return valore
+
+
+def _blocco_da_righe(righe, errori):
+    n = len(righe)
+    colonne = list(zip(*righe)) if righe else [()] * 8
+    segmenti = list(colonne[5])
+    categoriche = {c: list(valori) for c, valori in zip(CAMPI_CATEGORICI, zip(*colonne[6]))
+                   if any(v is not None for v in valori)}
+    return Blocco(
+        anni=np.asarray(colonne[0], dtype=float).reshape(n),
+        chilometri=np.asarray(colonne[1], dtype=float).reshape(n),
+        listini=np.asarray(colonne[2], dtype=float).reshape(n),
+        km_annui=np.asarray(colonne[3], dtype=float).reshape(n),
+        id=list(colonne[4]),
+        segmenti=segmenti if any(s != (None, None, None) for s in segmenti) else None,
+        categoriche=categoriche or None,
+        errori=errori,
+        righe=list(colonne[7]),
+    )
+
+
+def leggi_ndjson(file, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Blocchi di veicoli da un file NDJSON (un oggetto JSON per riga)
+    """
+    righe = []
+    errori = []
+    for numero, linea in enumerate(io.BufferedReader(file) if isinstance(file, io.RawIOBase) else file, 1):
+        if not linea.strip():
+            continue
+        try:
+            veicolo = json.loads(linea)
+            righe.append((
+                _finito(veicolo['Anno'], 'Anno'),
+                _finito(veicolo['Chilometri'], 'Chilometri'),
+                _numero(veicolo.get('Prezzo di Listino')),
+                _numero(veicolo.get('Km annui')),
+                veicolo.get('id'),
+                tuple(veicolo.get(c) for c in CAMPI_SEGMENTO),
+                tuple(veicolo.get(c) for c in CAMPI_CATEGORICI),
+                numero,
+            ))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            errori.append({'riga': numero, 'errore': f'{type(e).__name__}: {e}'})
+            continue
+        if len(righe) >= dimensione_blocco:
+            yield _blocco_da_righe(righe, errori)
+            righe, errori = [], []
+    if righe or errori:
+        yield _blocco_da_righe(righe, errori)
+
+
+def _colonna(tabella, nome, n):
+    if nome not in tabella.column_names:
+        return np.full(n, np.nan)
+    return tabella.column(nome).to_numpy(zero_copy_only=False).astype(float)
+
+
+def leggi_arrow(file, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Blocchi di veicoli da uno stream Arrow IPC; i record batch più grandi
+    vengono suddivisi, quelli piccoli passano così come sono. Le righe con
+    Anno o Chilometri nulli vengono scartate come in NDJSON
+    """
+    import pyarrow as pa
+
+    lettore = pa.ipc.open_stream(file)
+    mancanti = [c for c in ('Anno', 'Chilometri') if c not in lettore.schema.names]
+    if mancanti:
+        raise ValueError(f'Colonne mancanti nello stream Arrow: {mancanti}')
+    letti = 0
+    for batch in lettore:
+        for inizio in range(0, batch.num_rows, dimensione_blocco):
+            tabella = pa.Table.from_batches([batch.slice(inizio, dimensione_blocco)])
+            n = tabella.num_rows
+            anni = _colonna(tabella, 'Anno', n)
+            chilometri = _colonna(tabella, 'Chilometri', n)
+            scartate = {}
+            for campo, valori in (('Chilometri', chilometri), ('Anno', anni)):
+                for i in np.flatnonzero(~np.isfinite(valori)).tolist():
+                    scartate[i] = f'ValueError: {campo} mancante o non valido'
+            segmenti = None
+            if any(c in tabella.column_names for c in CAMPI_SEGMENTO):
+                valori = [tabella.column(c).to_pylist() if c in tabella.column_names else [None] * n
+                          for c in CAMPI_SEGMENTO]
+                segmenti = list(zip(*valori))
+            categoriche = {c: tabella.column(c).to_pylist() for c in CAMPI_CATEGORICI if c in tabella.column_names}
+            yield Blocco(
+                anni=anni,
+                chilometri=chilometri,
+                listini=_colonna(tabella, 'Prezzo di Listino', n),
+                km_annui=_colonna(tabella, 'Km annui', n),
+                id=tabella.column('id').to_pylist() if 'id' in tabella.column_names else None,
+                segmenti=segmenti,
+                categoriche=categoriche or None,
+                errori=[],
+                righe=list(range(letti + 1, letti + n + 1)),
+                scartate=scartate,
+            )
+            letti += n
+
+
+def valuta_blocco(blocco, modello, anni_previsione, km_annui=KM_ANNUI_PREDEFINITI):
+    """
+    Proiezione del blocco; modello è un artefatto oppure una funzione
+    (marca, modello, allestimento) -> artefatto per i blocchi con segmenti.
+    I veicoli di segmenti senza modello (KeyError) finiscono in blocco.scartate
+    e, come quelli già scartati, hanno valori NaN nella proiezione.
+    """
+    n = len(blocco)
+    categoriche = blocco.categoriche or {}
+    if blocco.scartate is None:
+        blocco.scartate = {}
+    segmenti = blocco.segmenti if blocco.segmenti is not None and callable(modello) else None
+    gruppi = {}
+    for i in range(n):
+        if i not in blocco.scartate:
+            gruppi.setdefault(None if segmenti is None else segmenti[i], []).append(i)
+    svalutazioni = np.full(n, np.nan)
+    for segmento, indici in gruppi.items():
+        if not callable(modello):
+            artefatto = modello
+        else:
+            try:
+                artefatto = modello(*(segmento or (None, None, None)))
+            except KeyError as e:
+                # Segmento senza modello: errore per riga, il resto del blocco viene valutato
+                for i in indici:
+                    blocco.scartate[i] = f'KeyError: {e.args[0] if e.args else e}'
+                continue
+        if len(indici) == n:
+            # Caso comune (nessun segmento, nessuno scarto): niente copie delle colonne
+            svalutazioni = predict(artefatto, blocco.anni, blocco.chilometri, categoriche=categoriche)
+            continue
+        parziali = {c: [valori[i] for i in indici] for c, valori in categoriche.items()}
+        indici = np.asarray(indici)
+        svalutazioni[indici] = predict(artefatto, blocco.anni[indici], blocco.chilometri[indici],
+                                       categoriche=parziali)
+    km = np.where(np.isnan(blocco.km_annui), km_annui, blocco.km_annui)
+    return proietta(svalutazioni, blocco.chilometri, blocco.listini, km, anni_previsione)
+
+
+def _nullo(valore):
+    return None if math.isnan(valore) else valore
+
+
+def scrivi_ndjson(blocco, proiezione):
+    righe = []
+    ids = blocco.id or [None] * len(blocco)
+    scartate = blocco.scartate or {}
+    for i, (svalutazione, valori) in enumerate(zip(proiezione.svalutazioni[:, 0].tolist(),
+                                                   proiezione.valori.tolist())):
+        if i in scartate:
+            continue
+        record = {} if ids[i] is None else {'id': ids[i]}
+        record['svalutazione_percentuale'] = svalutazione
+        record['valore_stimato'] = _nullo(valori[0])
+        record['valori_futuri'] = [_nullo(v) for v in valori[1:]]
+        righe.append(json.dumps(record))
+    errori = list(blocco.errori or ())
+    errori.extend({'riga': blocco.righe[i], 'errore': errore} for i, errore in scartate.items())
+    errori.sort(key=lambda errore: errore['riga'])
+    righe.extend(json.dumps(errore) for errore in errori)
+    return ('\n'.join(righe) + '\n').encode() if righe else b''
+
+
+class ScrittoreArrow:
+    """
+    Codifica i blocchi valutati come un unico stream Arrow IPC, un record batch per blocco;
+    i veicoli scartati hanno valori nulli e il motivo nella colonna errore
+    """
+
+    def __init__(self, anni_previsione):
+        import pyarrow as pa
+
+        self._pa = pa
+        self.anni_previsione = anni_previsione
+        self._buffer = io.BytesIO()
+        self._scrittore = None
+
+    def _svuota(self):
+        dati = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return dati
+
+    def scrivi(self, blocco, proiezione):
+        pa = self._pa
+        colonne = {}
+        if blocco.id is not None:
+            colonne['id'] = pa.array(blocco.id)
+        colonne['svalutazione_percentuale'] = pa.array(proiezione.svalutazioni[:, 0], from_pandas=True)
+        colonne['valore_stimato'] = pa.array(proiezione.valori[:, 0], from_pandas=True)
+        futuri = pa.array(np.ascontiguousarray(proiezione.valori[:, 1:]).ravel(), from_pandas=True)
+        colonne['valori_futuri'] = pa.FixedSizeListArray.from_arrays(futuri, self.anni_previsione)
+        scartate = blocco.scartate or {}
+        colonne['errore'] = pa.array([scartate.get(i) for i in range(len(blocco))], type=pa.string())
+        batch = pa.RecordBatch.from_pydict(colonne)
+        if self._scrittore is None:
+            self._scrittore = pa.ipc.new_stream(self._buffer, batch.schema)
+        self._scrittore.write_batch(batch)
+        return self._svuota()
+
+    def chiudi(self):
+        if self._scrittore is not None:
+            self._scrittore.close()
+        return self._svuota()
+
+
+def valuta_flusso(file, formato, modello, anni_previsione, km_annui=KM_ANNUI_PREDEFINITI,
+                  dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Genera i byte della risposta blocco per blocco (formato 'ndjson' o 'arrow')
+    """
+    if formato == 'arrow':
+        blocchi = leggi_arrow(file, dimensione_blocco)
+        scrittore = ScrittoreArrow(anni_previsione)
+        scrivi = scrittore.scrivi
+    else:
+        blocchi = leggi_ndjson(file, dimensione_blocco)
+        scrittore = None
+        scrivi = scrivi_ndjson
+    for blocco in blocchi:
+        with cronometro('blocco_flusso'):
+            dati = scrivi(blocco, valuta_blocco(blocco, modello, anni_previsione, km_annui))
+        if dati:
+            yield dati
+    if scrittore is not None:
+        yield scrittore.chiudi()
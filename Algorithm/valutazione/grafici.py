@@ -0,0 +1,162 @@
+"""
+Grafici dell'analisi esplorativa e del modello.
+
+matplotlib e seaborn vengono importati solo quando si importa questo modulo.
+Le funzioni restituiscono la figura senza chiamare plt.show().
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+def plot_correlazione(x, y, xlabel, ylabel, title):
+    fig = plt.figure(figsize=(10, 6))
+    plt.scatter(x, y, alpha=0.7)
+
+    # Aggiunge linea di tendenza
+    z = np.polyfit(x, y, 1)
+    p = np.poly1d(z)
+    plt.plot(x, p(x), "r--")
+
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.grid(True, linestyle='--', alpha=0.7)
+
+    # Calcola e mostra il coefficiente di correlazione di Pearson
+    corr = np.corrcoef(x, y)[0, 1]
+    plt.annotate(f"Correlazione: {corr:.2f}", xy=(0.05, 0.95), xycoords='axes fraction')
+
+    plt.tight_layout()
+    return fig
+
+
+def boxplot_condizioni(df):
+    """
+    Boxplot della svalutazione per condizioni
+    """
+    import seaborn as sns
+
+    fig = plt.figure(figsize=(10, 6))
+    sns.boxplot(x='Condizioni', y='Svalutazione_Percentuale', data=df)
+    plt.title('Distribuzione della Svalutazione per Condizioni')
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.tight_layout()
+    return fig
+
+
+def grafico_importanza(importanze):
+    """
+    Importanza relativa delle variabili nel modello
+    """
+    fig = plt.figure(figsize=(10, 6))
+    plt.bar(list(importanze), list(importanze.values()))
+    plt.xlabel('Variabili')
+    plt.ylabel('Importanza relativa (%)')
+    plt.title('Importanza delle Variabili nel Modello di Svalutazione')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    return fig
+
+
+def grafico_3d(X_grid, Y_grid, Z_grid, df):
+    """
+    Superficie 3D della svalutazione in funzione di Anno e Chilometri
+    """
+    fig = plt.figure(figsize=(12, 8))
+    ax = fig.add_subplot(111, projection='3d')
+    surf = ax.plot_surface(X_grid, Y_grid, Z_grid, cmap='viridis', alpha=0.7)
+
+    # Aggiungi i punti dati reali
+    ax.scatter(df['Anno'], df['Chilometri'], df['Svalutazione_Percentuale'],
+               color='red', s=50, alpha=0.5)
+
+    ax.set_xlabel('Anno')
+    ax.set_ylabel('Chilometri')
+    ax.set_zlabel('Svalutazione (%)')
+    ax.set_title('Modello 3D della Svalutazione delle Golf GTD')
+
+    # Aggiungi una barra di colore
+    fig.colorbar(surf, ax=ax, shrink=0.5, aspect=5)
+
+    plt.tight_layout()
+    return fig
+
+
+class GraficoCurva:
+    """
+    Curva del valore stimato e perdita annua in percentuale, riutilizzabile:
+    la figura e gli artist (linea, barre, etichette) vengono creati una volta
+    per l'orizzonte massimo e aggiorna() ne cambia solo dati e visibilità
+    """
+
+    def __init__(self, anni_massimi):
+        self.anni_massimi = anni_massimi
+        self.fig = plt.figure(figsize=(14, 10))
+
+        # Grafico 1: Curva di valore assoluto
+        self.ax_valori = self.fig.add_subplot(2, 1, 1)
+        self.linea, = self.ax_valori.plot([], [], 'b-o', linewidth=2)
+        self.ax_valori.set_xlabel('Anno', fontsize=12)
+        self.ax_valori.set_ylabel('Valore Stimato (€)', fontsize=12)
+        self.ax_valori.grid(True, linestyle='--', alpha=0.7)
+        self.etichette_valori = [
+            self.ax_valori.annotate('', (0, 0), textcoords="offset points", xytext=(0, 10), ha='center', fontsize=9)
+            for _ in range(anni_massimi + 1)
+        ]
+
+        # Grafico 2: Perdita annua in percentuale
+        self.ax_perdite = self.fig.add_subplot(2, 1, 2)
+        self.barre = self.ax_perdite.bar(np.arange(anni_massimi), np.zeros(anni_massimi), color='red', alpha=0.7)
+        self.ax_perdite.set_title('Perdita di Valore Annua (%)', fontsize=14)
+        self.ax_perdite.set_xlabel('Anno', fontsize=12)
+        self.ax_perdite.set_ylabel('Perdita Annua (%)', fontsize=12)
+        self.ax_perdite.grid(True, linestyle='--', alpha=0.7, axis='y')
+        self.etichette_perdite = [
+            self.ax_perdite.annotate('', (0, 0), textcoords="offset points", xytext=(0, 5), ha='center', fontsize=9)
+            for _ in range(anni_massimi)
+        ]
+        self._layout = False
+
+    def aggiorna(self, risultati, anno):
+        anni = risultati['anni']
+        valori = risultati['valori']
+        perdite = risultati['perdite_percentuali']
+        if len(perdite) > self.anni_massimi:
+            raise ValueError(f'Orizzonte di {len(perdite)} anni oltre il massimo del grafico ({self.anni_massimi})')
+
+        self.linea.set_data(anni, valori)
+        self.ax_valori.set_title(f'Curva di Deprezzamento - Golf GTD {anno}', fontsize=14)
+        self.ax_valori.set_xticks(anni)
+        for i, etichetta in enumerate(self.etichette_valori):
+            etichetta.set_visible(i < len(anni))
+            if i < len(anni):
+                etichetta.xy = (anni[i], valori[i])
+                etichetta.set_text(f"€{valori[i]:,.0f}")
+
+        x = anni[1:]  # Anni (escluso il primo)
+        for i, (barra, etichetta) in enumerate(zip(self.barre, self.etichette_perdite)):
+            visibile = i < len(perdite)
+            barra.set_visible(visibile)
+            etichetta.set_visible(visibile)
+            if visibile:
+                barra.set_x(x[i] - barra.get_width() / 2)
+                barra.set_height(perdite[i])
+                etichetta.xy = (x[i], perdite[i])
+                etichetta.set_text(f"{perdite[i]:.1f}%")
+        self.ax_perdite.set_xticks(x)
+
+        for ax in (self.ax_valori, self.ax_perdite):
+            ax.relim(visible_only=True)
+            ax.autoscale_view()
+        if not self._layout:
+            self.fig.tight_layout()
+            self._layout = True
+        self.fig.canvas.draw_idle()
+        return self
+
+
+def grafico_curva(risultati, anno):
+    """
+    Curva del valore stimato e perdita annua in percentuale
+    """
+    return GraficoCurva(len(risultati['perdite_percentuali'])).aggiorna(risultati, anno).fig
@@ -0,0 +1,298 @@
+"""
+Rendering headless dei grafici (backend Agg) con cache su disco.
+
+Ogni immagine e' identificata da tipo di grafico, versione del modello (che
+include l'impronta del dataset di addestramento), parametri e formato: se il
+file esiste gia' viene riusato, altrimenti viene disegnato in un pool di
+processi, cosi' matplotlib non gira mai nei thread che servono le richieste.
+Richieste identiche in corso condividono lo stesso Future. Se un processo
+muore e rompe il pool, il grafico viene ritentato una volta su un pool nuovo.
+I parametri numerici vengono limitati a intervalli ragionevoli e la cartella
+conserva al più max_file immagini: oltre si eliminano le meno usate di recente.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .proiezione import ANNO_CORRENTE, MAX_ANNI_PREVISIONE, MAX_CHILOMETRI
+
+FORMATI = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+MAX_RISOLUZIONE = 100
+MAX_FILE_PREDEFINITO = 1000
+
+# Tipo di grafico -> parametri accettati: (tipo, valore predefinito, minimo, massimo)
+GRAFICI = {
+    'correlazione_km': {},
+    'correlazione_anno': {},
+    'condizioni': {},
+    'importanza': {},
+    'superficie_3d': {'risoluzione': (int, 20, 2, MAX_RISOLUZIONE)},
+    'curva': {
+        'anno': (int, 2022, 1950, ANNO_CORRENTE + 1),
+        'chilometri': (float, 30000.0, 0.0, MAX_CHILOMETRI),
+        'prezzo_listino': (float, None, 1.0, 10_000_000.0),  # predefinito: listino medio del dataset
+        'anni_previsione': (int, 5, 1, MAX_ANNI_PREVISIONE),
+        'km_annui': (float, 15000.0, 0.0, 500_000.0),
+    },
+}
+# Grafici che richiedono il dataset oltre al modello
+CON_DATASET = {'correlazione_km', 'correlazione_anno', 'condizioni', 'superficie_3d'}
+
+_dataset = {}  # cache del dataset nel processo: percorso -> (sorgente, DataFrame)
+
+
+def normalizza_parametri(tipo, parametri):
+    """
+    Parametri convertiti ai tipi attesi, limitati al loro intervallo e
+    completati con i predefiniti, così richieste equivalenti condividono la
+    stessa immagine in cache
+    """
+    if tipo not in GRAFICI:
+        raise KeyError(f'Grafico sconosciuto: {tipo!r}')
+    attesi = GRAFICI[tipo]
+    sconosciuti = set(parametri) - set(attesi)
+    if sconosciuti:
+        raise ValueError(f'Parametri non validi per {tipo}: {sorted(sconosciuti)}')
+    normalizzati = {}
+    for nome, (conversione, predefinito, minimo, massimo) in attesi.items():
+        valore = parametri.get(nome)
+        if valore is None:
+            normalizzati[nome] = predefinito
+            continue
+        valore = conversione(valore)
+        if valore != valore:
+            raise ValueError(f'Valore non valido per {nome}: {valore}')
+        normalizzati[nome] = min(max(valore, conversione(minimo)), conversione(massimo))
+    return normalizzati
+
+
+def chiave_grafico(tipo, versione, parametri, formato):
+    testo = json.dumps([tipo, str(versione), parametri, formato], sort_keys=True)
+    return hashlib.sha256(testo.encode()).hexdigest()
+
+
+def usa_backend_headless():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _carica_dataset(percorso):
+    from .artefatto import info_sorgente
+    from .dati import load_dataset
+
+    if percorso is None:
+        raise FileNotFoundError('Dataset non configurato')
+    sorgente = info_sorgente(percorso)
+    voce = _dataset.get(percorso)
+    if voce is None or voce[0] != sorgente:
+        voce = _dataset[percorso] = (sorgente, load_dataset(percorso, colonnare=True))
+    return voce[1]
+
+
+def _coefficienti(modello):
+    from .modello import nomi_coefficienti
+
+    if getattr(modello, 'coefficienti', None) is not None:
+        return dict(zip(modello.feature, map(float, modello.coefficienti)))
+    pipeline = getattr(modello, 'pipeline', modello)
+    regressore = pipeline['regressor']
+    if not hasattr(regressore, 'coef_'):
+        raise ValueError('Il modello non ha coefficienti')
+    nomi = nomi_coefficienti(pipeline)
+    return {str(n): float(c) for n, c in zip(nomi, regressore.coef_)}
+
+
+def crea_figura(tipo, modello, percorso_dataset, parametri):
+    from . import grafici
+    from .modello import griglia_previsioni, importanza_variabili, prevedi_svalutazione_nel_tempo
+
+    df = _carica_dataset(percorso_dataset) if tipo in CON_DATASET else None
+    if tipo == 'correlazione_km':
+        return grafici.plot_correlazione(df['Chilometri'], df['Svalutazione_Percentuale'],
+                                         'Chilometri', 'Svalutazione (%)',
+                                         'Correlazione tra Chilometri e Svalutazione')
+    if tipo == 'correlazione_anno':
+        return grafici.plot_correlazione(df['Anno'], df['Svalutazione_Percentuale'],
+                                         'Anno', 'Svalutazione (%)',
+                                         'Correlazione tra Anno e Svalutazione')
+    if tipo == 'condizioni':
+        return grafici.boxplot_condizioni(df)
+    if tipo == 'importanza':
+        return grafici.grafico_importanza(importanza_variabili(_coefficienti(modello)))
+    if tipo == 'superficie_3d':
+        X_grid, Y_grid, Z_grid = griglia_previsioni(modello, df['Anno'], df['Chilometri'], parametri['risoluzione'])
+        return grafici.grafico_3d(X_grid, Y_grid, Z_grid, df)
+    if tipo == 'curva':
+        prezzo_listino = parametri['prezzo_listino']
+        if prezzo_listino is None:
+            prezzo_listino = float(_carica_dataset(percorso_dataset)['Prezzo di Listino'].mean())
+        risultati = prevedi_svalutazione_nel_tempo(
+            modello, parametri['anno'], parametri['chilometri'], prezzo_listino,
+            parametri['anni_previsione'], parametri['km_annui'])
+        return grafici.grafico_curva(risultati, parametri['anno'])
+    raise KeyError(f'Grafico sconosciuto: {tipo!r}')
+
+
+def _tocca(percorso):
+    try:
+        os.utime(percorso)
+    except FileNotFoundError:
+        pass
+
+
+def salva_figura(fig, destinazione, formato='png'):
+    """
+    Scrive la figura in modo atomico e la chiude (libera la memoria di pyplot)
+    """
+    import matplotlib.pyplot as plt
+
+    temporaneo = f'{destinazione}.tmp-{os.getpid()}-{threading.get_ident()}'
+    try:
+        with open(temporaneo, 'wb') as f:
+            fig.savefig(f, format=formato)
+        os.replace(temporaneo, destinazione)
+    finally:
+        plt.close(fig)
+        if os.path.exists(temporaneo):
+            os.remove(temporaneo)
+    return destinazione
+
+
+def disegna(tipo, modello, percorso_dataset, parametri, formato, destinazione):
+    """
+    Disegna un grafico su file; è la funzione eseguita dai processi del pool
+    """
+    return salva_figura(crea_figura(tipo, modello, percorso_dataset, parametri), destinazione, formato)
+
+
+class ServizioGrafici:
+    def __init__(self, cartella, percorso_dataset=None, processi=2, max_file=MAX_FILE_PREDEFINITO):
+        self.cartella = cartella
+        self.percorso_dataset = percorso_dataset
+        self.processi = processi
+        self.max_file = max_file
+        self._pool = None
+        self._in_corso = {}  # chiave -> Future del rendering
+        self._lock = threading.Lock()
+        self.hit = 0
+        self.generati = 0
+        self.eliminati = 0
+        os.makedirs(cartella, exist_ok=True)
+
+    def _esecutore(self):
+        # Processi creati al primo grafico; spawn evita di duplicare i thread del server
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processi, mp_context=multiprocessing.get_context('spawn'),
+                initializer=usa_backend_headless)
+        return self._pool
+
+    def richiedi(self, modello, tipo, formato='png', **parametri):
+        """
+        Future con il percorso dell'immagine (già pronto se è in cache)
+        """
+        if formato not in FORMATI:
+            raise ValueError(f'Formato non supportato: {formato!r}')
+        parametri = normalizza_parametri(tipo, parametri)
+        chiave = chiave_grafico(tipo, getattr(modello, 'versione', None) or id(modello), parametri, formato)
+        destinazione = os.path.join(self.cartella, f'{chiave}.{formato}')
+
+        with self._lock:
+            if chiave in self._in_corso:
+                return self._in_corso[chiave]
+            if os.path.exists(destinazione):
+                self.hit += 1
+                # mtime aggiornato a ogni uso: l'eliminazione toglie le immagini usate meno di recente
+                _tocca(destinazione)
+                futuro = Future()
+                futuro.set_result(destinazione)
+                return futuro
+            self.generati += 1
+            argomenti = (disegna, tipo, modello, self.percorso_dataset, parametri, formato, destinazione)
+            futuro = Future()
+            pool, interno = self._invia(argomenti)
+            self._in_corso[chiave] = futuro
+        # Callback registrate fuori dal lock: se il Future è già completato partono subito in questo thread
+        futuro.add_done_callback(lambda _: self._fine(chiave))
+        interno.add_done_callback(lambda f: self._completa(f, pool, argomenti, futuro, riprova=True))
+        return futuro
+
+    def _invia(self, argomenti):
+        # Chiamata con il lock acquisito
+        try:
+            pool = self._esecutore()
+            return pool, pool.submit(*argomenti)
+        except BrokenProcessPool:
+            # Un processo è morto (es. memoria esaurita): si riparte con un pool nuovo
+            self._pool = None
+            pool = self._esecutore()
+            return pool, pool.submit(*argomenti)
+
+    def _completa(self, interno, pool, argomenti, futuro, riprova):
+        if interno.cancelled():
+            futuro.cancel()
+            return
+        errore = interno.exception()
+        if isinstance(errore, BrokenProcessPool) and riprova:
+            # Il pool si è rotto mentre il grafico era in coda o in disegno: un solo nuovo tentativo
+            try:
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                    pool, interno = self._invia(argomenti)
+            except Exception as e:
+                futuro.set_exception(e)
+                return
+            interno.add_done_callback(lambda f: self._completa(f, pool, argomenti, futuro, riprova=False))
+            return
+        if errore is not None:
+            futuro.set_exception(errore)
+        else:
+            self._elimina_vecchi()
+            futuro.set_result(interno.result())
+
+    def _elimina_vecchi(self):
+        # Oltre max_file immagini si eliminano quelle usate meno di recente
+        voci = []
+        for voce in os.scandir(self.cartella):
+            if voce.is_file() and os.path.splitext(voce.name)[1][1:] in FORMATI:
+                try:
+                    voci.append((voce.stat().st_mtime_ns, voce.path))
+                except FileNotFoundError:
+                    continue
+        if len(voci) <= self.max_file:
+            return
+        voci.sort()
+        for _, percorso in voci[:len(voci) - self.max_file]:
+            try:
+                os.remove(percorso)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                self.eliminati += 1
+
+    def _fine(self, chiave):
+        with self._lock:
+            self._in_corso.pop(chiave, None)
+
+    def statistiche(self):
+        with self._lock:
+            return {
+                'cartella': self.cartella,
+                'processi': self.processi,
+                'hit': self.hit,
+                'generati': self.generati,
+                'eliminati': self.eliminati,
+                'file_massimi': self.max_file,
+                'in_corso': len(self._in_corso),
+            }
+
+    def chiudi(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,74 @@
+"""
+Aggiornamenti incrementali del modello dalle statistiche sufficienti.
+
+Invece di rifare train_test_split e pipeline.fit sull'intero DataFrame, si
+mantengono conteggio, medie e co-momenti di (Anno, Chilometri, svalutazione):
+contengono X^T X e X^T y centrati e le medie/varianze dello StandardScaler.
+Assorbire un nuovo blocco costa O(righe del blocco) e i coefficienti che ne
+risultano coincidono con quelli di Pipeline(StandardScaler, LinearRegression)
+riaddestrata sulle stesse righe.
+"""
+import numpy as np
+
+from .artefatto import ArtefattoModello
+from .superficie import costruisci as costruisci_superficie
+
+
+def artefatto_da_sufficienti(sufficienti, impronta, aggiornamenti=0, metriche=None, sorgente=None, feature=None):
+    """
+    Risolve le equazioni normali sui co-momenti e ricostruisce scaler e regressore
+    """
+    k = sufficienti.comomenti.shape[0] - 1
+    cxx = sufficienti.comomenti[:k, :k]
+    cxy = sufficienti.comomenti[:k, k]
+    # lstsq restituisce la soluzione a norma minima come LinearRegression se cxx è singolare
+    beta = np.linalg.lstsq(cxx, cxy, rcond=None)[0]
+
+    # StandardScaler usa la deviazione standard di popolazione e lascia 1 per le colonne costanti
+    scala = np.sqrt(sufficienti.varianze(ddof=0)[:k])
+    scala[scala == 0] = 1.0
+
+    artefatto = ArtefattoModello(
+        media=sufficienti.media[:k].copy(),
+        scala=scala,
+        coefficienti=beta * scala,
+        # Con le feature centrate l'intercetta è la media del target
+        intercetta=float(sufficienti.media[k]),
+        impronta=impronta,
+        metriche=dict(metriche or {}),
+        sorgente=dict(sorgente or {}),
+        sufficienti=sufficienti,
+        aggiornamenti=aggiornamenti,
+    )
+    if feature is not None:
+        artefatto.feature = list(feature)
+    return artefatto
+
+
+def assorbi(artefatto, X, y):
+    """
+    Nuovo artefatto che include le righe (X, y); quello di partenza non viene modificato
+    """
+    if artefatto.sufficienti is None:
+        raise ValueError("L'artefatto non contiene statistiche sufficienti: riaddestrare il modello")
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    righe = np.column_stack([X, y])
+    # Righe con valori mancanti o infiniti scartate: nuovo.sufficienti.n - artefatto.sufficienti.n
+    # sono le righe effettivamente assorbite
+    righe = righe[np.isfinite(righe).all(axis=1)]
+
+    sufficienti = artefatto.sufficienti.copia().aggiorna(righe)
+    nuovo = artefatto_da_sufficienti(
+        sufficienti,
+        artefatto.impronta,
+        aggiornamenti=artefatto.aggiornamenti + 1,
+        # Le metriche si riferiscono al test set dell'ultimo addestramento completo
+        metriche=artefatto.metriche,
+        sorgente=artefatto.sorgente,
+        feature=artefatto.feature,
+    )
+    if artefatto.superficie is not None:
+        # La superficie si ricalcola sulla stessa griglia con i nuovi coefficienti
+        nuovo.superficie = costruisci_superficie(nuovo, artefatto.superficie.anni, artefatto.superficie.chilometri)
+    return nuovo
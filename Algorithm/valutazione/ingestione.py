@@ -0,0 +1,169 @@
+"""
+Ingestione a blocchi dei CSV di inserzioni con statistiche online.
+
+Il CSV viene letto a blocchi con dtype espliciti e ogni blocco aggiorna degli
+accumulatori (conteggi, somme, co-momenti) che si combinano tra loro. La
+memoria usata non dipende dal numero di righe e il risultato ha la stessa
+forma di dati.statistiche().
+"""
+import numpy as np
+import pandas as pd
+
+from .dati import COLONNE_CORRELAZIONE, aggiungi_svalutazione
+from .momenti import Comomenti
+
+DTYPE_INSERZIONI = {
+    'Anno': 'float32',  # float per ammettere anni mancanti (NaN); gli anni sono esatti in float32
+    'Chilometri': 'float32',
+    # I prezzi restano float64: in float32 i centesimi si perdono (45158.93 -> 45158.92578125)
+    'Prezzo di Listino': 'float64',
+    'Prezzo': 'float64',
+    'Condizioni': 'category',
+}
+
+DIMENSIONE_BLOCCO = 500_000
+DIMENSIONE_CAMPIONE = 100_000
+
+
+def leggi_a_blocchi(percorso, dimensione_blocco=DIMENSIONE_BLOCCO, colonne=None):
+    """
+    Itera sul CSV a blocchi di righe, gia' con la colonna Svalutazione_Percentuale
+    """
+    dtype = DTYPE_INSERZIONI if colonne is None else {c: DTYPE_INSERZIONI[c] for c in colonne}
+    for blocco in pd.read_csv(percorso, usecols=colonne, dtype=dtype, chunksize=dimensione_blocco):
+        if 'Prezzo di Listino' in blocco and 'Prezzo' in blocco:
+            aggiungi_svalutazione(blocco)
+        yield blocco
+
+
+class AccumulatoreStatistiche:
+    """
+    Statistiche descrittive, medie per gruppo e correlazioni in memoria limitata.
+
+    Conteggio, media, deviazione standard, minimo, massimo, medie per gruppo e
+    correlazioni sono esatti. I valori mancanti vengono trattati come in pandas:
+    le statistiche di ogni colonna usano i suoi valori presenti (describe) e
+    ogni correlazione le righe in cui ci sono entrambe le colonne (corr), per
+    questo i co-momenti sono tenuti coppia per coppia. I quartili sono
+    calcolati su un campione uniforme di al più dimensione_campione righe:
+    coincidono con describe() finché il dataset sta nel campione, altrimenti
+    sono un'approssimazione.
+    """
+
+    def __init__(self, colonne=COLONNE_CORRELAZIONE, dimensione_campione=DIMENSIONE_CAMPIONE, seed=0):
+        self.colonne = list(colonne)
+        k = len(self.colonne)
+        # (i, j) con i <= j -> co-momenti delle due colonne sulle righe in cui sono presenti entrambe;
+        # la coppia (i, i) dà conteggio, media e varianza della colonna i
+        self.coppie = {(i, j): Comomenti(2) for i in range(k) for j in range(i, k)}
+        self.minimi = np.full(k, np.inf)
+        self.massimi = np.full(k, -np.inf)
+        self.gruppi = {'Anno': None, 'Condizioni': None}
+        self.dimensione_campione = dimensione_campione
+        self._rng = np.random.default_rng(seed)
+        self._campione = np.empty((0, k))
+        self._chiavi_campione = np.empty(0)
+
+    def aggiorna(self, blocco):
+        X = blocco[self.colonne].to_numpy(dtype=float)
+        presenti = ~np.isnan(X)
+        X = X[presenti.any(axis=1)]
+        presenti = presenti[presenti.any(axis=1)]
+        if len(X):
+            for (i, j), momenti in self.coppie.items():
+                righe = presenti[:, i] & presenti[:, j]
+                momenti.aggiorna(X[np.ix_(righe, [i, j])])
+            # fmin/fmax ignorano i NaN
+            np.fmin(self.minimi, np.fmin.reduce(X, axis=0), out=self.minimi)
+            np.fmax(self.massimi, np.fmax.reduce(X, axis=0), out=self.massimi)
+            self._aggiorna_campione(X)
+        for colonna in self.gruppi:
+            if colonna in blocco:
+                parziali = blocco.groupby(colonna, observed=True)['Svalutazione_Percentuale'].agg(['sum', 'count'])
+                precedenti = self.gruppi[colonna]
+                self.gruppi[colonna] = parziali if precedenti is None else precedenti.add(parziali, fill_value=0)
+        return self
+
+    def _aggiorna_campione(self, X):
+        # Bottom-k sampling: ogni riga riceve una chiave casuale e si tengono le k più piccole
+        chiavi = np.concatenate([self._chiavi_campione, self._rng.random(len(X))])
+        righe = np.concatenate([self._campione, X])
+        if len(chiavi) > self.dimensione_campione:
+            tenute = np.argpartition(chiavi, self.dimensione_campione)[:self.dimensione_campione]
+            chiavi, righe = chiavi[tenute], righe[tenute]
+        self._chiavi_campione, self._campione = chiavi, righe
+
+    def unisci(self, altro):
+        """
+        Combina due accumulatori (ad esempio calcolati su file o processi diversi)
+        """
+        if altro._campione.shape[0]:
+            for coppia, momenti in altro.coppie.items():
+                self.coppie[coppia].unisci(momenti)
+            np.minimum(self.minimi, altro.minimi, out=self.minimi)
+            np.maximum(self.massimi, altro.massimi, out=self.massimi)
+            self._chiavi_campione = np.concatenate([self._chiavi_campione, altro._chiavi_campione])
+            self._campione = np.concatenate([self._campione, altro._campione])
+            if len(self._chiavi_campione) > self.dimensione_campione:
+                tenute = np.argpartition(self._chiavi_campione, self.dimensione_campione)[:self.dimensione_campione]
+                self._chiavi_campione, self._campione = self._chiavi_campione[tenute], self._campione[tenute]
+        for colonna, parziali in altro.gruppi.items():
+            if parziali is not None:
+                precedenti = self.gruppi[colonna]
+                self.gruppi[colonna] = parziali if precedenti is None else precedenti.add(parziali, fill_value=0)
+        return self
+
+    def descrittive(self):
+        k = len(self.colonne)
+        colonne = [self.coppie[(i, i)] for i in range(k)]
+        conteggi = np.array([float(m.n) for m in colonne])
+        medie = np.array([m.media[0] if m.n else np.nan for m in colonne])
+        varianze = np.array([m.comomenti[0, 0] / (m.n - 1) if m.n > 1 else np.nan for m in colonne])
+        quartili = np.full((3, k), np.nan)
+        for i in range(k):
+            valori = self._campione[:, i]
+            valori = valori[~np.isnan(valori)]
+            if len(valori):
+                quartili[:, i] = np.quantile(valori, [0.25, 0.5, 0.75])
+        vuote = conteggi == 0
+        return pd.DataFrame(
+            [conteggi, medie, np.sqrt(varianze), np.where(vuote, np.nan, self.minimi), *quartili,
+             np.where(vuote, np.nan, self.massimi)],
+            index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+            columns=self.colonne,
+        )
+
+    def correlazioni(self):
+        k = len(self.colonne)
+        corr = np.empty((k, k))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for (i, j), momenti in self.coppie.items():
+                c = momenti.comomenti
+                corr[i, j] = corr[j, i] = c[0, 1] / np.sqrt(c[0, 0] * c[1, 1])
+        return pd.DataFrame(corr, index=self.colonne, columns=self.colonne)
+
+    def media_per_gruppo(self, colonna):
+        parziali = self.gruppi[colonna]
+        if parziali is None:
+            return pd.Series(dtype=float, name='Svalutazione_Percentuale')
+        medie = parziali['sum'] / parziali['count']
+        medie.name = 'Svalutazione_Percentuale'
+        return medie.sort_index()
+
+    def statistiche(self):
+        return {
+            'descrittive': self.descrittive(),
+            'per_anno': self.media_per_gruppo('Anno'),
+            'per_condizioni': self.media_per_gruppo('Condizioni'),
+            'correlazioni': self.correlazioni(),
+        }
+
+
+def statistiche_streaming(percorso, dimensione_blocco=DIMENSIONE_BLOCCO, dimensione_campione=DIMENSIONE_CAMPIONE):
+    """
+    Come dati.statistiche(), ma leggendo il CSV a blocchi in memoria limitata
+    """
+    accumulatore = AccumulatoreStatistiche(dimensione_campione=dimensione_campione)
+    for blocco in leggi_a_blocchi(percorso, dimensione_blocco):
+        accumulatore.aggiorna(blocco)
+    return accumulatore.statistiche()
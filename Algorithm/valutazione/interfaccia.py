@@ -0,0 +1,250 @@
+"""
+Interfaccia interattiva (ipywidgets) per previsioni con curva di deprezzamento realistico.
+
+In modalità live il grafico segue gli slider: le modifiche vengono raccolte
+per RITARDO_AGGIORNAMENTO secondi (debounce) prima di ricalcolare, le
+proiezioni già viste vengono riprese da una cache LRU e la figura è creata una
+volta sola, aggiornando linea, barre ed etichette esistenti.
+"""
+import asyncio
+import threading
+from functools import lru_cache
+
+from IPython.display import clear_output, display
+from ipywidgets import widgets
+
+from .grafici import GraficoCurva
+from .modello import prevedi_flotta
+from .proiezione import SOGLIE_PERDITA, analizza_curve
+
+RITARDO_AGGIORNAMENTO = 0.3  # secondi senza modifiche agli slider prima di ricalcolare
+DIMENSIONE_CACHE = 256       # proiezioni memorizzate per combinazione di slider
+
+
+class Rimandatore:
+    """
+    Debounce: esegue funzione solo dopo ritardo secondi dall'ultima chiamata.
+    Usa il loop asyncio del kernel se c'è (le callback girano nel suo thread),
+    altrimenti un threading.Timer
+    """
+
+    def __init__(self, ritardo, funzione):
+        self.ritardo = ritardo
+        self.funzione = funzione
+        self._in_attesa = None
+
+    def __call__(self, *_):
+        if self._in_attesa is not None:
+            self._in_attesa.cancel()
+        try:
+            self._in_attesa = asyncio.get_running_loop().call_later(self.ritardo, self.funzione)
+        except RuntimeError:
+            self._in_attesa = threading.Timer(self.ritardo, self.funzione)
+            self._in_attesa.daemon = True
+            self._in_attesa.start()
+
+
+def interfaccia_previsione(pipeline, df, live=True):
+    """
+    Simulatore interattivo con curva di deprezzamento realistico; con live il
+    grafico si aggiorna mentre si muovono gli slider
+    """
+    # Aggregati del dataset calcolati una volta sola, non a ogni aggiornamento
+    prezzo_medio_listino = float(df['Prezzo di Listino'].mean())
+
+    # Crea widget per l'input
+    titolo = widgets.HTML(value="<h3>Simulatore di Svalutazione Golf GTD</h3>")
+    anno_widget = widgets.IntSlider(min=2018, max=2025, value=2022, description='Anno:')
+    km_widget = widgets.IntSlider(min=0, max=150000, step=1000, value=30000, description='Chilometri:')
+    anni_previsione = widgets.IntSlider(min=1, max=10, value=5, description='Anni di previsione:')
+    km_annui = widgets.IntSlider(min=0, max=30000, step=500, value=15000, description='Km annui:')
+    live_widget = widgets.Checkbox(value=live, description='Aggiornamento live')
+    bottone_calcola = widgets.Button(description='Calcola Svalutazione')
+    riepilogo = widgets.HTML()
+    output_grafico = widgets.Output()
+    output_area = widgets.Output()
+
+    # Layout per organizzare i widget
+    box_layout = widgets.Layout(display='flex', flex_flow='column', align_items='stretch', width='80%')
+    form = widgets.VBox([titolo, anno_widget, km_widget, anni_previsione, km_annui, live_widget, bottone_calcola,
+                         riepilogo, output_grafico, output_area], layout=box_layout)
+
+    @lru_cache(maxsize=DIMENSIONE_CACHE)
+    def calcola(anno, chilometri, anni_futuri, chilometri_annui):
+        """
+        Proiezione del veicolo e analisi della curva per una combinazione di slider
+        """
+        proiezione = prevedi_flotta(
+            pipeline,
+            anni=[anno],
+            chilometri=[chilometri],
+            prezzi_listino=[prezzo_medio_listino],
+            km_annui=[chilometri_annui],
+            anni_previsione=anni_futuri
+        )
+        analisi = analizza_curve(proiezione)
+        anni_soglie = {s: int(a) for s, a in zip(analisi.soglie, analisi.anni_soglie[0]) if a >= 0}
+        return proiezione.veicolo(0), anni_soglie, analisi.veicolo(0)['rallentamento']
+
+    grafico = None
+    canvas_interattivo = False
+
+    def mostra_grafico(risultati, anno):
+        nonlocal grafico, canvas_interattivo
+        if grafico is None:
+            # Figura unica per l'orizzonte massimo degli slider, poi solo aggiornata
+            grafico = GraficoCurva(anni_previsione.max)
+            # Con il backend ipympl la figura è un widget che si ridisegna da sé
+            canvas_interattivo = isinstance(grafico.fig.canvas, widgets.DOMWidget)
+            if canvas_interattivo:
+                with output_grafico:
+                    display(grafico.fig.canvas)
+        grafico.aggiorna(risultati, anno)
+        if not canvas_interattivo:
+            # Backend inline: si rimostra la stessa figura, senza ricrearla
+            with output_grafico:
+                clear_output(wait=True)
+                display(grafico.fig)
+
+    def aggiorna_live():
+        anno = anno_widget.value
+        risultati, _, _ = calcola(anno, km_widget.value, anni_previsione.value, km_annui.value)
+        valore_iniziale = risultati['valori'][0]
+        valore_finale = risultati['valori'][-1]
+        riepilogo.value = (
+            f"Svalutazione attuale: <b>{risultati['svalutazioni'][0]:.2f}%</b> &nbsp;|&nbsp; "
+            f"Valore stimato: <b>€{valore_iniziale:,.2f}</b> &nbsp;|&nbsp; "
+            f"Valore nel {risultati['anni'][-1]}: <b>€{valore_finale:,.2f}</b> "
+            f"(-{(valore_iniziale - valore_finale) / valore_iniziale * 100:.1f}%)"
+        )
+        mostra_grafico(risultati, anno)
+
+    rimanda = Rimandatore(RITARDO_AGGIORNAMENTO, aggiorna_live)
+
+    def on_slider_change(change):
+        if live_widget.value:
+            rimanda()
+
+    # Funzione per gestire il click sul bottone
+    def on_calcola_button_click(b):
+        with output_area:
+            clear_output()
+            anno = anno_widget.value
+            chilometri = km_widget.value
+            anni_futuri = anni_previsione.value
+            chilometri_annui = km_annui.value
+
+            print(f"🔍 ANALISI DELLA SVALUTAZIONE")
+            print(f"==================================================")
+            print(f"Il modello utilizza una combinazione di:")
+            print(f"- Modello di machine learning (per la svalutazione iniziale)")
+            print(f"- Curva di deprezzamento esponenziale decrescente (per la proiezione temporale)")
+            print(f"- Effetto dei chilometri sul tasso di deprezzamento")
+
+            # Calcola la svalutazione usando il modello realistico (o la cache)
+            risultati, anni_soglie, rallentamento = calcola(anno, chilometri, anni_futuri, chilometri_annui)
+
+            print(f"\n📊 SVALUTAZIONE ATTUALE:")
+            print(f"==========================")
+            print(f"Anno: {anno}")
+            print(f"Chilometri: {chilometri:,}")
+            print(f"Svalutazione prevista: {risultati['svalutazioni'][0]:.2f}%")
+
+            print(f"\n💰 VALUTAZIONE FINANZIARIA ATTUALE:")
+            print(f"==========================")
+            print(f"Prezzo medio di listino di riferimento: €{prezzo_medio_listino:,.2f}")
+            print(f"Valore stimato attuale: €{risultati['valori'][0]:,.2f}")
+
+            # Calcola la svalutazione futura per ogni anno
+            print(f"\n📈 PREVISIONE SVALUTAZIONE NEI PROSSIMI {anni_futuri} ANNI:")
+            print(f"==========================")
+            print(f"{'Anno':^8} | {'Km Totali':^12} | {'Svalutazione %':^15} | {'Valore Stimato':^15} | {'Perdita Annua (€)':^15} | {'Perdita Annua (%)':^15}")
+            print(f"{'-'*8:^8} | {'-'*12:^12} | {'-'*15:^15} | {'-'*15:^15} | {'-'*15:^15} | {'-'*15:^15}")
+
+            # Stampa i risultati anno per anno
+            for i in range(len(risultati['anni'])):
+                if i == 0:
+                    # Anno corrente
+                    print(f"{risultati['anni'][i]:^8} | {risultati['chilometri'][i]:^12,} | {risultati['svalutazioni'][i]:^15,.2f}% | {risultati['valori'][i]:^15,.2f}€ | {'-':^15} | {'-':^15}")
+                else:
+                    # Anni futuri
+                    print(f"{risultati['anni'][i]:^8} | {risultati['chilometri'][i]:^12,} | {risultati['svalutazioni'][i]:^15,.2f}% | {risultati['valori'][i]:^15,.2f}€ | {risultati['perdite_euro'][i-1]:^15,.2f}€ | {risultati['perdite_percentuali'][i-1]:^15,.2f}%")
+
+            # Calcola la svalutazione totale nel periodo
+            valore_iniziale = risultati['valori'][0]
+            valore_finale = risultati['valori'][-1]
+            svalutazione_periodo = ((valore_iniziale - valore_finale) / valore_iniziale) * 100
+
+            print(f"\n📊 RIEPILOGO SVALUTAZIONE NEL PERIODO {risultati['anni'][0]}-{risultati['anni'][-1]}:")
+            print(f"==========================")
+            print(f"Valore iniziale (oggi): €{valore_iniziale:,.2f}")
+            print(f"Valore finale (dopo {anni_futuri} anni): €{valore_finale:,.2f}")
+            print(f"Perdita totale di valore: €{(valore_iniziale - valore_finale):,.2f} ({svalutazione_periodo:.2f}%)")
+
+            # Aggiorna i grafici della curva di deprezzamento
+            mostra_grafico(risultati, anno)
+
+            # Analizza quando la perdita annua scende sotto soglie significative
+            if len(risultati['perdite_percentuali']) > 1:
+                print(f"\n💡 ANALISI DELLA CURVA DI DEPREZZAMENTO:")
+                print(f"==========================")
+
+                # Mostra quando la perdita percentuale scende sotto le soglie
+                for soglia in SOGLIE_PERDITA:
+                    if soglia in anni_soglie:
+                        print(f"La perdita annua scende sotto il {soglia}% nell'anno {anni_soglie[soglia]}")
+
+                # Trova l'anno con il maggior rallentamento della curva
+                if rallentamento is not None:
+                    print(f"\nPunto di maggior rallentamento della svalutazione: anno {rallentamento['anno']}")
+                    print(f"In questo punto, la perdita annua passa da {rallentamento['perdita_prima']:.1f}% a {rallentamento['perdita_dopo']:.1f}%")
+                    print(f"Differenza: {rallentamento['differenza']:.1f} punti percentuali")
+
+                # Suggerimento strategico
+                print(f"\n📌 SUGGERIMENTO STRATEGICO PER LA VENDITA:")
+                print(f"==========================")
+
+                if 5 in anni_soglie:
+                    print(f"Punto di equilibrio tra svalutazione e utilizzo: anno {anni_soglie[5]}")
+                    print(f"A partire da quest'anno, l'auto perde meno del 5% di valore all'anno.")
+                    print(f"Questo rappresenta spesso un buon compromesso tra la perdita di valore")
+                    print(f"e la necessità di sostenere costi di manutenzione crescenti per auto più vecchie.")
+                elif 8 in anni_soglie:
+                    print(f"La svalutazione scende sotto l'8% nell'anno {anni_soglie[8]}, ma rimane significativa.")
+                    print(f"Se prevedi di tenere l'auto a lungo, considera questo periodo.")
+                else:
+                    print(f"La svalutazione rimane elevata per tutto il periodo analizzato.")
+                    print(f"Questo suggerisce che l'auto potrebbe avere un tasso di deprezzamento sostenuto.")
+                    print(f"Valuta se vendere prima o rivolgiti ad un esperto per un'analisi più approfondita.")
+
+                # Suggerimento finale
+                perdita_primo_anno = risultati['perdite_percentuali'][0]
+                perdita_ultimo_anno = risultati['perdite_percentuali'][-1]
+                differenza = perdita_primo_anno - perdita_ultimo_anno
+
+                if differenza > 5:
+                    print(f"\nL'auto mostra una classica curva di deprezzamento con una pendenza che")
+                    print(f"si riduce significativamente nel tempo (da {perdita_primo_anno:.1f}% a {perdita_ultimo_anno:.1f}%).")
+                    if perdita_ultimo_anno < 5:
+                        print(f"Suggerimento: Considera di tenere l'auto fino a quando la perdita annua")
+                        print(f"scende sotto il 5%, che nel tuo caso è l'anno {anni_soglie.get(5, 'oltre il periodo analizzato')}.")
+                else:
+                    print(f"\nLa curva di deprezzamento mostra un andamento relativamente costante.")
+                    print(f"Questo potrebbe dipendere dalle caratteristiche specifiche del modello o del mercato.")
+                    print(f"In questi casi, altri fattori come costi di manutenzione o esigenze personali")
+                    print(f"dovrebbero guidare la decisione sul momento di vendita.")
+            else:
+                print(f"\nPeriodo di previsione troppo breve per un'analisi dettagliata della curva di deprezzamento.")
+
+    # Collega la funzione al bottone e gli slider all'aggiornamento live
+    bottone_calcola.on_click(on_calcola_button_click)
+    for slider in (anno_widget, km_widget, anni_previsione, km_annui):
+        slider.observe(on_slider_change, names='value')
+    live_widget.observe(on_slider_change, names='value')
+
+    # Visualizza l'interfaccia
+    display(form)
+    if live:
+        aggiorna_live()
+
+    return form
@@ -0,0 +1,106 @@
+"""
+Metriche di durata (istogrammi) esportate nel formato testuale di Prometheus.
+
+Ogni stadio della valutazione (costruzione feature, scaler, regressore,
+superficie, proiezione, caricamento e addestramento del modello) viene
+cronometrato con cronometro(stadio); l'API aggiunge validazione dell'input,
+costruzione della risposta negli handler, serializzazione (misurata solo dal
+middleware) e la durata complessiva delle richieste. Nessuna dipendenza
+esterna: solo time.perf_counter e un lock per istogramma.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKET_PREDEFINITI = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                      0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(valore):
+    return str(valore).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatta_etichette(nomi, valori, extra=None):
+    coppie = list(zip(nomi, valori))
+    if extra is not None:
+        coppie.append(extra)
+    if not coppie:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in coppie) + '}'
+
+
+def _formatta_numero(valore):
+    return '+Inf' if valore == float('inf') else repr(float(valore))
+
+
+class Istogramma:
+    def __init__(self, nome, aiuto, etichette=(), bucket=BUCKET_PREDEFINITI):
+        self.nome = nome
+        self.aiuto = aiuto
+        self.etichette = tuple(etichette)
+        self.bucket = tuple(sorted(bucket))
+        self._serie = {}  # valori delle etichette -> [conteggi per bucket (+Inf incluso), somma, conteggio]
+        self._lock = threading.Lock()
+
+    def osserva(self, valore, **etichette):
+        chiave = tuple(str(etichette[n]) for n in self.etichette)
+        indice = bisect.bisect_left(self.bucket, valore)
+        with self._lock:
+            serie = self._serie.get(chiave)
+            if serie is None:
+                serie = self._serie[chiave] = [[0] * (len(self.bucket) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valore
+            serie[2] += 1
+
+    def esporta(self):
+        righe = [f'# HELP {self.nome} {self.aiuto}', f'# TYPE {self.nome} histogram']
+        with self._lock:
+            serie = {k: ([*v[0]], v[1], v[2]) for k, v in self._serie.items()}
+        for chiave in sorted(serie):
+            conteggi, somma, totale = serie[chiave]
+            cumulato = 0
+            for limite, n in zip((*self.bucket, float('inf')), conteggi):
+                cumulato += n
+                etichette = _formatta_etichette(self.etichette, chiave, ('le', _formatta_numero(limite)))
+                righe.append(f'{self.nome}_bucket{etichette} {cumulato}')
+            etichette = _formatta_etichette(self.etichette, chiave)
+            righe.append(f'{self.nome}_sum{etichette} {_formatta_numero(somma)}')
+            righe.append(f'{self.nome}_count{etichette} {totale}')
+        return righe
+
+
+class RegistroMetriche:
+    def __init__(self):
+        self._istogrammi = {}
+        self._lock = threading.Lock()
+
+    def istogramma(self, nome, aiuto, etichette=(), bucket=BUCKET_PREDEFINITI):
+        with self._lock:
+            if nome not in self._istogrammi:
+                self._istogrammi[nome] = Istogramma(nome, aiuto, etichette, bucket)
+            return self._istogrammi[nome]
+
+    def esporta(self):
+        with self._lock:
+            istogrammi = list(self._istogrammi.values())
+        righe = []
+        for istogramma in istogrammi:
+            righe.extend(istogramma.esporta())
+        return '\n'.join(righe) + '\n'
+
+
+REGISTRO = RegistroMetriche()
+
+STADI = REGISTRO.istogramma(
+    'comparauto_stadio_secondi', 'Durata degli stadi della valutazione in secondi', ('stadio',))
+
+
+@contextmanager
+def cronometro(stadio, istogramma=STADI):
+    inizio = time.perf_counter()
+    try:
+        yield
+    finally:
+        istogramma.osserva(time.perf_counter() - inizio, stadio=stadio)
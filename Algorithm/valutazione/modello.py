@@ -0,0 +1,315 @@
+"""
+Modello di regressione della svalutazione e curva di deprezzamento nel tempo.
+
+scikit-learn viene importato solo quando si crea o addestra una pipeline: per
+fare previsioni con un artefatto gia' addestrato basta numpy.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .metriche import cronometro
+from .momenti import Comomenti
+from .proiezione import ANNO_CORRENTE, proietta
+from .superficie import TOLLERANZA_ERRORE
+
+COLONNE_FEATURE = ['Anno', 'Chilometri']
+COLONNA_TARGET = 'Svalutazione_Percentuale'
+
+# Colonne ad alta cardinalità codificate con feature hashing: la dimensione
+# della matrice resta N_FEATURE_HASH qualunque sia il numero di valori distinti
+COLONNE_HASH = ['Marca', 'Modello', 'Allestimento', 'Regione']
+N_FEATURE_HASH = 2 ** 18
+# Feature categoriche che le previsioni possono ricevere per veicolo
+COLONNE_CATEGORICHE = ['Condizioni'] + COLONNE_HASH
+# Categorie di Condizioni più rare di così finiscono in un'unica colonna "infrequenti"
+FREQUENZA_MINIMA_CATEGORIE = 20
+
+# Insiemi di feature e regressori candidati (vedi selezione.py)
+FEATURE_SET = {
+    'numeriche': ['Anno', 'Chilometri'],
+    'con_condizioni': ['Anno', 'Chilometri', 'Condizioni'],
+    'categoriche': ['Anno', 'Chilometri', 'Condizioni'] + COLONNE_HASH,
+}
+REGRESSORI = ('lineare', 'ridge', 'lasso', 'gradient_boosting')
+# Regressori che accettano matrici sparse (necessari per 'categoriche')
+REGRESSORI_SPARSI = ('lineare', 'ridge', 'lasso')
+
+
+@dataclass
+class RisultatoAddestramento:
+    pipeline: object
+    r2: float
+    rmse: float
+    coefficienti: dict
+    # Statistiche sufficienti delle righe di training, per gli aggiornamenti incrementali
+    sufficienti: Comomenti = None
+
+
+def crea_regressore(nome):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from sklearn.linear_model import Lasso, LinearRegression, Ridge
+
+    if nome == 'lineare':
+        return LinearRegression()  # Modello di regressione lineare
+    if nome == 'ridge':
+        return Ridge(alpha=1.0)
+    if nome == 'lasso':
+        return Lasso(alpha=0.01)
+    if nome == 'gradient_boosting':
+        return HistGradientBoostingRegressor(random_state=42)
+    raise ValueError(f'Regressore sconosciuto: {nome!r}')
+
+
+def applicabile(feature, regressore, colonne):
+    """
+    Vero se la combinazione si può addestrare su un dataset con queste colonne:
+    le colonne hash sono facoltative ma ne serve almeno una
+    """
+    richieste = [c for c in FEATURE_SET[feature] if c not in COLONNE_HASH]
+    if not all(c in colonne for c in richieste):
+        return False
+    if feature == 'categoriche':
+        return regressore in REGRESSORI_SPARSI and any(c in colonne for c in COLONNE_HASH)
+    return True
+
+
+def token_categorici(X):
+    """
+    Righe di token 'colonna=valore' per FeatureHasher; i valori mancanti non
+    producono token
+    """
+    colonne = list(getattr(X, 'columns', range(np.shape(X)[1])))
+    valori = X.to_numpy(dtype=object) if hasattr(X, 'to_numpy') else np.asarray(X, dtype=object)
+    return [[f'{c}={v}' for c, v in zip(colonne, riga) if v is not None and v == v] for riga in valori]
+
+
+def crea_pipeline(feature='numeriche', regressore='lineare'):
+    """
+    StandardScaler + regressore sulle variabili numeriche; con 'con_condizioni'
+    Condizioni entra anche come one-hot (drop='first'). Con 'categoriche' la
+    matrice resta sparsa dall'inizio alla fine: Condizioni come one-hot con le
+    categorie rare raggruppate, marca/modello/allestimento/regione con hashing
+    """
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if feature == 'numeriche':
+        return Pipeline([
+            ('scaler', StandardScaler()),  # Normalizza i dati
+            ('regressor', crea_regressore(regressore))
+        ])
+    if feature == 'con_condizioni':
+        from sklearn.compose import ColumnTransformer
+        from sklearn.preprocessing import OneHotEncoder
+
+        preprocessore = ColumnTransformer([
+            ('num', StandardScaler(), ['Anno', 'Chilometri']),
+            ('cat', OneHotEncoder(drop='first', handle_unknown='ignore'), ['Condizioni'])
+        ])
+        return Pipeline([
+            ('preprocessore', preprocessore),
+            ('regressor', crea_regressore(regressore))
+        ])
+    if feature == 'categoriche':
+        from sklearn.compose import ColumnTransformer
+        from sklearn.feature_extraction import FeatureHasher
+        from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
+
+        if regressore not in REGRESSORI_SPARSI:
+            raise ValueError(f'Il regressore {regressore!r} non accetta matrici sparse')
+        preprocessore = ColumnTransformer([
+            ('num', StandardScaler(), ['Anno', 'Chilometri']),
+            ('cat', OneHotEncoder(handle_unknown='infrequent_if_exist',
+                                  min_frequency=FREQUENZA_MINIMA_CATEGORIE), ['Condizioni']),
+            ('hash', Pipeline([
+                ('token', FunctionTransformer(token_categorici)),
+                ('hasher', FeatureHasher(n_features=N_FEATURE_HASH, input_type='string')),
+            ]), COLONNE_HASH),
+        ], sparse_threshold=1.0)  # Output sempre sparso (CSR)
+        return Pipeline([
+            ('preprocessore', preprocessore),
+            ('regressor', crea_regressore(regressore))
+        ])
+    raise ValueError(f'Insieme di feature sconosciuto: {feature!r}')
+
+
+def nomi_coefficienti(pipeline):
+    """
+    Nomi delle colonne della matrice, nell'ordine dei coefficienti; le colonne
+    hash (in coda) non hanno un nome leggibile e vengono omesse
+    """
+    if 'preprocessore' not in pipeline.named_steps:
+        return COLONNE_FEATURE
+    preprocessore = pipeline['preprocessore']
+    if 'hash' in preprocessore.named_transformers_:
+        return [f'{nome}__{n}' for nome in ('num', 'cat')
+                for n in preprocessore.named_transformers_[nome].get_feature_names_out()]
+    return list(preprocessore.get_feature_names_out())
+
+
+def matrice_feature(df, feature='numeriche'):
+    """
+    Array numpy per le sole variabili numeriche, DataFrame se serve Condizioni;
+    le colonne hash assenti dal dataset restano vuote
+    """
+    colonne = FEATURE_SET[feature]
+    if feature == 'numeriche':
+        return df[colonne].to_numpy(dtype=float)
+    if feature == 'categoriche':
+        return df.reindex(columns=colonne)
+    return df[colonne]
+
+
+def righe_complete(df):
+    """
+    Righe con Anno, Chilometri e svalutazione presenti: le altre non si
+    possono usare per addestrare o validare
+    """
+    complete = df[COLONNE_FEATURE + [COLONNA_TARGET]].notna().all(axis=1)
+    return df if complete.all() else df[complete]
+
+
+def train(df, test_size=0.2, random_state=42, feature='numeriche', regressore='lineare'):
+    """
+    Addestra la pipeline e la valuta sul set di test
+    """
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    df = righe_complete(df)
+    X = matrice_feature(df, feature)
+    y = df[COLONNA_TARGET].to_numpy(dtype=float)
+
+    # Dividi i dati in set di training e test
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+    pipeline = crea_pipeline(feature, regressore)
+    pipeline.fit(X_train, y_train)
+
+    # Valuta il modello
+    y_pred = pipeline.predict(X_test)
+    r2 = r2_score(y_test, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+
+    # Estrai i coefficienti del modello
+    coefficienti = {}
+    if hasattr(pipeline['regressor'], 'coef_'):
+        nomi = nomi_coefficienti(pipeline)
+        coefficienti = {str(f): float(c) for f, c in zip(nomi, pipeline['regressor'].coef_)}
+
+    # Le equazioni normali valgono solo per la regressione lineare non regolarizzata
+    sufficienti = None
+    if feature == 'numeriche' and regressore == 'lineare':
+        sufficienti = Comomenti(len(COLONNE_FEATURE) + 1).aggiorna(np.column_stack([X_train, y_train]))
+    return RisultatoAddestramento(pipeline, float(r2), float(rmse), coefficienti, sufficienti)
+
+
+def importanza_variabili(coefficienti):
+    """
+    Importanza relativa (%) delle variabili dal valore assoluto dei coefficienti
+    """
+    if not coefficienti:
+        return {}
+    importanze = np.abs(np.fromiter(coefficienti.values(), dtype=float))
+    importanze_normalizzate = 100.0 * (importanze / np.sum(importanze))
+    return dict(zip(coefficienti, importanze_normalizzate))
+
+
+def feature_categoriche(pipeline):
+    """
+    Colonne categoriche in ingresso al modello (vuoto per i modelli solo numerici)
+    """
+    candidato = getattr(pipeline, 'candidato', None)
+    if candidato is None:
+        return []
+    return [c for c in FEATURE_SET[candidato['feature']] if c not in COLONNE_FEATURE]
+
+
+def predict(pipeline, anni, chilometri, tolleranza=TOLLERANZA_ERRORE, categoriche=None):
+    """
+    Svalutazione prevista (%) per uno o piu' veicoli. Se il modello non è
+    lineare e ha una superficie precalcolata con errore stimato entro la
+    tolleranza si interpola su quella (vedi superficie.py); per un modello
+    lineare il calcolo esatto costa già meno dell'interpolazione.
+    categoriche: colonna -> valori per veicolo (None se mancanti) delle
+    feature categoriche; quelle che il modello non usa vengono ignorate, i
+    valori mancanti prendono i predefiniti dell'artefatto
+    """
+    if categoriche:
+        categoriche = {c: categoriche[c] for c in feature_categoriche(pipeline)
+                       if c in categoriche and any(v is not None for v in categoriche[c])}
+    superficie = getattr(pipeline, 'superficie', None)
+    # La superficie è calcolata con i valori categorici predefiniti
+    usa_superficie = (superficie is not None and not getattr(pipeline, 'lineare', False)
+                      and not categoriche and superficie.affidabile(tolleranza))
+    with cronometro('costruzione_feature'):
+        anni = np.atleast_1d(np.asarray(anni, dtype=float))
+        chilometri = np.atleast_1d(np.asarray(chilometri, dtype=float))
+        if usa_superficie:
+            X = None
+        elif categoriche:
+            import pandas as pd
+            X = pd.DataFrame({'Anno': anni, 'Chilometri': chilometri,
+                              **{c: list(valori) for c, valori in categoriche.items()}})
+        else:
+            X = np.column_stack([anni, chilometri])
+    if usa_superficie:
+        with cronometro('superficie'):
+            return superficie.prevedi(pipeline, anni, chilometri)
+    if hasattr(pipeline, 'lineare'):
+        # L'artefatto cronometra da sé scaler e regressore
+        return pipeline.predict(X)
+    with cronometro('modello'):
+        return pipeline.predict(X)
+
+
+def prevedi_svalutazione(pipeline, anno, chilometri, categoriche=None):
+    """
+    Simula la svalutazione di una Golf GTD in base ai parametri
+    usando il modello di machine learning addestrato
+    """
+    if categoriche:
+        categoriche = {c: [v] for c, v in categoriche.items()}
+    return float(predict(pipeline, anno, chilometri, categoriche=categoriche)[0])
+
+
+def griglia_previsioni(pipeline, anni, chilometri, risoluzione=20):
+    """
+    Griglia Anno x Chilometri con la svalutazione prevista in ogni punto
+    """
+    anni = np.linspace(np.min(anni), np.max(anni), risoluzione)
+    chilometri = np.linspace(np.min(chilometri), np.max(chilometri), risoluzione)
+    X_grid, Y_grid = np.meshgrid(anni, chilometri)
+    Z_grid = predict(pipeline, X_grid.ravel(), Y_grid.ravel()).reshape(X_grid.shape)
+    return X_grid, Y_grid, Z_grid
+
+
+def prevedi_flotta(pipeline, anni, chilometri, prezzi_listino, km_annui, anni_previsione,
+                   anno_attuale=ANNO_CORRENTE, categoriche=None):
+    """
+    Curve di deprezzamento di N veicoli in un solo passaggio vettoriale
+    """
+    svalutazioni = predict(pipeline, anni, chilometri, categoriche=categoriche)
+    return proietta(svalutazioni, chilometri, prezzi_listino, km_annui, anni_previsione, anno_attuale)
+
+
+def prevedi_bande(pipeline, anni, chilometri, prezzi_listino, km_annui, anni_previsione, categoriche=None,
+                  **opzioni):
+    """
+    Bande di incertezza Monte Carlo (P10/P50/P90 predefiniti) del valore futuro
+    di N veicoli; opzioni sono quelle di simulazione.simula
+    """
+    from .simulazione import simula
+
+    svalutazioni = predict(pipeline, anni, chilometri, categoriche=categoriche)
+    return simula(svalutazioni, prezzi_listino, km_annui, anni_previsione, **opzioni)
+
+
+def prevedi_svalutazione_nel_tempo(pipeline, anno_base, km_base, prezzo_listino, anni_previsione, km_annui,
+                                   anno_attuale=ANNO_CORRENTE):
+    """
+    Implementa un modello di deprezzamento realistico che segue una curva esponenziale decrescente
+    """
+    return prevedi_flotta(pipeline, [anno_base], [km_base], [prezzo_listino], [km_annui],
+                          anni_previsione, anno_attuale).veicolo(0)
@@ -0,0 +1,61 @@
+"""
+Conteggio, medie e co-momenti aggiornabili a blocchi.
+
+Sono le statistiche sufficienti sia per describe()/corr() sia per la
+regressione lineare: due accumulatori si combinano con le formule di
+Chan et al., numericamente stabili anche su milioni di righe.
+"""
+import numpy as np
+
+
+class Comomenti:
+    def __init__(self, k):
+        self.n = 0
+        self.media = np.zeros(k)
+        self.comomenti = np.zeros((k, k))
+
+    def aggiorna(self, X):
+        """
+        Assorbe un blocco di righe (n_b x k) in O(n_b k^2)
+        """
+        X = np.asarray(X, dtype=float)
+        if not len(X):
+            return self
+        altro = Comomenti(X.shape[1])
+        altro.n = len(X)
+        altro.media = X.mean(axis=0)
+        scarti = X - altro.media
+        altro.comomenti = scarti.T @ scarti
+        return self.unisci(altro)
+
+    def unisci(self, altro):
+        if not altro.n:
+            return self
+        n = self.n + altro.n
+        delta = altro.media - self.media
+        self.comomenti = self.comomenti + altro.comomenti + np.outer(delta, delta) * (self.n * altro.n / n)
+        self.media = self.media + delta * (altro.n / n)
+        self.n = n
+        return self
+
+    def copia(self):
+        c = Comomenti(len(self.media))
+        c.n = self.n
+        c.media = self.media.copy()
+        c.comomenti = self.comomenti.copy()
+        return c
+
+    def varianze(self, ddof=0):
+        return np.diag(self.comomenti) / (self.n - ddof)
+
+    def to_dict(self):
+        return {'n': self.n, 'media': self.media.tolist(), 'comomenti': self.comomenti.tolist()}
+
+    @classmethod
+    def from_dict(cls, dati):
+        media = np.asarray(dati['media'], dtype=float)
+        c = cls(len(media))
+        c.n = int(dati['n'])
+        c.media = media
+        c.comomenti = np.asarray(dati['comomenti'], dtype=float)
+        return c
@@ -0,0 +1,212 @@
+"""
+Motore vettoriale della curva di deprezzamento nel tempo.
+
+Proietta N veicoli su un orizzonte di H anni in un solo passaggio NumPy: il
+tasso annuo e' una matrice N x H e i valori si ottengono con un prodotto
+cumulativo lungo gli anni, senza cicli Python per veicolo o per anno.
+analizza_curve ricava dalle stesse matrici gli anni in cui la perdita annua
+scende sotto le soglie, il punto di maggior rallentamento e l'anno di vendita
+suggerito.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .metriche import cronometro
+
+ANNO_CORRENTE = 2025
+
+# Limiti degli ingressi accettati da API e grafici
+MAX_ANNI_PREVISIONE = 30
+MAX_CHILOMETRI = 2_000_000
+
+# Parametri del modello di deprezzamento realistico
+# Questi parametri sono calibrati per riflettere il fatto che:
+# 1. Il deprezzamento è più rapido nei primi anni
+# 2. Rallenta progressivamente negli anni successivi
+# 3. È influenzato sia dall'età che dai chilometri
+TASSO_BASE_INIZIALE = 0.09  # 9% il primo anno
+FATTORE_DECRESCITA = 0.85   # Il tasso diminuisce del 15% ogni anno
+COEFFICIENTE_KM = 0.20      # Impatto dei km sul deprezzamento
+KM_RIFERIMENTO = 20000      # I km annui sono normalizzati su 20,000 km
+
+# Soglie (%) della perdita annua usate nell'analisi della curva
+SOGLIE_PERDITA = (8, 5, 3)
+# Soglie per il suggerimento di vendita, in ordine di preferenza
+SOGLIE_VENDITA = (5, 8)
+
+
+@dataclass
+class Proiezione:
+    """
+    Risultato colonnare: la colonna 0 e' l'anno corrente, le successive gli
+    anni futuri. Le perdite hanno una colonna in meno (da anno 1 ad anno H).
+    """
+    anni: np.ndarray                 # (H+1,)
+    chilometri: np.ndarray           # (N, H+1)
+    svalutazioni: np.ndarray         # (N, H+1) rispetto al prezzo di listino, in %
+    valori: np.ndarray               # (N, H+1) in euro
+    perdite_euro: np.ndarray         # (N, H)
+    perdite_percentuali: np.ndarray  # (N, H)
+
+    def __len__(self):
+        return self.valori.shape[0]
+
+    @property
+    def orizzonte(self):
+        return self.perdite_euro.shape[1]
+
+    def veicolo(self, i):
+        """
+        Curva del veicolo i nel formato a liste di prevedi_svalutazione_nel_tempo
+        """
+        return {
+            'anni': self.anni.tolist(),
+            'chilometri': self.chilometri[i].tolist(),
+            'svalutazioni': self.svalutazioni[i].tolist(),
+            'valori': self.valori[i].tolist(),
+            'perdite_euro': self.perdite_euro[i].tolist(),
+            'perdite_percentuali': self.perdite_percentuali[i].tolist(),
+        }
+
+
+def tassi_annui(km_annui, anni_previsione):
+    """
+    Matrice N x H dei tassi di deprezzamento annui: il tasso base decresce
+    geometricamente con l'età, l'effetto km è costante per veicolo
+    """
+    esponenti = np.arange(1, anni_previsione + 1)
+    tasso_base = TASSO_BASE_INIZIALE * FATTORE_DECRESCITA ** esponenti
+    effetto_km = (np.asarray(km_annui, dtype=float) / KM_RIFERIMENTO) * COEFFICIENTE_KM
+    return tasso_base[np.newaxis, :] + effetto_km[:, np.newaxis]
+
+
+def proietta(svalutazioni_iniziali, km_base, prezzi_listino, km_annui, anni_previsione,
+             anno_attuale=ANNO_CORRENTE):
+    """
+    Proietta N veicoli per anni_previsione anni partendo dalla svalutazione
+    attuale (%) stimata dal modello
+    """
+    with cronometro('proiezione'):
+        return _proietta(svalutazioni_iniziali, km_base, prezzi_listino, km_annui, anni_previsione, anno_attuale)
+
+
+def _proietta(svalutazioni_iniziali, km_base, prezzi_listino, km_annui, anni_previsione, anno_attuale):
+    svalutazioni_iniziali = np.atleast_1d(np.asarray(svalutazioni_iniziali, dtype=float))
+    n = svalutazioni_iniziali.shape[0]
+    km_base = np.broadcast_to(np.asarray(km_base), (n,))
+    km_annui = np.broadcast_to(np.asarray(km_annui), (n,))
+    prezzi_listino = np.broadcast_to(np.asarray(prezzi_listino, dtype=float), (n,))
+
+    tassi = tassi_annui(km_annui, anni_previsione)
+
+    valori = np.empty((n, anni_previsione + 1))
+    valori[:, 0] = prezzi_listino * (1 - svalutazioni_iniziali / 100)
+    np.cumprod(1 - tassi, axis=1, out=valori[:, 1:])
+    valori[:, 1:] *= valori[:, :1]
+
+    passi = np.arange(anni_previsione + 1)
+    chilometri = km_base[:, np.newaxis] + km_annui[:, np.newaxis] * passi
+
+    svalutazioni = ((prezzi_listino[:, np.newaxis] - valori) / prezzi_listino[:, np.newaxis]) * 100
+    svalutazioni[:, 0] = svalutazioni_iniziali
+
+    perdite_euro = valori[:, :-1] - valori[:, 1:]
+    # perdita_euro / valore_precedente coincide con il tasso annuo
+    perdite_percentuali = tassi * 100
+
+    return Proiezione(
+        anni=anno_attuale + passi,
+        chilometri=chilometri,
+        svalutazioni=svalutazioni,
+        valori=valori,
+        perdite_euro=perdite_euro,
+        perdite_percentuali=perdite_percentuali,
+    )
+
+
+@dataclass
+class AnalisiCurve:
+    """
+    Analisi delle curve di una Proiezione. Gli anni non raggiunti
+    nell'orizzonte valgono -1.
+    """
+    soglie: tuple
+    anni_soglie: np.ndarray          # (N, S) primo anno con perdita annua sotto ciascuna soglia
+    anni_rallentamento: np.ndarray   # (N,) anno del maggior calo della perdita annua
+    perdite_prima: np.ndarray        # (N,) perdita annua (%) prima del rallentamento
+    perdite_dopo: np.ndarray         # (N,) perdita annua (%) dopo il rallentamento
+    anni_vendita: np.ndarray         # (N,) anno di vendita suggerito (vedi SOGLIE_VENDITA)
+    soglie_vendita: np.ndarray       # (N,) soglia che ha determinato l'anno di vendita, -1 se nessuna
+
+    def __len__(self):
+        return self.anni_soglie.shape[0]
+
+    def veicolo(self, i):
+        """
+        Analisi del veicolo i con None al posto degli anni non raggiunti
+        """
+        def anno(valore):
+            return None if valore < 0 else int(valore)
+
+        rallentamento = None
+        if self.anni_rallentamento[i] >= 0:
+            rallentamento = {
+                'anno': int(self.anni_rallentamento[i]),
+                'perdita_prima': float(self.perdite_prima[i]),
+                'perdita_dopo': float(self.perdite_dopo[i]),
+                'differenza': float(self.perdite_prima[i] - self.perdite_dopo[i]),
+            }
+        return {
+            'anni_soglie': {str(s): anno(a) for s, a in zip(self.soglie, self.anni_soglie[i])},
+            'rallentamento': rallentamento,
+            'anno_vendita': anno(self.anni_vendita[i]),
+            'soglia_vendita': anno(self.soglie_vendita[i]),
+        }
+
+
+def analizza_curve(proiezione, soglie=SOGLIE_PERDITA, soglie_vendita=SOGLIE_VENDITA):
+    """
+    Per tutte le curve in un solo passaggio: anno in cui la perdita annua scende
+    sotto ogni soglia, punto di maggior rallentamento della perdita e anno di
+    vendita suggerito (la prima soglia di soglie_vendita raggiunta)
+    """
+    perdite = proiezione.perdite_percentuali
+    n, orizzonte = perdite.shape
+    anni_futuri = proiezione.anni[1:]
+    soglie = tuple(soglie)
+
+    sotto = perdite[:, :, np.newaxis] < np.asarray(soglie, dtype=float)  # (N, H, S)
+    primo = np.argmax(sotto, axis=1)
+    anni_soglie = np.where(sotto.any(axis=1), anni_futuri[primo], -1)
+
+    anni_rallentamento = np.full(n, -1, dtype=np.int64)
+    perdite_prima = np.full(n, np.nan)
+    perdite_dopo = np.full(n, np.nan)
+    if orizzonte >= 2:
+        indice = np.argmax(perdite[:, :-1] - perdite[:, 1:], axis=1)
+        righe = np.arange(n)
+        # perdite_percentuali[i] è la perdita dell'anno anni[i + 1]: il calo si vede in anni[i + 2]
+        anni_rallentamento = proiezione.anni[indice + 2]
+        perdite_prima = perdite[righe, indice]
+        perdite_dopo = perdite[righe, indice + 1]
+
+    anni_vendita = np.full(n, -1, dtype=np.int64)
+    soglie_scelte = np.full(n, -1, dtype=np.int64)
+    for soglia in reversed(soglie_vendita):
+        if soglia not in soglie:
+            continue
+        anni = anni_soglie[:, soglie.index(soglia)]
+        raggiunta = anni >= 0
+        anni_vendita = np.where(raggiunta, anni, anni_vendita)
+        soglie_scelte = np.where(raggiunta, soglia, soglie_scelte)
+
+    return AnalisiCurve(
+        soglie=soglie,
+        anni_soglie=anni_soglie,
+        anni_rallentamento=anni_rallentamento,
+        perdite_prima=perdite_prima,
+        perdite_dopo=perdite_dopo,
+        anni_vendita=anni_vendita,
+        soglie_vendita=soglie_scelte,
+    )
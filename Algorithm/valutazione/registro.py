@@ -0,0 +1,154 @@
+"""
+Registro dei modelli di valutazione per segmento (marca / modello / allestimento).
+
+Ogni segmento ha il proprio dataset CSV e il proprio artefatto nella cartella
+dei segmenti:
+
+    <cartella>/<marca>/<modello>/<allestimento>.csv   dataset del segmento
+    <cartella>/<marca>/<modello>/<allestimento>.modello.json   artefatto
+
+Se l'allestimento (o il modello) non ha un dataset dedicato si risale al
+livello superiore (<cartella>/<marca>/<modello>.csv, poi <cartella>/<marca>.csv).
+I modelli vengono caricati (o addestrati) al primo uso e tenuti in una LRU
+limitata da un budget di memoria: quando il budget e' superato si scaricano i
+segmenti usati meno di recente.
+"""
+import dataclasses
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .artefatto import carica_o_addestra
+
+ESTENSIONE_DATASET = '.csv'
+ESTENSIONE_ARTEFATTO = '.modello.json'
+BUDGET_PREDEFINITO = 256 * 1024 * 1024
+
+
+def normalizza(nome):
+    """
+    Nome di marca/modello/allestimento in forma adatta a un percorso ("Serie 3" -> "serie-3")
+    """
+    return re.sub(r'[^a-z0-9]+', '-', str(nome).strip().lower()).strip('-')
+
+
+def dimensione_in_memoria(oggetto, _visti=None):
+    """
+    Stima dei byte occupati da un artefatto (array numpy e campi annidati)
+    """
+    if _visti is None:
+        _visti = set()
+    if id(oggetto) in _visti:
+        return 0
+    _visti.add(id(oggetto))
+    if isinstance(oggetto, np.ndarray):
+        return oggetto.nbytes
+    totale = sys.getsizeof(oggetto)
+    if dataclasses.is_dataclass(oggetto):
+        valori = [getattr(oggetto, f.name) for f in dataclasses.fields(oggetto)]
+    elif isinstance(oggetto, dict):
+        valori = list(oggetto.keys()) + list(oggetto.values())
+    elif isinstance(oggetto, (list, tuple, set)):
+        valori = list(oggetto)
+    elif hasattr(oggetto, '__dict__'):
+        valori = list(vars(oggetto).values())
+    else:
+        valori = []
+    return totale + sum(dimensione_in_memoria(v, _visti) for v in valori)
+
+
+class RegistroModelli:
+    def __init__(self, cartella, budget_byte=BUDGET_PREDEFINITO):
+        self.cartella = cartella
+        self.budget_byte = budget_byte
+        self._modelli = OrderedDict()  # chiave risolta -> (artefatto, byte)
+        self._byte = 0
+        self._lock = threading.Lock()
+        self._lock_caricamento = {}
+        self.hit = 0
+        self.caricamenti = 0
+        self.evizioni = 0
+
+    def _percorsi(self, chiave):
+        base = os.path.join(self.cartella, *chiave)
+        return base + ESTENSIONE_DATASET, base + ESTENSIONE_ARTEFATTO
+
+    def risolvi(self, marca, modello=None, allestimento=None):
+        """
+        Segmento più specifico che ha un dataset o un artefatto su disco
+        """
+        parti = [normalizza(p) for p in (marca, modello, allestimento) if p]
+        while parti:
+            chiave = tuple(parti)
+            if any(os.path.exists(p) for p in self._percorsi(chiave)):
+                return chiave
+            parti.pop()
+        segmento = ' '.join(str(p) for p in (marca, modello, allestimento) if p)
+        raise KeyError(f'Nessun modello disponibile per {segmento!r}')
+
+    def ottieni(self, marca, modello=None, allestimento=None):
+        """
+        Artefatto del segmento, caricato o addestrato al primo uso
+        """
+        chiave = self.risolvi(marca, modello, allestimento)
+        with self._lock:
+            voce = self._modelli.get(chiave)
+            if voce is not None:
+                self._modelli.move_to_end(chiave)
+                self.hit += 1
+                return voce[0]
+            lock_chiave = self._lock_caricamento.setdefault(chiave, threading.Lock())
+
+        # Un solo thread carica un dato segmento, gli altri attendono il risultato
+        with lock_chiave:
+            with self._lock:
+                voce = self._modelli.get(chiave)
+                if voce is not None:
+                    self._modelli.move_to_end(chiave)
+                    self.hit += 1
+                    return voce[0]
+            artefatto = carica_o_addestra(*self._percorsi(chiave))
+            if hasattr(artefatto, 'file_pipeline'):
+                # La pipeline scikit-learn viene caricata al primo uso: si carica ora per contarla nel budget
+                artefatto.pipeline
+            byte = dimensione_in_memoria(artefatto)
+            with self._lock:
+                self._modelli[chiave] = (artefatto, byte)
+                self._byte += byte
+                self.caricamenti += 1
+                self._libera_memoria()
+                self._lock_caricamento.pop(chiave, None)
+        return artefatto
+
+    def _libera_memoria(self):
+        # Scarica i segmenti usati meno di recente, tenendo sempre almeno l'ultimo caricato
+        while self._byte > self.budget_byte and len(self._modelli) > 1:
+            _, (_, byte) = self._modelli.popitem(last=False)
+            self._byte -= byte
+            self.evizioni += 1
+
+    def scarica(self, marca, modello=None, allestimento=None):
+        chiave = tuple(normalizza(p) for p in (marca, modello, allestimento) if p)
+        with self._lock:
+            voce = self._modelli.pop(chiave, None)
+            if voce is not None:
+                self._byte -= voce[1]
+
+    def segmenti_caricati(self):
+        with self._lock:
+            return ['/'.join(chiave) for chiave in self._modelli]
+
+    def statistiche(self):
+        with self._lock:
+            return {
+                'segmenti_caricati': len(self._modelli),
+                'byte_in_memoria': self._byte,
+                'budget_byte': self.budget_byte,
+                'hit': self.hit,
+                'caricamenti': self.caricamenti,
+                'evizioni': self.evizioni,
+            }
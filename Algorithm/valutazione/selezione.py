@@ -0,0 +1,151 @@
+"""
+Selezione del modello con validazione incrociata k-fold in parallelo.
+
+Ogni combinazione (insieme di feature, regressore) di modello.FEATURE_SET x
+modello.REGRESSORI applicabile alle colonne del dataset (vedi
+modello.applicabile) viene valutata su k fold; le coppie (candidato, fold) sono
+indipendenti e girano in un pool di processi. Il DataFrame viene passato una
+sola volta a ogni processo (initializer) e BLAS/OpenMP sono limitati a un
+thread per processo, così i worker non si contendono i core. Vince il
+candidato con l'R² medio più alto: viene riaddestrato su tutto il dataset e
+salvato come artefatto di servizio, con la superficie precalcolata.
+
+    python -m valutazione.selezione golf_gtd_dataset.csv modello_svalutazione.json --fold 5
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .metriche import cronometro
+from .modello import COLONNA_TARGET, FEATURE_SET, REGRESSORI, applicabile, righe_complete
+
+FOLD_PREDEFINITI = 5
+
+_df = None  # dataset del processo worker
+
+
+def _inizializza_worker(df):
+    global _df
+    _df = df
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+def _valuta_fold(feature, regressore, indici_train, indici_test):
+    from sklearn.metrics import mean_squared_error, r2_score
+
+    from .modello import crea_pipeline, matrice_feature
+
+    X = matrice_feature(_df, feature)
+    y = _df[COLONNA_TARGET].to_numpy(dtype=float)
+    if feature == 'numeriche':
+        X_train, X_test = X[indici_train], X[indici_test]
+    else:
+        X_train, X_test = X.iloc[indici_train], X.iloc[indici_test]
+
+    pipeline = crea_pipeline(feature, regressore)
+    inizio = time.perf_counter()
+    pipeline.fit(X_train, y[indici_train])
+    durata = time.perf_counter() - inizio
+    y_pred = pipeline.predict(X_test)
+    r2 = r2_score(y[indici_test], y_pred)
+    rmse = np.sqrt(mean_squared_error(y[indici_test], y_pred))
+    return float(r2), float(rmse), durata
+
+
+def candidati(df):
+    """
+    Combinazioni feature x regressore applicabili alle colonne del dataset
+    """
+    return [{'feature': f, 'regressore': r}
+            for f, r in itertools.product(FEATURE_SET, REGRESSORI)
+            if applicabile(f, r, df.columns)]
+
+
+def valida(df, k=FOLD_PREDEFINITI, n_jobs=None, random_state=42):
+    """
+    R² e RMSE (media e deviazione standard sui fold) di ogni candidato,
+    ordinati dal migliore
+    """
+    from sklearn.model_selection import KFold
+
+    df = righe_complete(df)
+    elenco = candidati(df)
+    fold = list(KFold(n_splits=k, shuffle=True, random_state=random_state).split(np.arange(len(df))))
+    lavori = [(c, train, test) for c in elenco for train, test in fold]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        _inizializza_worker(df)
+        esiti = [_valuta_fold(c['feature'], c['regressore'], tr, te) for c, tr, te in lavori]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(lavori)),
+                                 initializer=_inizializza_worker, initargs=(df,)) as pool:
+            futuri = [pool.submit(_valuta_fold, c['feature'], c['regressore'], tr, te) for c, tr, te in lavori]
+            esiti = [f.result() for f in futuri]
+
+    risultati = []
+    for i, candidato in enumerate(elenco):
+        r2, rmse, durate = np.array(esiti[i * k:(i + 1) * k]).T
+        risultati.append({
+            **candidato,
+            'r2_medio': float(r2.mean()),
+            'r2_std': float(r2.std()),
+            'rmse_medio': float(rmse.mean()),
+            'rmse_std': float(rmse.std()),
+            'addestramento_medio_s': float(durate.mean()),
+        })
+    risultati.sort(key=lambda r: r['r2_medio'], reverse=True)
+    return risultati
+
+
+def seleziona_e_salva(percorso_dataset, percorso_artefatto, k=FOLD_PREDEFINITI, n_jobs=None, griglia=None):
+    """
+    Valida tutti i candidati, riaddestra il migliore su tutto il dataset e lo
+    salva come artefatto di servizio. Restituisce l'artefatto e la classifica.
+    """
+    from .artefatto import _con_superficie, da_risultato, impronta_dataset, info_sorgente, salva
+    from .dati import load_dataset
+    from .modello import train
+
+    impronta = impronta_dataset(percorso_dataset)
+    with cronometro('caricamento_dataset'):
+        df = load_dataset(percorso_dataset)
+    with cronometro('selezione_modello'):
+        classifica = valida(df, k, n_jobs)
+    migliore = {'feature': classifica[0]['feature'], 'regressore': classifica[0]['regressore']}
+    with cronometro('addestramento_modello'):
+        risultato = train(df, **migliore)
+    artefatto = da_risultato(risultato, migliore, impronta, percorso_artefatto, df,
+                             metriche={'selezione': {'fold': k, 'candidati': classifica}},
+                             sorgente=info_sorgente(percorso_dataset))
+    _con_superficie(artefatto, griglia)
+    salva(artefatto, percorso_artefatto)
+    return artefatto, classifica
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dataset', help='CSV delle inserzioni')
+    parser.add_argument('artefatto', help="dove salvare l'artefatto del modello vincente")
+    parser.add_argument('--fold', type=int, default=FOLD_PREDEFINITI, help='numero di fold')
+    parser.add_argument('--processi', type=int, help='processi paralleli (predefinito: numero di CPU)')
+    args = parser.parse_args()
+
+    artefatto, classifica = seleziona_e_salva(args.dataset, args.artefatto, args.fold, args.processi)
+    for r in classifica:
+        print(f"{r['feature']:<16} {r['regressore']:<18} R² {r['r2_medio']:.4f} ± {r['r2_std']:.4f}  "
+              f"RMSE {r['rmse_medio']:.3f} ± {r['rmse_std']:.3f}")
+    print(f"Modello salvato in {args.artefatto}: {artefatto.candidato['feature']} + "
+          f"{artefatto.candidato['regressore']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Bande di incertezza Monte Carlo sul valore futuro.
+
+La curva di proiezione.py usa parametri fissi (tasso base iniziale, fattore di
+decrescita, coefficiente km) e km annui costanti. Qui i parametri e i km annui
+vengono campionati da distribuzioni configurabili e ogni veicolo viene
+proiettato su P percorsi con operazioni NumPy vettoriali, un anno alla volta:
+il prodotto cumulativo dei P percorsi avanza di un anno e se ne ricavano i
+percentili, così la memoria resta O(P) e la matrice H x P non esiste mai.
+I campioni dei parametri sono condivisi tra i veicoli di una stessa chiamata,
+così le bande di veicoli diversi sono confrontabili.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .metriche import cronometro
+from .proiezione import (ANNO_CORRENTE, COEFFICIENTE_KM, FATTORE_DECRESCITA, KM_RIFERIMENTO,
+                         TASSO_BASE_INIZIALE)
+
+PERCORSI_PREDEFINITI = 100_000
+PERCENTILI_PREDEFINITI = (10, 50, 90)
+
+
+@dataclass(frozen=True)
+class Distribuzione:
+    """
+    'normale' (a = media, b = deviazione standard), 'uniforme' (a = minimo,
+    b = massimo) o 'costante' (a); i campioni vengono troncati a [minimo, massimo]
+    """
+    tipo: str
+    a: float
+    b: float = 0.0
+    minimo: float = -np.inf
+    massimo: float = np.inf
+
+    def campiona(self, rng, n):
+        if self.tipo == 'normale':
+            campioni = rng.normal(self.a, self.b, n)
+        elif self.tipo == 'uniforme':
+            campioni = rng.uniform(self.a, self.b, n)
+        elif self.tipo == 'costante':
+            campioni = np.full(n, float(self.a))
+        else:
+            raise ValueError(f'Distribuzione sconosciuta: {self.tipo!r}')
+        return np.clip(campioni, self.minimo, self.massimo)
+
+
+def distribuzioni_predefinite():
+    """
+    Centrate sui parametri deterministici di proiezione.py; i km annui sono un
+    fattore moltiplicativo dei km annui dichiarati per ogni veicolo
+    """
+    return {
+        'tasso_base_iniziale': Distribuzione('normale', TASSO_BASE_INIZIALE, 0.015, 0.0, 0.5),
+        'fattore_decrescita': Distribuzione('normale', FATTORE_DECRESCITA, 0.04, 0.0, 1.0),
+        'coefficiente_km': Distribuzione('normale', COEFFICIENTE_KM, 0.04, 0.0, 1.0),
+        'fattore_km_annui': Distribuzione('normale', 1.0, 0.25, 0.0, 3.0),
+    }
+
+
+@dataclass
+class BandeProiezione:
+    anni: np.ndarray          # (H+1,)
+    percentili: tuple         # es. (10, 50, 90)
+    valori: np.ndarray        # (N, percentili, H+1) in euro
+    svalutazioni: np.ndarray  # (N, percentili, H+1) rispetto al prezzo di listino, in %
+    percorsi: int = 0
+    distribuzioni: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return self.valori.shape[0]
+
+    def veicolo(self, i):
+        """
+        Bande del veicolo i: {'anni': [...], 'valori': {'p10': [...], ...}, 'svalutazioni': {...}}
+        """
+        return {
+            'anni': self.anni.tolist(),
+            'valori': {f'p{p}': self.valori[i, j].tolist() for j, p in enumerate(self.percentili)},
+            'svalutazioni': {f'p{p}': self.svalutazioni[i, j].tolist() for j, p in enumerate(self.percentili)},
+        }
+
+
+def simula(svalutazioni_iniziali, prezzi_listino, km_annui, anni_previsione, percorsi=PERCORSI_PREDEFINITI,
+           percentili=PERCENTILI_PREDEFINITI, distribuzioni=None, seme=0, anno_attuale=ANNO_CORRENTE):
+    """
+    Percentili del valore e della svalutazione per anno di N veicoli,
+    partendo dalla svalutazione attuale (%) stimata dal modello
+    """
+    with cronometro('simulazione'):
+        return _simula(svalutazioni_iniziali, prezzi_listino, km_annui, anni_previsione, percorsi,
+                       percentili, distribuzioni, seme, anno_attuale)
+
+
+def _simula(svalutazioni_iniziali, prezzi_listino, km_annui, anni_previsione, percorsi, percentili,
+            distribuzioni, seme, anno_attuale):
+    svalutazioni_iniziali = np.atleast_1d(np.asarray(svalutazioni_iniziali, dtype=float))
+    n = svalutazioni_iniziali.shape[0]
+    prezzi_listino = np.broadcast_to(np.asarray(prezzi_listino, dtype=float), (n,))
+    km_annui = np.broadcast_to(np.asarray(km_annui, dtype=float), (n,))
+    distribuzioni = {**distribuzioni_predefinite(), **(distribuzioni or {})}
+    percentili = tuple(percentili)
+
+    rng = np.random.default_rng(seme)
+    tasso_iniziale = distribuzioni['tasso_base_iniziale'].campiona(rng, percorsi)
+    decrescita = distribuzioni['fattore_decrescita'].campiona(rng, percorsi)
+    coefficiente_km = distribuzioni['coefficiente_km'].campiona(rng, percorsi)
+    fattore_km = distribuzioni['fattore_km_annui'].campiona(rng, percorsi)
+
+    effetto_km_unitario = fattore_km * coefficiente_km / KM_RIFERIMENTO
+
+    valori = np.empty((n, len(percentili), anni_previsione + 1))
+    # Vettori di P elementi riusati per tutti i veicoli e tutti gli anni
+    fattori = np.empty(percorsi)
+    effetto_km = np.empty(percorsi)
+    prodotti = np.empty(percorsi)
+    valori_percorsi = np.empty(percorsi)
+    for i in range(n):
+        np.multiply(effetto_km_unitario, km_annui[i], out=effetto_km)
+        prodotti.fill(1.0)
+        valore_iniziale = prezzi_listino[i] * (1 - svalutazioni_iniziali[i] / 100)
+        valori[i, :, 0] = valore_iniziale
+        for anno in range(1, anni_previsione + 1):
+            # Tasso dell'anno per ogni percorso, poi un passo del prodotto cumulativo
+            np.power(decrescita, anno, out=fattori)
+            np.multiply(fattori, tasso_iniziale, out=fattori)
+            np.add(fattori, effetto_km, out=fattori)
+            np.clip(fattori, 0.0, 1.0, out=fattori)
+            np.subtract(1.0, fattori, out=fattori)
+            np.multiply(prodotti, fattori, out=prodotti)
+            # Percentili dei valori, non dei prodotti scalati: con una svalutazione oltre il 100%
+            # il valore iniziale è negativo e scalare invertirebbe l'ordine dei percentili
+            np.multiply(prodotti, valore_iniziale, out=valori_percorsi)
+            valori[i, :, anno] = np.percentile(valori_percorsi, percentili)
+
+    svalutazioni = (1 - valori / prezzi_listino[:, np.newaxis, np.newaxis]) * 100
+    return BandeProiezione(
+        anni=anno_attuale + np.arange(anni_previsione + 1),
+        percentili=percentili,
+        valori=valori,
+        svalutazioni=svalutazioni,
+        percorsi=percorsi,
+        distribuzioni=distribuzioni,
+    )
@@ -0,0 +1,110 @@
+"""
+Superficie precalcolata della svalutazione su una griglia Anno x Chilometri.
+
+E' la stessa griglia del grafico 3D, ma densa e salvata con l'artefatto: le
+previsioni si ottengono con un'interpolazione bilineare in O(1) per veicolo,
+senza chiamare il modello esatto.
+
+Limiti di errore. Per una funzione f due volte derivabile l'errore
+dell'interpolazione bilineare in una cella di lati hx, hy e' al massimo
+hx^2/8 * max|f_xx| + hy^2/8 * max|f_yy|. Il modello lineare ha
+f_xx = f_yy = 0, quindi la superficie e' esatta a meno degli arrotondamenti.
+I modelli ad albero (gli unici per cui predict() usa la superficie) sono
+invece costanti a tratti: l'errore dipende dai salti tra i gradini e non ha un
+limite analitico. errore_massimo e' quindi una stima empirica, misurata alla
+costruzione nei punti medi delle celle, e non un limite garantito; predict()
+usa il modello esatto quando supera TOLLERANZA_ERRORE. Fuori dalla griglia si
+usa sempre il modello esatto.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from .proiezione import ANNO_CORRENTE
+
+ANNI_PREDEFINITI = (1990, ANNO_CORRENTE + 1, ANNO_CORRENTE + 2 - 1990)  # un nodo per anno
+KM_PREDEFINITI = (0, 500_000, 501)                                       # un nodo ogni 1000 km
+# Errore stimato (punti percentuali) oltre il quale predict() non usa la superficie
+TOLLERANZA_ERRORE = 0.5
+
+
+@dataclass
+class SuperficieSvalutazione:
+    anni: tuple        # (minimo, massimo, nodi)
+    chilometri: tuple  # (minimo, massimo, nodi)
+    valori: np.ndarray  # (nodi anni, nodi km)
+    errore_massimo: float = 0.0  # stima empirica sui punti medi delle celle, non un limite
+
+    def affidabile(self, tolleranza=TOLLERANZA_ERRORE):
+        return self.errore_massimo <= tolleranza
+
+    def contiene(self, anni, chilometri):
+        return ((anni >= self.anni[0]) & (anni <= self.anni[1])
+                & (chilometri >= self.chilometri[0]) & (chilometri <= self.chilometri[1]))
+
+    def interpola(self, anni, chilometri):
+        """
+        Interpolazione bilineare vettoriale; i punti devono stare nella griglia
+        """
+        i, tx = _indici(anni, *self.anni)
+        j, ty = _indici(chilometri, *self.chilometri)
+        v = self.valori
+        return ((1 - tx) * ((1 - ty) * v[i, j] + ty * v[i, j + 1])
+                + tx * ((1 - ty) * v[i + 1, j] + ty * v[i + 1, j + 1]))
+
+    def prevedi(self, modello, anni, chilometri):
+        """
+        Interpola dentro la griglia e usa il modello esatto solo per i punti fuori
+        """
+        anni = np.asarray(anni, dtype=float)
+        chilometri = np.asarray(chilometri, dtype=float)
+        dentro = self.contiene(anni, chilometri)
+        if dentro.all():
+            return self.interpola(anni, chilometri)
+        risultato = np.empty(anni.shape)
+        risultato[dentro] = self.interpola(anni[dentro], chilometri[dentro])
+        fuori = ~dentro
+        risultato[fuori] = modello.predict(np.column_stack([anni[fuori], chilometri[fuori]]))
+        return risultato
+
+    def to_dict(self):
+        return {
+            'anni': list(self.anni),
+            'chilometri': list(self.chilometri),
+            'valori': self.valori.tolist(),
+            'errore_massimo': self.errore_massimo,
+        }
+
+    @classmethod
+    def from_dict(cls, dati):
+        return cls(
+            anni=tuple(dati['anni']),
+            chilometri=tuple(dati['chilometri']),
+            valori=np.asarray(dati['valori'], dtype=float),
+            errore_massimo=float(dati['errore_massimo']),
+        )
+
+
+def _indici(x, minimo, massimo, nodi):
+    passo = (massimo - minimo) / (nodi - 1)
+    posizione = (x - minimo) / passo
+    indice = np.clip(np.floor(posizione).astype(np.intp), 0, nodi - 2)
+    return indice, posizione - indice
+
+
+def costruisci(modello, anni=ANNI_PREDEFINITI, chilometri=KM_PREDEFINITI):
+    """
+    Valuta il modello esatto sui nodi della griglia e stima l'errore sui punti medi
+    """
+    assi_anni = np.linspace(*anni)
+    assi_km = np.linspace(*chilometri)
+    X_grid, Y_grid = np.meshgrid(assi_anni, assi_km, indexing='ij')
+    valori = modello.predict(np.column_stack([X_grid.ravel(), Y_grid.ravel()])).reshape(X_grid.shape)
+    superficie = SuperficieSvalutazione(tuple(anni), tuple(chilometri), valori)
+
+    medi_anni = (assi_anni[:-1] + assi_anni[1:]) / 2
+    medi_km = (assi_km[:-1] + assi_km[1:]) / 2
+    MX, MY = np.meshgrid(medi_anni, medi_km, indexing='ij')
+    esatti = modello.predict(np.column_stack([MX.ravel(), MY.ravel()]))
+    superficie.errore_massimo = float(np.max(np.abs(superficie.interpola(MX.ravel(), MY.ravel()) - esatti)))
+    return superficie
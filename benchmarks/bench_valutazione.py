@@ -0,0 +1,269 @@
+"""
+Benchmark riproducibili della valutazione e dell'API.
+
+Genera dataset sintetici con lo schema di car_value.py (Anno, Chilometri,
+Prezzo di Listino, Prezzo, Condizioni) e misura caricamento CSV e colonnare,
+preprocessing, addestramento, prevedi_svalutazione singola e batch, proiezione
+nel tempo su piu' orizzonti e il throughput di restApi/main.py chiamata
+in-process tramite un client ASGI. I risultati vengono salvati in JSON insieme
+al commit git, cosi' si possono confrontare tra commit diversi:
+
+    python benchmarks/bench_valutazione.py --righe 1000 100000 10000000
+    python benchmarks/bench_valutazione.py --confronta prima.json dopo.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+RADICE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RADICE / "Algorithm"))
+
+from valutazione import dati, modello  # noqa: E402
+from valutazione.artefatto import carica_o_addestra  # noqa: E402
+
+RIGHE_PREDEFINITE = [1_000, 100_000, 10_000_000]
+ORIZZONTI = [1, 5, 10, 20]
+# La proiezione della flotta tiene in memoria (righe x orizzonte) valori per piu' array:
+# si misura a blocchi, cosi' 10M righe a h=20 non richiedono decine di GB
+BLOCCO_FLOTTA = 100_000
+CONDIZIONI = np.array(['Ottime', 'Buone', 'Discrete', 'Da revisionare'])
+
+
+def genera_dataset(righe, seed=42):
+    """
+    Inserzioni sintetiche con svalutazione crescente con età e chilometri
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    anno = rng.integers(2010, modello.ANNO_CORRENTE + 1, righe)
+    chilometri = rng.integers(0, 250_000, righe)
+    listino = rng.normal(42_000, 3_000, righe).round()
+    condizioni = CONDIZIONI[rng.integers(0, len(CONDIZIONI), righe)]
+    svalutazione = np.clip(5 + 3.5 * (modello.ANNO_CORRENTE - anno) + chilometri / 8_000
+                           + rng.normal(0, 3, righe), 0, 95)
+    prezzo = (listino * (1 - svalutazione / 100)).round()
+    return pd.DataFrame({
+        'Anno': anno,
+        'Chilometri': chilometri,
+        'Prezzo di Listino': listino,
+        'Prezzo': prezzo,
+        'Condizioni': condizioni,
+    })
+
+
+def cronometra(funzione, ripetizioni=5):
+    """
+    Tempi in secondi di più esecuzioni: minimo e mediana
+    """
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione()
+        tempi.append(time.perf_counter() - inizio)
+    return {'min_s': min(tempi), 'mediana_s': statistics.median(tempi), 'ripetizioni': ripetizioni}
+
+
+def ripetizioni_per(righe):
+    return 5 if righe <= 100_000 else 1
+
+
+def proietta_a_blocchi(artefatto, anni, chilometri, listini, km_annui, anni_previsione,
+                       blocco=BLOCCO_FLOTTA):
+    for inizio in range(0, len(anni), blocco):
+        fine = inizio + blocco
+        modello.prevedi_flotta(artefatto, anni[inizio:fine], chilometri[inizio:fine], listini[inizio:fine],
+                               km_annui, anni_previsione)
+
+
+def bench_libreria(percorso_csv, righe):
+    r = ripetizioni_per(righe)
+    risultati = {}
+
+    risultati['caricamento_csv'] = cronometra(lambda: dati.load_dataset(percorso_csv), r)
+    dati.load_dataset(percorso_csv, colonnare=True)  # prima conversione, esclusa dal tempo
+    risultati['caricamento_colonnare'] = cronometra(
+        lambda: dati.load_dataset(percorso_csv, colonne=['Anno', 'Chilometri', 'Prezzo di Listino', 'Prezzo'],
+                                  colonnare=True), r)
+
+    df = dati.load_dataset(percorso_csv)
+    risultati['preprocessing'] = cronometra(lambda: dati.aggiungi_svalutazione(df.copy()), r)
+    risultati['statistiche'] = cronometra(lambda: dati.statistiche(df), r)
+    risultati['addestramento'] = cronometra(lambda: modello.train(df), r)
+
+    pipeline = modello.train(df).pipeline
+    artefatto = carica_o_addestra(percorso_csv, percorso_csv + '.modello.json')
+    anni = df['Anno'].to_numpy()
+    chilometri = df['Chilometri'].to_numpy()
+
+    # Singola: 1000 chiamate una alla volta; batch: tutte le righe in un passaggio
+    campione = min(1_000, righe)
+    for nome, m in (('pipeline', pipeline), ('artefatto', artefatto)):
+        singola = cronometra(lambda: [modello.prevedi_svalutazione(m, anni[i], chilometri[i])
+                                      for i in range(campione)], 3)
+        singola['per_chiamata_s'] = singola['mediana_s'] / campione
+        risultati[f'prevedi_singola_{nome}'] = singola
+        batch = cronometra(lambda: modello.predict(m, anni, chilometri), r)
+        batch['per_veicolo_s'] = batch['mediana_s'] / righe
+        risultati[f'prevedi_batch_{nome}'] = batch
+
+    listini = df['Prezzo di Listino'].to_numpy()
+    for h in ORIZZONTI:
+        risultati[f'nel_tempo_singola_h{h}'] = cronometra(
+            lambda: modello.prevedi_svalutazione_nel_tempo(artefatto, 2020, 50_000, 42_000, h, 15_000), 20)
+        risultati[f'nel_tempo_flotta_h{h}'] = cronometra(
+            lambda: proietta_a_blocchi(artefatto, anni, chilometri, listini, 15_000, h), r)
+    return risultati
+
+
+def percentile(valori, p):
+    return float(np.percentile(np.asarray(valori), p))
+
+
+async def _misura_endpoint(client, metodo, url, corpi, concorrenza):
+    latenze = []
+
+    async def chiama(corpo):
+        inizio = time.perf_counter()
+        risposta = await client.request(metodo, url, json=corpo)
+        latenze.append(time.perf_counter() - inizio)
+        risposta.raise_for_status()
+
+    inizio = time.perf_counter()
+    for i in range(0, len(corpi), concorrenza):
+        await asyncio.gather(*(chiama(c) for c in corpi[i:i + concorrenza]))
+    durata = time.perf_counter() - inizio
+    return {
+        'richieste': len(corpi),
+        'concorrenza': concorrenza,
+        'richieste_al_secondo': len(corpi) / durata,
+        'p50_ms': percentile(latenze, 50) * 1000,
+        'p99_ms': percentile(latenze, 99) * 1000,
+    }
+
+
+async def _bench_api(richieste, concorrenza, dimensione_batch):
+    import httpx
+
+    sys.path.insert(0, str(RADICE / "restApi"))
+    import main
+
+    rng = np.random.default_rng(0)
+    singole = [{'Anno': int(a), 'Chilometri': int(k)}
+               for a, k in zip(rng.integers(2010, 2026, richieste), rng.integers(0, 150, richieste) * 1000)]
+    batch = {'veicoli': [{'Anno': int(a), 'Chilometri': int(k)}
+                         for a, k in zip(rng.integers(2010, 2026, dimensione_batch),
+                                         rng.integers(0, 250_000, dimensione_batch))]}
+
+    async with main.lifespan(main.app):
+        trasporto = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=trasporto, base_url='http://bench') as client:
+            return {
+                'predict': await _misura_endpoint(client, 'POST', '/predict', singole, concorrenza),
+                f'predict_batch_{dimensione_batch}': await _misura_endpoint(
+                    client, 'POST', '/predict/batch', [batch] * 20, 1),
+            }
+
+
+def bench_api(percorso_csv, richieste=2_000, concorrenza=32, dimensione_batch=5_000):
+    # main.py legge i percorsi dalle variabili d'ambiente all'import
+    os.environ['COMPARAUTO_DATASET'] = percorso_csv
+    os.environ['COMPARAUTO_ARTEFATTO'] = percorso_csv + '.modello.json'
+    return asyncio.run(_bench_api(richieste, concorrenza, dimensione_batch))
+
+
+def commit_corrente():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RADICE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def esegui(righe, cartella, api=True):
+    risultati = {
+        'commit': commit_corrente(),
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'piattaforma': platform.platform(),
+        'cpu': os.cpu_count(),
+        'dataset': {},
+    }
+    for n in righe:
+        percorso = os.path.join(cartella, f'inserzioni_{n}.csv')
+        inizio = time.perf_counter()
+        genera_dataset(n).to_csv(percorso, index=False)
+        print(f'[{n} righe] dataset generato in {time.perf_counter() - inizio:.1f}s', file=sys.stderr)
+        risultati['dataset'][str(n)] = bench_libreria(percorso, n)
+    if api and righe:
+        # L'API si misura sul dataset più piccolo: conta il costo per richiesta, non l'addestramento
+        percorso = os.path.join(cartella, f'inserzioni_{min(righe)}.csv')
+        risultati['api'] = bench_api(percorso)
+    return risultati
+
+
+def _appiattisci(d, prefisso=''):
+    for k, v in d.items():
+        if isinstance(v, dict):
+            yield from _appiattisci(v, f'{prefisso}{k}.')
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield f'{prefisso}{k}', v
+
+
+def confronta(prima, dopo):
+    """
+    Rapporto dopo/prima per ogni tempo e throughput presente in entrambi i file
+    """
+    with open(prima) as f:
+        a = dict(_appiattisci(json.load(f)))
+    with open(dopo) as f:
+        b = dict(_appiattisci(json.load(f)))
+    for chiave in sorted(a.keys() & b.keys()):
+        if not chiave.endswith(('mediana_s', 'richieste_al_secondo', 'p50_ms', 'p99_ms')) or not a[chiave]:
+            continue
+        rapporto = b[chiave] / a[chiave]
+        print(f'{chiave:<70} {a[chiave]:>12.6g} {b[chiave]:>12.6g} {rapporto:>8.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--righe', type=int, nargs='+', default=RIGHE_PREDEFINITE,
+                        help='dimensioni dei dataset sintetici')
+    parser.add_argument('--output', help='file JSON dei risultati (predefinito: '
+                                         'benchmarks/risultati/<commit>.json, ignorata da git)')
+    parser.add_argument('--cartella-dati', help='dove scrivere i CSV sintetici (predefinito: cartella temporanea)')
+    parser.add_argument('--senza-api', action='store_true', help="non misurare l'API")
+    parser.add_argument('--confronta', nargs=2, metavar=('PRIMA', 'DOPO'), help='confronta due file di risultati')
+    args = parser.parse_args()
+
+    if args.confronta:
+        confronta(*args.confronta)
+        return
+
+    if args.cartella_dati:
+        os.makedirs(args.cartella_dati, exist_ok=True)
+        risultati = esegui(args.righe, args.cartella_dati, api=not args.senza_api)
+    else:
+        with tempfile.TemporaryDirectory() as cartella:
+            risultati = esegui(args.righe, cartella, api=not args.senza_api)
+
+    output = args.output or str(RADICE / 'benchmarks' / 'risultati' / f"{risultati['commit'] or 'locale'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(risultati, f, indent=2)
+    print(f'Risultati salvati in {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
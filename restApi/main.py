@@ -1,11 +1,348 @@
-from fastapi import FastAPI, File, UploadFile, Form
+from contextlib import asynccontextmanager
+from pathlib import Path
+import asyncio
+import logging
+import math
+import os
+import queue
+import tempfile
+import threading
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Literal
+import numpy as np
 import uvicorn
-import json
-# Importa il tuo modello ML
-# import your_ml_model 
 
-app = FastAPI()
+# Il pacchetto di valutazione vive in Algorithm/valutazione
+CARTELLA_ALGORITMO = Path(__file__).resolve().parent.parent / "Algorithm"
+sys.path.insert(0, str(CARTELLA_ALGORITMO))
+
+from valutazione.artefatto import carica_o_addestra, salva
+from valutazione.cache import CachePrevisioni
+from valutazione.comparabili import carica_o_costruisci as carica_comparabili, percorso_predefinito
+from valutazione.condivisione import FILE_CORRENTE, ModelloCondiviso, pubblica
+from valutazione.flusso import ATTESA_CODA, DIMENSIONE_BLOCCO, TIPI_ARROW, TIPO_NDJSON, CodaByte, valuta_flusso
+from valutazione.immagini import FORMATI, ServizioGrafici
+from valutazione.incrementale import assorbi
+from valutazione.metriche import REGISTRO, STADI, cronometro
+from valutazione.registro import RegistroModelli
+from valutazione.modello import ANNO_CORRENTE, predict as predici_svalutazioni
+from valutazione.proiezione import MAX_ANNI_PREVISIONE, MAX_CHILOMETRI, analizza_curve, proietta
+from valutazione.simulazione import PERCORSI_PREDEFINITI, Distribuzione, simula
+
+logger = logging.getLogger("comparauto")
+
+# Percorsi configurabili tramite variabili d'ambiente
+PERCORSO_DATASET = os.environ.get("COMPARAUTO_DATASET", str(CARTELLA_ALGORITMO / "golf_gtd_dataset.csv"))
+PERCORSO_ARTEFATTO = os.environ.get("COMPARAUTO_ARTEFATTO", str(CARTELLA_ALGORITMO / "modello_svalutazione.json"))
+
+# Modalità produzione (più worker): cartella dell'artefatto pubblicato e intervallo di controllo dell'hot-swap
+CARTELLA_CONDIVISA = os.environ.get("COMPARAUTO_CARTELLA_CONDIVISA")
+INTERVALLO_RICARICA = float(os.environ.get("COMPARAUTO_INTERVALLO_RICARICA", "1"))
+
+# Cache LRU delle previsioni singole (COMPARAUTO_CACHE_PASSO_KM=0 disattiva l'arrotondamento dei km)
+DIMENSIONE_CACHE = int(os.environ.get("COMPARAUTO_CACHE_DIMENSIONE", "4096"))
+PASSO_KM_CACHE = int(os.environ.get("COMPARAUTO_CACHE_PASSO_KM", "0"))
+
+# Modelli per marca/modello/allestimento (facoltativi): cartella dei segmenti e budget di memoria
+CARTELLA_SEGMENTI = os.environ.get("COMPARAUTO_CARTELLA_SEGMENTI")
+BUDGET_MODELLI_MB = int(os.environ.get("COMPARAUTO_BUDGET_MODELLI_MB", "256"))
+
+# Grafici renderizzati in PNG/SVG da un pool di processi e salvati su disco (fuori dai sorgenti)
+CARTELLA_GRAFICI = os.environ.get("COMPARAUTO_CARTELLA_GRAFICI",
+                                  os.path.join(tempfile.gettempdir(), "comparauto-grafici"))
+PROCESSI_GRAFICI = int(os.environ.get("COMPARAUTO_PROCESSI_GRAFICI", "2"))
+MAX_FILE_GRAFICI = int(os.environ.get("COMPARAUTO_GRAFICI_MAX_FILE", "1000"))
+
+RICHIESTE = REGISTRO.istogramma(
+    "comparauto_richiesta_secondi", "Durata delle richieste HTTP in secondi", ("metodo", "percorso", "stato"))
+
+# Numero massimo di veicoli accettati da /predict/batch in una singola chiamata
+MAX_VEICOLI_BATCH = 100_000
+
+# Limiti di /compare: veicoli confrontati e anni di proiezione
+MAX_VEICOLI_CONFRONTO = 50
+
+# Numero massimo di inserzioni restituite da /comparabili
+MAX_COMPARABILI = 50
+
+# Limiti di /simulate: veicoli e percorsi Monte Carlo per veicolo, più un budget complessivo
+# su veicoli x percorsi x anni (il lavoro della simulazione cresce con il prodotto)
+MAX_VEICOLI_SIMULAZIONE = 20
+MAX_PERCORSI = 1_000_000
+BUDGET_SIMULAZIONE = 20_000_000
+
+# Aggregazione delle /predict concorrenti: attesa massima (ms) e dimensione massima del lotto
+ATTESA_LOTTO_MS = float(os.environ.get("COMPARAUTO_LOTTO_ATTESA_MS", "2"))
+DIMENSIONE_LOTTO = int(os.environ.get("COMPARAUTO_LOTTO_DIMENSIONE", "256"))
+
+LOTTI = REGISTRO.istogramma(
+    "comparauto_lotto_previsioni", "Numero di /predict servite da una singola previsione vettoriale",
+    bucket=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+
+
+class Veicolo(BaseModel):
+    # inf/NaN passerebbero ge/gt e arriverebbero al modello (svalutazioni nulle, errori SVD in /ingest)
+    model_config = ConfigDict(populate_by_name=True, allow_inf_nan=False)
+
+    anno: int = Field(alias="Anno", ge=1950, le=ANNO_CORRENTE + 1)
+    chilometri: float = Field(alias="Chilometri", ge=0, le=MAX_CHILOMETRI)
+    prezzo_listino: float | None = Field(default=None, alias="Prezzo di Listino", gt=0)
+    marca: str | None = Field(default=None, alias="Marca")
+    modello: str | None = Field(default=None, alias="Modello")
+    allestimento: str | None = Field(default=None, alias="Allestimento")
+    condizioni: str | None = Field(default=None, alias="Condizioni")
+    regione: str | None = Field(default=None, alias="Regione")
+
+    def segmento(self):
+        return (self.marca, self.modello, self.allestimento)
+
+    def categoriche(self):
+        # Colonne categoriche passate al modello, che usa solo quelle previste dal suo feature set
+        return {"Condizioni": self.condizioni, "Marca": self.marca, "Modello": self.modello,
+                "Allestimento": self.allestimento, "Regione": self.regione}
+
+
+class RichiestaBatch(BaseModel):
+    veicoli: list[Veicolo] = Field(min_length=1, max_length=MAX_VEICOLI_BATCH)
+
+
+class Inserzione(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, allow_inf_nan=False)
+
+    anno: int = Field(alias="Anno", ge=1950, le=ANNO_CORRENTE + 1)
+    chilometri: float = Field(alias="Chilometri", ge=0, le=MAX_CHILOMETRI)
+    prezzo_listino: float = Field(alias="Prezzo di Listino", gt=0)
+    prezzo: float = Field(alias="Prezzo", ge=0)
+    condizioni: str | None = Field(default=None, alias="Condizioni")
+
+
+class RichiestaIngestione(BaseModel):
+    inserzioni: list[Inserzione] = Field(min_length=1, max_length=MAX_VEICOLI_BATCH)
+
+
+class VeicoloConfronto(Veicolo):
+    prezzo_listino: float = Field(alias="Prezzo di Listino", gt=0)
+    km_annui: float = Field(default=15000, alias="Km annui", ge=0)
+
+
+class RichiestaConfronto(BaseModel):
+    veicoli: list[VeicoloConfronto] = Field(min_length=1, max_length=MAX_VEICOLI_CONFRONTO)
+    anni_previsione: int = Field(default=5, ge=1, le=MAX_ANNI_PREVISIONE)
+
+
+class Rallentamento(BaseModel):
+    anno: int
+    perdita_prima: float
+    perdita_dopo: float
+    differenza: float
+
+
+class CurvaConfronto(BaseModel):
+    chilometri: list[float]
+    svalutazioni: list[float]
+    valori: list[float]
+    perdite_euro: list[float]
+    perdite_percentuali: list[float]
+    anni_soglie: dict[str, int | None]
+    rallentamento: Rallentamento | None
+    anno_vendita: int | None
+    soglia_vendita: int | None
+
+
+class Confronto(BaseModel):
+    anni: list[int]
+    curve: list[CurvaConfronto]
+
+
+class RichiestaComparabili(Veicolo):
+    k: int = Field(default=5, ge=1, le=MAX_COMPARABILI)
+
+
+class Comparabile(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    anno: int = Field(alias="Anno")
+    chilometri: float = Field(alias="Chilometri")
+    prezzo_listino: float = Field(alias="Prezzo di Listino")
+    prezzo: float | None = Field(default=None, alias="Prezzo")
+    condizioni: str | None = Field(default=None, alias="Condizioni")
+    svalutazione_percentuale: float | None = Field(default=None, alias="Svalutazione_Percentuale")
+    distanza: float
+
+
+class DistribuzioneParametro(BaseModel):
+    model_config = ConfigDict(allow_inf_nan=False)
+
+    tipo: Literal["normale", "uniforme", "costante"]
+    a: float
+    b: float = 0.0
+    minimo: float | None = None
+    massimo: float | None = None
+
+    def distribuzione(self):
+        return Distribuzione(self.tipo, self.a, self.b,
+                             -np.inf if self.minimo is None else self.minimo,
+                             np.inf if self.massimo is None else self.massimo)
+
+
+class RichiestaSimulazione(BaseModel):
+    veicoli: list[VeicoloConfronto] = Field(min_length=1, max_length=MAX_VEICOLI_SIMULAZIONE)
+    anni_previsione: int = Field(default=5, ge=1, le=MAX_ANNI_PREVISIONE)
+    percorsi: int = Field(default=PERCORSI_PREDEFINITI, ge=100, le=MAX_PERCORSI)
+    # Sostituiscono le distribuzioni predefinite di tasso_base_iniziale, fattore_decrescita,
+    # coefficiente_km e fattore_km_annui
+    distribuzioni: dict[Literal["tasso_base_iniziale", "fattore_decrescita", "coefficiente_km", "fattore_km_annui"],
+                        DistribuzioneParametro] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def entro_il_budget(self):
+        lavoro = len(self.veicoli) * self.percorsi * self.anni_previsione
+        if lavoro > BUDGET_SIMULAZIONE:
+            raise ValueError(f"veicoli x percorsi x anni_previsione = {lavoro} supera il limite di "
+                             f"{BUDGET_SIMULAZIONE}: ridurre i percorsi o gli anni")
+        return self
+
+
+class BandeVeicolo(BaseModel):
+    valori: dict[str, list[float]]
+    svalutazioni: dict[str, list[float]]
+
+
+class Simulazione(BaseModel):
+    anni: list[int]
+    percorsi: int
+    bande: list[BandeVeicolo]
+
+
+class Previsione(BaseModel):
+    svalutazione_percentuale: float
+    valore_stimato: float | None = None
+
+
+class PrevisioneBatch(BaseModel):
+    svalutazioni_percentuali: list[float]
+    valori_stimati: list[float | None]
+
+
+class AggregatorePrevisioni:
+    """
+    Raccoglie le previsioni singole che arrivano insieme (per al massimo
+    attesa_ms millisecondi o dimensione_massima richieste) e le valuta con una
+    sola chiamata vettoriale al modello, eseguita nel threadpool per non
+    bloccare l'event loop. Le richieste per modelli diversi (segmenti) formano
+    lotti separati.
+    """
+
+    def __init__(self, attesa_ms=ATTESA_LOTTO_MS, dimensione_massima=DIMENSIONE_LOTTO):
+        self.attesa = attesa_ms / 1000
+        self.dimensione_massima = max(1, dimensione_massima)
+        self._in_attesa = {}  # id del modello -> (modello, [(anno, km, categoriche, future)], timer)
+        self._esecuzioni = set()
+
+    async def prevedi(self, modello, anno, chilometri, categoriche=None):
+        ciclo = asyncio.get_running_loop()
+        futuro = ciclo.create_future()
+        chiave = id(modello)
+        voce = self._in_attesa.get(chiave)
+        if voce is None:
+            timer = ciclo.call_later(self.attesa, self._svuota, chiave)
+            voce = self._in_attesa[chiave] = (modello, [], timer)
+        voce[1].append((anno, chilometri, categoriche or {}, futuro))
+        if len(voce[1]) >= self.dimensione_massima:
+            self._svuota(chiave)
+        return await futuro
+
+    def _svuota(self, chiave):
+        voce = self._in_attesa.pop(chiave, None)
+        if voce is None:
+            return
+        modello, richieste, timer = voce
+        timer.cancel()
+        esecuzione = asyncio.ensure_future(self._esegui(modello, richieste))
+        # Riferimento forte finché il lotto non è completato
+        self._esecuzioni.add(esecuzione)
+        esecuzione.add_done_callback(self._esecuzioni.discard)
+
+    async def _esegui(self, modello, richieste):
+        LOTTI.osserva(len(richieste))
+        anni = np.fromiter((r[0] for r in richieste), dtype=float, count=len(richieste))
+        chilometri = np.fromiter((r[1] for r in richieste), dtype=float, count=len(richieste))
+        colonne = {c for r in richieste for c in r[2]}
+        categoriche = {c: [r[2].get(c) for r in richieste] for c in sorted(colonne)}
+        try:
+            svalutazioni = await run_in_threadpool(predici_svalutazioni, modello, anni, chilometri,
+                                                   categoriche=categoriche)
+        except Exception as e:
+            for *_, futuro in richieste:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for (*_, futuro), svalutazione in zip(richieste, svalutazioni.tolist()):
+            # Il client può aver chiuso la connessione nel frattempo
+            if not futuro.done():
+                futuro.set_result(svalutazione)
+
+
+async def sorveglia_modello(condiviso):
+    # Hot-swap: le richieste in corso tengono il riferimento al modello precedente
+    while True:
+        await asyncio.sleep(INTERVALLO_RICARICA)
+        try:
+            if await run_in_threadpool(condiviso.aggiorna):
+                app.state.modello = condiviso.modello
+        except OSError:
+            # Versione rimossa o puntatore non leggibile: si riprova al prossimo giro
+            continue
+        except Exception:
+            # Qualunque altro errore non deve fermare l'hot-swap di questo worker
+            logger.exception("Ricarica del modello condiviso non riuscita")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.condiviso = None
+    sorveglianza = None
+    if CARTELLA_CONDIVISA:
+        # Worker di produzione: modello pubblicato dal processo principale, superficie memory-mapped
+        if not os.path.exists(os.path.join(CARTELLA_CONDIVISA, FILE_CORRENTE)):
+            pubblica(carica_o_addestra(PERCORSO_DATASET, PERCORSO_ARTEFATTO), CARTELLA_CONDIVISA)
+        app.state.condiviso = ModelloCondiviso(CARTELLA_CONDIVISA)
+        app.state.modello = app.state.condiviso.modello
+        sorveglianza = asyncio.create_task(sorveglia_modello(app.state.condiviso))
+    else:
+        # Carica il modello una sola volta all'avvio: viene riaddestrato solo se il dataset è cambiato
+        app.state.modello = carica_o_addestra(PERCORSO_DATASET, PERCORSO_ARTEFATTO)
+    app.state.lock_ingestione = asyncio.Lock()
+    app.state.cache = CachePrevisioni(DIMENSIONE_CACHE, PASSO_KM_CACHE)
+    app.state.aggregatore = AggregatorePrevisioni()
+    app.state.registro = None
+    if CARTELLA_SEGMENTI:
+        app.state.registro = RegistroModelli(CARTELLA_SEGMENTI, BUDGET_MODELLI_MB * 1024 * 1024)
+    dataset = PERCORSO_DATASET if os.path.exists(PERCORSO_DATASET) else None
+    # Indice delle inserzioni comparabili, salvato accanto all'artefatto e legato all'impronta del dataset
+    app.state.comparabili = None
+    if dataset is not None:
+        app.state.comparabili = carica_comparabili(
+            dataset, percorso_predefinito(PERCORSO_ARTEFATTO), app.state.modello.impronta)
+    app.state.grafici = ServizioGrafici(CARTELLA_GRAFICI, dataset, PROCESSI_GRAFICI, MAX_FILE_GRAFICI)
+    yield
+    if sorveglianza is not None:
+        sorveglianza.cancel()
+    app.state.grafici.chiudi()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configura CORS per permettere le richieste da Next.js
 app.add_middleware(
@@ -16,24 +353,380 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def misura_richieste(request: Request, call_next):
+    inizio = time.perf_counter()
+    request.state.inizio = inizio
+    risposta = await call_next(request)
+    fine = time.perf_counter()
+    # Dalla fine dell'handler alla risposta pronta: validazione dell'output e serializzazione JSON
+    fine_handler = getattr(request.state, "fine_handler", None)
+    if fine_handler is not None:
+        STADI.osserva(fine - fine_handler, stadio="serializzazione")
+    # Il template della route (non il percorso concreto) per non moltiplicare le serie
+    route = request.scope.get("route")
+    RICHIESTE.osserva(fine - inizio, metodo=request.method,
+                      percorso=route.path if route is not None else "non_trovato",
+                      stato=risposta.status_code)
+    return risposta
+
+def _serializzabile(valore):
+    if isinstance(valore, float) and not math.isfinite(valore):
+        return str(valore)
+    if isinstance(valore, dict):
+        return {k: _serializzabile(v) for k, v in valore.items()}
+    if isinstance(valore, (list, tuple)):
+        return [_serializzabile(v) for v in valore]
+    return valore
+
+@app.exception_handler(RequestValidationError)
+async def errore_validazione(request: Request, exc: RequestValidationError):
+    # Il 422 riporta l'input rifiutato: un inf/NaN (ammesso dal parser JSON) va reso come stringa,
+    # altrimenti la serializzazione della risposta fallisce con un 500
+    errori = [{**errore, "input": _serializzabile(errore.get("input"))} for errore in exc.errors()]
+    return await request_validation_exception_handler(request, RequestValidationError(errori, body=exc.body))
+
+def inizio_handler(request: Request):
+    # Lettura del body, parsing JSON e validazione pydantic avvengono prima dell'handler
+    STADI.osserva(time.perf_counter() - request.state.inizio, stadio="validazione_input")
+
+def fine_handler(request: Request):
+    request.state.fine_handler = time.perf_counter()
+
 @app.get("/")
 async def root():
     return {"message": "Machine Learning API is running"}
 
-@app.post("/predict")
-async def predict(params: dict):
-    # Estrai i parametri
-    # param1 = params.get("param1")
-    # param2 = params.get("param2")
-    
-    # Esegui la tua logica di ML
-    # result = your_ml_model.predict(param1, param2)
-    
-    # Per test, restituisci i parametri ricevuti
+async def modello_per_segmento(marca, modello, allestimento):
+    # Senza marca o senza registro si usa il modello principale (che può usare la marca come feature);
+    # il primo caricamento di un segmento avviene fuori dall'event loop
+    if not marca or app.state.registro is None:
+        return app.state.modello
+    try:
+        return await run_in_threadpool(app.state.registro.ottieni, marca, modello, allestimento)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+async def svaluta_per_segmento(veicoli, anni, chilometri):
+    # Un passaggio vettoriale per ogni segmento presente nella richiesta
+    gruppi = {}
+    for i, v in enumerate(veicoli):
+        gruppi.setdefault(v.segmento(), []).append(i)
+    svalutazioni = np.empty(len(veicoli))
+    for segmento, indici in gruppi.items():
+        modello = await modello_per_segmento(*segmento)
+        categoriche = {}
+        for i in indici:
+            for colonna, valore in veicoli[i].categoriche().items():
+                categoriche.setdefault(colonna, []).append(valore)
+        indici = np.asarray(indici)
+        svalutazioni[indici] = await run_in_threadpool(predici_svalutazioni, modello, anni[indici], chilometri[indici],
+                                                       categoriche=categoriche)
+    return svalutazioni
+
+@app.post("/predict", response_model=Previsione)
+async def predict(veicolo: Veicolo, request: Request):
+    inizio_handler(request)
+    modello = await modello_per_segmento(*veicolo.segmento())
+    # Sui miss la previsione viene accorpata con le altre /predict concorrenti
+    svalutazione = await app.state.cache.prevedi_svalutazione_async(
+        modello, veicolo.anno, veicolo.chilometri, app.state.aggregatore.prevedi, veicolo.categoriche())
+    valore = None
+    if veicolo.prezzo_listino is not None:
+        valore = veicolo.prezzo_listino * (1 - svalutazione / 100)
+    fine_handler(request)
+    return Previsione(svalutazione_percentuale=svalutazione, valore_stimato=valore)
+
+@app.post("/predict/batch", response_model=PrevisioneBatch)
+async def predict_batch(richiesta: RichiestaBatch, request: Request):
+    inizio_handler(request)
+    # Costruisce le colonne e valuta tutti i veicoli in un solo passaggio NumPy
+    veicoli = richiesta.veicoli
+    n = len(veicoli)
+    with cronometro("costruzione_feature"):
+        anni = np.fromiter((v.anno for v in veicoli), dtype=float, count=n)
+        chilometri = np.fromiter((v.chilometri for v in veicoli), dtype=float, count=n)
+        listini = np.fromiter((np.nan if v.prezzo_listino is None else v.prezzo_listino for v in veicoli), dtype=float, count=n)
+
+    svalutazioni = await svaluta_per_segmento(veicoli, anni, chilometri)
+    valori = listini * (1 - svalutazioni / 100)
+    with cronometro("costruzione_risposta"):
+        risposta = {
+            "svalutazioni_percentuali": svalutazioni.tolist(),
+            "valori_stimati": [None if np.isnan(v) else v for v in valori.tolist()],
+        }
+    fine_handler(request)
+    return risposta
+
+@app.post("/compare", response_model=Confronto)
+async def compare(richiesta: RichiestaConfronto, request: Request):
+    inizio_handler(request)
+    veicoli = richiesta.veicoli
+    n = len(veicoli)
+    with cronometro("costruzione_feature"):
+        anni = np.fromiter((v.anno for v in veicoli), dtype=float, count=n)
+        chilometri = np.fromiter((v.chilometri for v in veicoli), dtype=float, count=n)
+        listini = np.fromiter((v.prezzo_listino for v in veicoli), dtype=float, count=n)
+        km_annui = np.fromiter((v.km_annui for v in veicoli), dtype=float, count=n)
+
+    # Svalutazione attuale per segmento, poi un'unica proiezione e analisi di tutte le curve
+    svalutazioni = await svaluta_per_segmento(veicoli, anni, chilometri)
+
+    def proietta_e_analizza():
+        proiezione = proietta(svalutazioni, chilometri, listini, km_annui, richiesta.anni_previsione)
+        return proiezione, analizza_curve(proiezione)
+
+    proiezione, analisi = await run_in_threadpool(proietta_e_analizza)
+    with cronometro("costruzione_risposta"):
+        curve = []
+        for i in range(n):
+            curva = proiezione.veicolo(i)
+            del curva["anni"]
+            curve.append({**curva, **analisi.veicolo(i)})
+        risposta = {"anni": proiezione.anni.tolist(), "curve": curve}
+    fine_handler(request)
+    return risposta
+
+@app.post("/comparabili", response_model=list[Comparabile], response_model_by_alias=True)
+async def comparabili(richiesta: RichiestaComparabili):
+    # Le inserzioni del dataset più simili al veicolo richiesto, dalla più vicina
+    if app.state.comparabili is None:
+        raise HTTPException(status_code=404, detail="Dataset delle inserzioni non disponibile")
+    return app.state.comparabili.cerca(richiesta.anno, richiesta.chilometri, richiesta.prezzo_listino,
+                                       richiesta.condizioni, richiesta.k)
+
+@app.post("/simulate", response_model=Simulazione)
+async def simulate(richiesta: RichiestaSimulazione, request: Request):
+    inizio_handler(request)
+    veicoli = richiesta.veicoli
+    n = len(veicoli)
+    anni = np.fromiter((v.anno for v in veicoli), dtype=float, count=n)
+    chilometri = np.fromiter((v.chilometri for v in veicoli), dtype=float, count=n)
+    listini = np.fromiter((v.prezzo_listino for v in veicoli), dtype=float, count=n)
+    km_annui = np.fromiter((v.km_annui for v in veicoli), dtype=float, count=n)
+
+    svalutazioni = await svaluta_per_segmento(veicoli, anni, chilometri)
+
+    distribuzioni = {nome: d.distribuzione() for nome, d in richiesta.distribuzioni.items()}
+    bande = await run_in_threadpool(simula, svalutazioni, listini, km_annui, richiesta.anni_previsione,
+                                    richiesta.percorsi, distribuzioni=distribuzioni)
+    with cronometro("costruzione_risposta"):
+        risposta = {
+            "anni": bande.anni.tolist(),
+            "percorsi": bande.percorsi,
+            "bande": [{k: v for k, v in bande.veicolo(i).items() if k != "anni"} for i in range(n)],
+        }
+    fine_handler(request)
+    return risposta
+
+def _metti(metti, valore, annullato):
+    # put con timeout: se la richiesta viene chiusa i thread dello streaming non restano bloccati
+    while not annullato.is_set():
+        try:
+            metti(valore, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _modello_sincrono(marca, modello, allestimento):
+    # Usato dal thread di calcolo dello streaming: il registro carica i segmenti in modo sincrono
+    if not marca or app.state.registro is None:
+        return app.state.modello
+    return app.state.registro.ottieni(marca, modello, allestimento)
+
+@app.post("/valuta/flusso")
+async def valuta_flotta(request: Request,
+                        anni_previsione: int = Query(default=5, ge=1, le=MAX_ANNI_PREVISIONE),
+                        km_annui: float = Query(default=15000, ge=0, allow_inf_nan=False),
+                        dimensione_blocco: int = Query(default=DIMENSIONE_BLOCCO, ge=1, le=MAX_VEICOLI_BATCH)):
+    # Corpo NDJSON o Arrow IPC letto a blocchi; la risposta (stesso formato) parte al primo blocco valutato
+    tipo = request.headers.get("content-type", TIPO_NDJSON).split(";")[0].strip()
+    formato = "arrow" if tipo in TIPI_ARROW else "ndjson"
+    ciclo = asyncio.get_running_loop()
+    annullato = threading.Event()
+    ingresso = CodaByte(annullato=annullato)
+    uscita = queue.Queue(maxsize=8)
+    fine = object()
+
+    async def alimenta():
+        completo = False
+        try:
+            async for pezzo in request.stream():
+                if pezzo and not await run_in_threadpool(_metti, ingresso.metti, pezzo, annullato):
+                    return
+            completo = await run_in_threadpool(_metti, ingresso.metti, b"", annullato)
+        except ClientDisconnect:
+            pass
+        finally:
+            if not completo:
+                # Client disconnesso o lettura annullata: il calcolo non deve aspettare altri dati
+                annullato.set()
+
+    def calcola():
+        try:
+            for dati in valuta_flusso(ingresso, formato, _modello_sincrono, anni_previsione, km_annui,
+                                      dimensione_blocco):
+                if not _metti(uscita.put, dati, annullato):
+                    return
+            _metti(uscita.put, fine, annullato)
+        except Exception as e:
+            _metti(uscita.put, e, annullato)
+
+    lettura = asyncio.create_task(alimenta())
+    calcolo = ciclo.run_in_executor(None, calcola)
+
+    def chiudi():
+        annullato.set()
+        lettura.cancel()
+        # Sblocca il thread di calcolo se sta ancora aspettando dati in ingresso
+        try:
+            ingresso.metti(b"", timeout=0)
+        except queue.Full:
+            pass
+
+    async def prossimo():
+        # get con timeout: a ogni attesa a vuoto si controlla che lo streaming sia ancora vivo.
+        # is_disconnected legge i messaggi ASGI, quindi solo dopo che il corpo è stato letto tutto
+        while True:
+            try:
+                return await run_in_threadpool(uscita.get, timeout=ATTESA_CODA)
+            except queue.Empty:
+                if annullato.is_set() or (lettura.done() and await request.is_disconnected()):
+                    chiudi()
+                    return fine
+
+    # Il primo pezzo si attende prima di rispondere: gli errori di formato diventano un 400
+    primo = await prossimo()
+    if isinstance(primo, Exception):
+        chiudi()
+        if isinstance(primo, ImportError):
+            raise HTTPException(status_code=415, detail="Supporto Arrow non installato (pyarrow)")
+        raise HTTPException(status_code=400, detail=str(primo))
+
+    async def risposta():
+        try:
+            pezzo = primo
+            while pezzo is not fine:
+                if isinstance(pezzo, Exception):
+                    raise pezzo
+                yield pezzo
+                pezzo = await prossimo()
+            if not annullato.is_set():
+                await calcolo
+        finally:
+            chiudi()
+
+    tipo_risposta = TIPI_ARROW[0] if formato == "arrow" else TIPO_NDJSON
+    return StreamingResponse(risposta(), media_type=tipo_risposta)
+
+@app.post("/ingest")
+async def ingest(richiesta: RichiestaIngestione):
+    # Aggiorna il modello con le nuove inserzioni in O(righe) senza riaddestrare da zero
+    inserzioni = richiesta.inserzioni
+    n = len(inserzioni)
+    X = np.empty((n, 2))
+    X[:, 0] = np.fromiter((i.anno for i in inserzioni), dtype=float, count=n)
+    X[:, 1] = np.fromiter((i.chilometri for i in inserzioni), dtype=float, count=n)
+    listini = np.fromiter((i.prezzo_listino for i in inserzioni), dtype=float, count=n)
+    prezzi = np.fromiter((i.prezzo for i in inserzioni), dtype=float, count=n)
+    svalutazioni = ((listini - prezzi) / listini) * 100
+
+    assorbite = 0
+
+    def assorbi_e_salva(modello):
+        nonlocal assorbite
+        nuovo = assorbi(modello, X, svalutazioni)
+        # Solo le righe entrate nelle statistiche, non quelle scartate per valori mancanti
+        assorbite = nuovo.sufficienti.n - modello.sufficienti.n
+        salva(nuovo, PERCORSO_ARTEFATTO)
+        return nuovo
+
+    # Un /ingest alla volta: ognuno parte dal modello prodotto dal precedente
+    async with app.state.lock_ingestione:
+        try:
+            if app.state.condiviso is None:
+                nuovo = await run_in_threadpool(assorbi_e_salva, app.state.modello)
+            else:
+                # Si parte dall'ultima versione pubblicata (anche da un altro worker), sotto lock su file;
+                # gli altri worker la caricano al prossimo controllo del puntatore
+                nuovo = await run_in_threadpool(app.state.condiviso.pubblica_aggiornamento, assorbi_e_salva)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        # La cache si invalida da sola perché cambia la versione dell'artefatto
+        app.state.modello = nuovo
     return {
-        "received_params": params,
-        "prediction": "Risultato di esempio"  # Sostituisci con il vero risultato
+        "righe_assorbite": assorbite,
+        "righe_totali": nuovo.sufficienti.n,
+        "aggiornamenti": nuovo.aggiornamenti,
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Formato testuale di esposizione di Prometheus
+    return PlainTextResponse(REGISTRO.esporta(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return app.state.cache.statistiche()
+
+@app.get("/grafici/{tipo}.{formato}")
+async def grafico(tipo: str, formato: str, request: Request):
+    # I parametri del grafico arrivano in query string (es. /grafici/curva.svg?anno=2020&km_annui=10000)
+    try:
+        futuro = app.state.grafici.richiedi(app.state.modello, tipo, formato, **request.query_params)
+        percorso = await asyncio.wrap_future(futuro)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BrokenProcessPool:
+        # Il pool si è rotto anche al secondo tentativo
+        raise HTTPException(status_code=503, detail="Rendering dei grafici non disponibile")
+    # Il nome del file è l'hash di modello e parametri: cambia quando cambia il modello
+    etag = os.path.splitext(os.path.basename(percorso))[0]
+    return FileResponse(percorso, media_type=FORMATI[formato], headers={"ETag": f'"{etag}"'})
+
+@app.get("/grafici/stats")
+async def grafici_stats():
+    return app.state.grafici.statistiche()
+
+@app.get("/modello")
+async def modello_corrente():
+    modello = app.state.modello
+    info = {"versione": modello.versione, "pid": os.getpid()}
+    if app.state.condiviso is not None:
+        info["condiviso"] = app.state.condiviso.statistiche()
+    return info
+
+@app.get("/segmenti/stats")
+async def segmenti_stats():
+    if app.state.registro is None:
+        raise HTTPException(status_code=404, detail="Modelli per segmento non configurati")
+    return {**app.state.registro.statistiche(), "segmenti": app.state.registro.segmenti_caricati()}
+
+def avvia():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="API di valutazione ComparAuto")
+    parser.add_argument("--produzione", action="store_true",
+                        help="più processi worker con il modello condiviso in sola lettura (senza reload)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processi worker in produzione")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if not args.produzione:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    # Addestramento (o riuso dell'artefatto) una sola volta qui, prima di avviare i worker
+    cartella = CARTELLA_CONDIVISA or os.path.join(tempfile.gettempdir(), "comparauto-modello-condiviso")
+    pubblica(carica_o_addestra(PERCORSO_DATASET, PERCORSO_ARTEFATTO), cartella)
+    os.environ["COMPARAUTO_CARTELLA_CONDIVISA"] = cartella
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    avvia()